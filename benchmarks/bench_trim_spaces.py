@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Benchmark trim-spaces-in-paths on synthetic repositories.
+
+Each scenario creates a throw-away git repository holding ``--paths`` staged
+files spread over ``--depth`` directory levels. A ``--density`` fraction of
+directory and file names carry leading/trailing/internal spaces. The hook is
+then run in-process on every messy path and the script reports:
+
+- end-to-end ``main()`` time,
+- planning time (``plan_renames()``),
+- apply time (``apply_moves()``),
+- number of subprocesses spawned.
+
+Example::
+
+    python benchmarks/bench_trim_spaces.py --paths 1000 10000 100000 --style collapse
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from trim_spaces_in_paths import trim_spaces_in_paths as mod  # noqa: E402
+
+STYLES = ("none", "collapse", "underscore", "remove")
+FANOUT = 16
+
+
+def _messy(name: str, rng: random.Random) -> str:
+    # Leading, trailing and doubled internal spaces
+    head, _, tail = name.partition("_")
+    return " " * rng.randint(1, 2) + f"{head}  {tail}" + " " * rng.randint(0, 2)
+
+
+def synth_paths(count: int, depth: int, density: float, seed: int = 0) -> list[str]:
+    """Return ``count`` unique relative paths, about ``density`` of them messy."""
+    rng = random.Random(seed)
+    dir_names: dict[tuple[int, str, int], str] = {}
+    paths = []
+    for i in range(count):
+        parts = []
+        for level in range(depth):
+            k = (i // FANOUT ** (depth - level)) % FANOUT
+            key = (level, "/".join(parts), k)
+            if key not in dir_names:
+                name = f"dir_{level}{k}"
+                dir_names[key] = _messy(name, rng) if rng.random() < density else name
+            parts.append(dir_names[key])
+        name = f"file_{i}.txt"
+        parts.append(_messy(name, rng) if rng.random() < density else name)
+        paths.append("/".join(parts))
+    return paths
+
+
+def make_repo(root: Path, paths: list[str]) -> None:
+    """Create a git repository at ``root`` with ``paths`` staged as empty files."""
+    subprocess.run(["git", "init", "-q", str(root)], check=True)
+    for p in paths:
+        f = root / p
+        f.parent.mkdir(parents=True, exist_ok=True)
+        f.touch()
+    empty = (
+        subprocess.run(
+            ["git", "hash-object", "-w", "--stdin"],
+            input=b"",
+            capture_output=True,
+            check=True,
+            cwd=root,
+        )
+        .stdout.decode()
+        .strip()
+    )
+    # Stage everything in one go without hashing each file
+    records = b"".join(os.fsencode(f"100644 {empty}\t{p}") + b"\0" for p in paths)
+    subprocess.run(
+        ["git", "update-index", "-z", "--index-info"],
+        input=records,
+        check=True,
+        cwd=root,
+    )
+
+
+@contextmanager
+def count_subprocesses():
+    """Count processes spawned through ``subprocess.Popen``."""
+    counter = {"count": 0}
+    real_popen = subprocess.Popen
+
+    class CountingPopen(real_popen):
+        def __init__(self, *args, **kwargs):
+            counter["count"] += 1
+            super().__init__(*args, **kwargs)
+
+    subprocess.Popen = CountingPopen
+    try:
+        yield counter
+    finally:
+        subprocess.Popen = real_popen
+
+
+@contextmanager
+def timed(name: str, timings: dict[str, float]):
+    """Accumulate the wall time of every call to ``mod.<name>`` in ``timings``."""
+    real = getattr(mod, name)
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return real(*args, **kwargs)
+        finally:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+    setattr(mod, name, wrapper)
+    try:
+        yield
+    finally:
+        setattr(mod, name, real)
+
+
+def run_scenario(
+    count: int, depth: int, density: float, style: str, seed: int = 0
+) -> dict:
+    """Build a synthetic repository and time one hook run over it."""
+    paths = synth_paths(count, depth, density, seed)
+    messy = [p for p in paths if " " in p]
+    with tempfile.TemporaryDirectory(prefix="trim-bench-") as tmp:
+        root = Path(tmp)
+        make_repo(root, paths)
+        cwd = os.getcwd()
+        os.chdir(root)
+        timings: dict[str, float] = {}
+        try:
+            with (
+                count_subprocesses() as spawned,
+                timed("plan_renames", timings),
+                timed("apply_moves", timings),
+                open(os.devnull, "w") as devnull,
+            ):
+                stdout = sys.stdout
+                sys.stdout = devnull
+                start = time.perf_counter()
+                try:
+                    rc = mod.main(
+                        ["trim-spaces-in-paths", f"--internal-style={style}", *messy]
+                    )
+                finally:
+                    total = time.perf_counter() - start
+                    sys.stdout = stdout
+        finally:
+            os.chdir(cwd)
+    return {
+        "paths": count,
+        "messy": len(messy),
+        "depth": depth,
+        "density": density,
+        "style": style,
+        "exit_code": rc,
+        "total_s": round(total, 4),
+        "plan_s": round(timings.get("plan_renames", 0.0), 4),
+        "apply_s": round(timings.get("apply_moves", 0.0), 4),
+        "subprocesses": spawned["count"],
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--paths", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--density", type=float, default=0.3)
+    parser.add_argument("--style", choices=STYLES, nargs="+", default=["collapse"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="emit JSON lines")
+    args = parser.parse_args(argv)
+
+    if not args.json:
+        print(
+            f"{'paths':>8} {'messy':>7} {'style':>10} {'total':>8} "
+            f"{'plan':>8} {'apply':>8} {'procs':>6}"
+        )
+    for count in args.paths:
+        for style in args.style:
+            r = run_scenario(count, args.depth, args.density, style, args.seed)
+            if args.json:
+                print(json.dumps(r))
+            else:
+                print(
+                    f"{r['paths']:>8} {r['messy']:>7} {r['style']:>10} "
+                    f"{r['total_s']:>8.3f} {r['plan_s']:>8.3f} "
+                    f"{r['apply_s']:>8.3f} {r['subprocesses']:>6}"
+                )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
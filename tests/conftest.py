@@ -1,5 +1,6 @@
 """Pytest configuration and shared fixtures."""
 
+import os
 import subprocess
 from pathlib import Path
 
@@ -40,12 +41,83 @@ def run_command():
     return _run_command
 
 
+def _init_repo(root):
+    """Initialize a git repository with basic configuration at `root`."""
+    root.mkdir(parents=True, exist_ok=True)
+    _run_command(["git", "init"], cwd=root)
+    _run_command(["git", "config", "user.name", "Test"], cwd=root)
+    _run_command(["git", "config", "user.email", "test@example.com"], cwd=root)
+    return root
+
+
 @pytest.fixture
-def git_repo(tmp_path, run_command):
+def git_repo(tmp_path):
     """Create a temporary git repository with basic configuration."""
-    # Initialize git repo
-    run_command(["git", "init"], cwd=tmp_path)
-    run_command(["git", "config", "user.name", "Test"], cwd=tmp_path)
-    run_command(["git", "config", "user.email", "test@example.com"], cwd=tmp_path)
+    return _init_repo(tmp_path)
+
+
+@pytest.fixture
+def stage_files():
+    """Write files into a repository and stage them.
+
+    Call as ``stage_files(repo, files)``, where `files` is a mapping of
+    names to contents, or just names, each written with its own name.
+    """
+
+    def stage(repo, files):
+        if not isinstance(files, dict):
+            files = {name: name for name in files}
+        for name, content in files.items():
+            path = repo / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content)
+        if files:
+            _run_command(["git", "add", "--", *files], cwd=repo)
+        return repo
+
+    return stage
+
+
+@pytest.fixture
+def make_repo(stage_files):
+    """Create further repositories: ``make_repo(root, files)``."""
+
+    def make(root, files=()):
+        return stage_files(_init_repo(root), files)
+
+    return make
+
+
+@pytest.fixture
+def repo_files():
+    """Files staged by `messy_repo`; override it in a module to change them."""
+    return (" a .txt", "dir /b.txt")
+
+
+@pytest.fixture
+def messy_repo(git_repo, stage_files, repo_files, monkeypatch):
+    """`git_repo` with `repo_files` staged, as the working directory."""
+    stage_files(git_repo, repo_files)
+    monkeypatch.chdir(git_repo)
+    return git_repo
+
+
+@pytest.fixture(autouse=True)
+def isolate_host_repo(project_root, tmp_path_factory, monkeypatch):
+    """Keep hook state for this checkout out of its own .git.
+
+    Tests that call main() from the project root would otherwise leave the
+    parsed config, claims or journals in the developer's repository.
+    """
+    from trim_spaces_in_paths import trim_spaces_in_paths as mod
+
+    host = os.path.realpath(project_root / ".git")
+    scratch = str(tmp_path_factory.mktemp("host-state"))
+    real_state_dir = mod.state_dir
+
+    def state_dir(git_dir):
+        if os.path.realpath(git_dir) == host:
+            return scratch
+        return real_state_dir(git_dir)
 
-    return tmp_path
+    monkeypatch.setattr(mod, "state_dir", state_dir)
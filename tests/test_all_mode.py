@@ -0,0 +1,84 @@
+"""Tests for the whole-repository --all mode."""
+
+import platform
+import types
+
+import pytest
+
+from trim_spaces_in_paths import trim_spaces_in_paths as mod
+
+pytestmark = pytest.mark.skipif(
+    platform.system() == "Windows",
+    reason="Filesystem spacing edge-cases not portable on Windows",
+)
+
+
+@pytest.fixture
+def repo_files():
+    return (" a .txt", "clean.txt", "dir /b.txt", "other/ c.txt")
+
+
+@pytest.fixture
+def messy_repo(messy_repo):
+    (messy_repo / " untracked.txt").write_text("u")
+    return messy_repo
+
+
+def test_iter_tracked_paths_streams(messy_repo, monkeypatch):
+    monkeypatch.chdir(messy_repo)
+    paths = mod.iter_tracked_paths()
+    assert isinstance(paths, types.GeneratorType)
+    assert sorted(paths) == [" a .txt", "clean.txt", "dir /b.txt", "other/ c.txt"]
+
+
+def test_iter_tracked_paths_pathspec(messy_repo, monkeypatch):
+    monkeypatch.chdir(messy_repo)
+    assert list(mod.iter_tracked_paths(["other"])) == ["other/ c.txt"]
+
+
+def test_plan_renames_consumes_a_stream():
+    def stream():
+        yield from ("ok.txt", " x.txt", "d /y.txt")
+
+    plan, errors = mod.plan_renames(stream(), "none")
+    assert errors == []
+    assert sorted(plan) == [(" x.txt", "x.txt"), ("d /y.txt", "d/y.txt")]
+
+
+def test_main_all_fixes_every_tracked_path(messy_repo, run_command, monkeypatch):
+    monkeypatch.chdir(messy_repo)
+    assert mod.main(["script", "--all"]) == 3
+
+    tracked = run_command(["git", "ls-files"], cwd=messy_repo).stdout.split("\n")
+    assert sorted(filter(None, tracked)) == [
+        "a .txt",
+        "clean.txt",
+        "dir/b.txt",
+        "other/c.txt",
+    ]
+    # Untracked files are not part of the audit
+    assert (messy_repo / " untracked.txt").exists()
+    assert mod.main(["script", "--all"]) == 0
+
+
+def test_main_all_with_pathspec(messy_repo, run_command, monkeypatch):
+    monkeypatch.chdir(messy_repo)
+    assert mod.main(["script", "--all", "dir "]) == 3
+    tracked = run_command(["git", "ls-files"], cwd=messy_repo).stdout
+    assert "dir/b.txt" in tracked
+    assert " a .txt" in tracked
+
+
+def test_main_all_reports_conflicts(git_repo, run_command, monkeypatch):
+    for name in ("a  b.txt", "a   b.txt"):
+        (git_repo / name).write_text(name)
+    run_command(["git", "add", "."], cwd=git_repo)
+    monkeypatch.chdir(git_repo)
+    assert mod.main(["script", "--all", "--internal-style=collapse"]) == 1
+
+
+def test_main_all_outside_repository(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(SystemExit) as exc_info:
+        mod.main(["script", "--all"])
+    assert exc_info.value.code == 2
@@ -0,0 +1,423 @@
+"""Tests for the batched apply engine."""
+
+import platform
+import stat
+
+import pytest
+
+from trim_spaces_in_paths import trim_spaces_in_paths as mod
+
+pytestmark = pytest.mark.skipif(
+    platform.system() == "Windows",
+    reason="Filesystem spacing edge-cases not portable on Windows",
+)
+
+
+def _index(run_command, git_repo):
+    out = run_command(["git", "ls-files", "-s"], cwd=git_repo).stdout
+    entries = {}
+    for line in out.splitlines():
+        meta, path = line.split("\t", 1)
+        mode, oid, _ = meta.split(" ")
+        entries[path] = (mode, oid)
+    return entries
+
+
+def test_apply_moves_preserves_blob_and_mode(
+    git_repo, run_command, stage_files, monkeypatch
+):
+    """Renamed entries keep their staged blob id and mode."""
+    stage_files(git_repo, {" a .txt": "a", "dir /b.sh": "b"})
+    (git_repo / "dir " / "b.sh").chmod(0o755)
+    run_command(["git", "add", "--", "dir /b.sh"], cwd=git_repo)
+    before = _index(run_command, git_repo)
+    monkeypatch.chdir(git_repo)
+
+    changed, errors = mod.apply_moves(
+        [(" a .txt", "a .txt"), ("dir /b.sh", "dir/b.sh")]
+    )
+
+    assert errors == []
+    assert changed == [(" a .txt", "a .txt"), ("dir /b.sh", "dir/b.sh")]
+    after = _index(run_command, git_repo)
+    assert after == {"a .txt": before[" a .txt"], "dir/b.sh": before["dir /b.sh"]}
+    assert after["dir/b.sh"][0] == "100755"
+    assert (git_repo / "dir" / "b.sh").stat().st_mode & stat.S_IXUSR
+    # Emptied source directories are cleaned up
+    assert not (git_repo / "dir ").exists()
+
+
+def test_apply_moves_uses_constant_git_invocations(
+    git_repo, run_command, stage_files, monkeypatch
+):
+    """Renaming many files spawns the same number of git processes as one."""
+    files = {f" f{i} .txt": str(i) for i in range(50)}
+    stage_files(git_repo, files)
+    monkeypatch.chdir(git_repo)
+
+    calls = []
+    real_run = mod.run
+
+    def counting_run(cmd, *args, **kwargs):
+        calls.append(cmd)
+        return real_run(cmd, *args, **kwargs)
+
+    monkeypatch.setattr(mod, "run", counting_run)
+    changed, errors = mod.apply_moves([(f, f.strip()) for f in files])
+
+    assert errors == []
+    assert len(changed) == 50
+    assert len(calls) == 2
+    assert set(_index(run_command, git_repo)) == {f.strip() for f in files}
+
+
+def test_apply_moves_keeps_staged_content(
+    git_repo, run_command, stage_files, monkeypatch
+):
+    """The index keeps the staged blob even when the working tree differs."""
+    stage_files(git_repo, {" x.txt": "staged"})
+    (git_repo / " x.txt").write_text("unstaged edit")
+    monkeypatch.chdir(git_repo)
+
+    _, errors = mod.apply_moves([(" x.txt", "x.txt")])
+
+    assert errors == []
+    assert run_command(["git", "show", ":x.txt"], cwd=git_repo).stdout == "staged"
+    assert (git_repo / "x.txt").read_text() == "unstaged edit"
+
+
+def test_apply_moves_untracked_files_share_one_git_process(
+    git_repo, run_command, monkeypatch
+):
+    """Untracked sources are staged by a single update-index call."""
+    for i in range(20):
+        (git_repo / f" new{i}.txt").write_text(str(i))
+    monkeypatch.chdir(git_repo)
+    monkeypatch.setattr(mod, "git_mv", lambda *_, **__: pytest.fail("forked git"))
+    spawned = []
+    real_run = mod.run
+
+    def counting_run(cmd, *args, **kwargs):
+        spawned.append(cmd[1:])
+        return real_run(cmd, *args, **kwargs)
+
+    monkeypatch.setattr(mod, "run", counting_run)
+    plan = [(f" new{i}.txt", f"new{i}.txt") for i in range(20)]
+    changed, errors = mod.apply_moves(plan, _snapshot([]))
+
+    assert errors == []
+    assert changed == plan
+    assert spawned == [["update-index", "--add", "-z", "--stdin"]]
+    assert set(_index(run_command, git_repo)) == {f"new{i}.txt" for i in range(20)}
+    assert not (git_repo / " new0.txt").exists()
+
+
+def test_apply_moves_fallbacks_share_two_git_processes(
+    git_repo, run_command, monkeypatch
+):
+    """Untracked directories and links and unmerged entries skip git mv."""
+    (git_repo / " new").mkdir()
+    (git_repo / " new" / "a.txt").write_text("n")
+    (git_repo / " link").symlink_to("target")
+    (git_repo / " c.txt").write_text("merged")
+    oid = run_command(
+        ["git", "hash-object", "-w", "--", " c.txt"], cwd=git_repo
+    ).stdout.strip()
+    info = "".join(f"100644 {oid} {stage}\t c.txt\n" for stage in (1, 2, 3))
+    run_command(
+        ["sh", "-c", f"printf '{info}' | git update-index --index-info"], cwd=git_repo
+    )
+    monkeypatch.chdir(git_repo)
+    monkeypatch.setattr(mod, "git_mv", lambda *_: pytest.fail("forked git mv"))
+    spawned = []
+    real_run = mod.run
+
+    def counting_run(cmd, *args, **kwargs):
+        spawned.append(cmd[1:3])
+        return real_run(cmd, *args, **kwargs)
+
+    monkeypatch.setattr(mod, "run", counting_run)
+    plan = [(" new", "new"), (" link", "link"), (" c.txt", "c.txt")]
+    changed, errors = mod.apply_moves(plan)
+
+    assert errors == []
+    assert sorted(changed) == sorted(plan)
+    assert spawned == [
+        ["ls-files", "-z"],
+        ["update-index", "-z"],
+        ["--literal-pathspecs", "add"],
+    ]
+    staged = run_command(["git", "ls-files", "-s"], cwd=git_repo).stdout
+    assert sorted(line.split("\t")[1] for line in staged.splitlines()) == [
+        "c.txt",
+        "link",
+        "new/a.txt",
+    ]
+    assert " 0\tc.txt" in staged
+    assert (git_repo / "new" / "a.txt").read_text() == "n"
+
+
+def test_apply_moves_from_subdirectory(git_repo, run_command, stage_files, monkeypatch):
+    """Paths relative to a subdirectory are mapped onto top-level index paths."""
+    stage_files(git_repo, {"sub/ y.txt": "y"})
+    monkeypatch.chdir(git_repo / "sub")
+
+    _, errors = mod.apply_moves([(" y.txt", "y.txt")], mod.IndexSnapshot("sub/"))
+
+    assert errors == []
+    assert set(_index(run_command, git_repo)) == {"sub/y.txt"}
+
+
+def _snapshot(paths):
+    index = mod.IndexSnapshot()
+    index._entries = {p: ("100644", "0" * 40, 0) for p in paths}
+    return index
+
+
+def _touch(root, paths):
+    for p in paths:
+        (root / p).parent.mkdir(parents=True, exist_ok=True)
+        (root / p).write_text(p)
+
+
+class TestCoalesceMoves:
+    """Test directory-level coalescing of per-file renames."""
+
+    def test_whole_directory_becomes_one_move(self, tmp_path, monkeypatch):
+        files = [" reports /a.txt", " reports /b/c.txt", " reports /b/d.txt"]
+        _touch(tmp_path, files)
+        monkeypatch.chdir(tmp_path)
+        pairs = [(f, f.replace(" reports ", "reports")) for f in files]
+
+        ops, moved = mod.coalesce_moves(pairs, _snapshot(files))
+
+        assert ops == [(" reports ", "reports")]
+        assert moved == {" reports ": "reports"}
+
+    def test_messy_names_inside_moved_directory(self, tmp_path, monkeypatch):
+        files = [" r / x .txt", " r /y.txt"]
+        _touch(tmp_path, files)
+        monkeypatch.chdir(tmp_path)
+        pairs = [(" r / x .txt", "r/x .txt"), (" r /y.txt", "r/y.txt")]
+
+        ops, _ = mod.coalesce_moves(pairs, _snapshot(files))
+
+        assert ops == [(" r ", "r"), ("r/ x .txt", "r/x .txt")]
+
+    def test_partial_directory_falls_back_to_files(self, tmp_path, monkeypatch):
+        files = [" r /a.txt", " r /b.txt"]
+        _touch(tmp_path, files)
+        monkeypatch.chdir(tmp_path)
+        pairs = [(" r /a.txt", "r/a.txt")]
+
+        ops, moved = mod.coalesce_moves(pairs, _snapshot(files))
+
+        assert ops == pairs
+        assert moved == {}
+
+    def test_existing_target_directory_falls_back(self, tmp_path, monkeypatch):
+        files = [" r /a.txt"]
+        _touch(tmp_path, [*files, "r/other.txt"])
+        monkeypatch.chdir(tmp_path)
+        pairs = [(" r /a.txt", "r/a.txt")]
+
+        ops, _ = mod.coalesce_moves(pairs, _snapshot(files))
+
+        assert ops == pairs
+
+    def test_pinned_paths_block_directory_moves(self, tmp_path, monkeypatch):
+        files = [" r /a.txt"]
+        _touch(tmp_path, [*files, " r /untracked.txt"])
+        monkeypatch.chdir(tmp_path)
+        pairs = [(" r /a.txt", "r/a.txt")]
+
+        ops, _ = mod.coalesce_moves(pairs, _snapshot(files), {" r /untracked.txt"})
+
+        assert ops == pairs
+
+    def test_clean_subdirectory_of_partial_parent_moves_whole(
+        self, tmp_path, monkeypatch
+    ):
+        files = [" p /keep.txt", " p /sub/a.txt", " p /sub/b.txt"]
+        _touch(tmp_path, files)
+        monkeypatch.chdir(tmp_path)
+        pairs = [(" p /sub/a.txt", "p/sub/a.txt"), (" p /sub/b.txt", "p/sub/b.txt")]
+
+        ops, _ = mod.coalesce_moves(pairs, _snapshot(files))
+
+        assert ops == [(" p /sub", "p/sub")]
+
+
+def test_apply_moves_renames_directory_once(
+    git_repo, run_command, stage_files, monkeypatch
+):
+    """A messy folder is moved with a single filesystem operation."""
+    files = {" reports /a.txt": "a", " reports /b/ c .txt": "c"}
+    stage_files(git_repo, files)
+    before = _index(run_command, git_repo)
+    monkeypatch.chdir(git_repo)
+
+    replaced = []
+    real_replace = mod.os.replace
+    monkeypatch.setattr(
+        mod.os, "replace", lambda s, d: replaced.append((s, d)) or real_replace(s, d)
+    )
+    changed, errors = mod.apply_moves(
+        [
+            (" reports /a.txt", "reports/a.txt"),
+            (" reports /b/ c .txt", "reports/b/c .txt"),
+        ]
+    )
+
+    assert errors == []
+    assert len(changed) == 2
+    assert replaced == [
+        (" reports ", "reports"),
+        ("reports/b/ c .txt", "reports/b/c .txt"),
+    ]
+    assert _index(run_command, git_repo) == {
+        "reports/a.txt": before[" reports /a.txt"],
+        "reports/b/c .txt": before[" reports /b/ c .txt"],
+    }
+    assert not (git_repo / " reports ").exists()
+
+
+def _simulate(ops, files):
+    """Run moves against a dict of path -> content, failing on overwrites."""
+    files = dict(files)
+    for src, dst in ops:
+        assert src in files, f"{src} does not exist yet"
+        assert dst not in files, f"{dst} would be overwritten"
+        files[dst] = files.pop(src)
+    return files
+
+
+class TestScheduleMoves:
+    """Test dependency-aware ordering of filesystem moves."""
+
+    def test_independent_moves_keep_their_order(self):
+        ops = [(" a", "a"), (" b", "b"), ("c ", "c")]
+        assert mod.schedule_moves(ops) == (ops, {})
+
+    def test_chain_runs_back_to_front(self):
+        ops = [("a ", "a"), ("a", "b"), ("b", "c")]
+        order, temps = mod.schedule_moves(ops)
+        assert order == [("b", "c"), ("a", "b"), ("a ", "a")]
+        assert temps == {}
+
+    def test_swap_goes_through_a_temporary_name(self):
+        ops = [("d/a", "d/b"), ("d/b", "d/a")]
+        order, temps = mod.schedule_moves(ops)
+        assert len(order) == 3
+        (tmp,) = temps
+        assert temps[tmp] == "d/a"
+        assert tmp.startswith("d/.trim-spaces-in-paths.")
+        assert _simulate(order, {"d/a": 1, "d/b": 2}) == {"d/b": 1, "d/a": 2}
+
+    def test_longer_cycle_with_a_tail(self):
+        ops = [("x", "y"), ("y", "z"), ("z", "x"), ("w ", "w"), ("w", "x2")]
+        order, temps = mod.schedule_moves(ops)
+        assert len(temps) == 1
+        files = {"x": 1, "y": 2, "z": 3, "w ": 4, "w": 5}
+        assert _simulate(order, files) == {"y": 1, "z": 2, "x": 3, "w": 4, "x2": 5}
+
+    def test_file_onto_a_path_that_was_a_directory(self):
+        ops = [("f ", "a"), ("a/b", "c")]
+        order, _ = mod.schedule_moves(ops)
+        assert order == [("a/b", "c"), ("f ", "a")]
+
+    def test_moves_inside_a_moved_directory_wait_for_it(self):
+        ops = [("d/x ", "d/x"), ("d ", "d")]
+        order, _ = mod.schedule_moves(ops, {"d"})
+        assert order == [("d ", "d"), ("d/x ", "d/x")]
+
+
+def test_apply_moves_swaps_files(git_repo, run_command, stage_files, monkeypatch):
+    """Swapped paths exchange both content and index entries."""
+    stage_files(git_repo, {"a": "A", "b": "B", "c ": "C", "c": "old c"})
+    before = _index(run_command, git_repo)
+    monkeypatch.chdir(git_repo)
+
+    plan = [("a", "b"), ("b", "a"), ("c ", "c"), ("c", "d")]
+    changed, errors = mod.apply_moves(plan)
+
+    assert errors == []
+    assert sorted(changed) == sorted(plan)
+    assert (git_repo / "a").read_text() == "B"
+    assert (git_repo / "b").read_text() == "A"
+    assert (git_repo / "c").read_text() == "C"
+    assert (git_repo / "d").read_text() == "old c"
+    assert _index(run_command, git_repo) == {
+        "a": before["b"],
+        "b": before["a"],
+        "c": before["c "],
+        "d": before["c"],
+    }
+    leftovers = [p.name for p in git_repo.iterdir() if p.name.startswith(".trim")]
+    assert leftovers == []
+
+
+class TestPartitionMoves:
+    """Test splitting scheduled moves into independent parts."""
+
+    def test_siblings_are_spread_across_parts(self):
+        ops = [(f"d /f{i}", f"d/f{i}") for i in range(6)]
+        parts = mod.partition_moves(ops, 3)
+        assert sorted(map(len, parts)) == [2, 2, 2]
+        assert sorted(i for part in parts for i in part) == list(range(6))
+
+    def test_nested_and_cyclic_moves_stay_together(self):
+        ops, _ = mod.schedule_moves(
+            [("d ", "d"), ("d/x ", "d/x"), ("a", "b"), ("b", "a"), ("f ", "f")],
+            {"d"},
+        )
+        parts = mod.partition_moves(ops, 8)
+        groups = sorted(sorted(ops[i] for i in part) for part in parts)
+        assert len(groups) == 3
+        assert [("d ", "d"), ("d/x ", "d/x")] in groups
+        assert [("f ", "f")] in groups
+        # Each part keeps the scheduled order
+        assert all(part == sorted(part) for part in parts)
+
+    def test_a_move_into_an_emptied_directory_waits(self):
+        ops, _ = mod.schedule_moves([("f ", "a"), ("a/b", "c")])
+        assert mod.partition_moves(ops, 4) == [[0, 1]]
+
+
+def test_parse_jobs_option():
+    assert mod.parse_options(["script"]).jobs == 1
+    assert mod.parse_options(["script", "--jobs=4"]).jobs == 4
+    assert mod.parse_options(["script", "--jobs", "2", "x"]).jobs == 2
+    assert mod.parse_options(["script", "--jobs=0"]).jobs >= 1
+    with pytest.raises(SystemExit) as exc_info:
+        mod.parse_options(["script", "--jobs=many"])
+    assert exc_info.value.code == 2
+
+
+def test_apply_moves_with_jobs(git_repo, run_command, stage_files, monkeypatch):
+    """Parallel moves give the same result, with one index update."""
+    files = {f"d{i % 4} /f {i}.txt": str(i) for i in range(40)}
+    files.update({f" top{i}.txt": str(i) for i in range(10)})
+    stage_files(git_repo, files)
+    (git_repo / "d0 " / "untracked.txt").write_text("u")
+    before = _index(run_command, git_repo)
+    monkeypatch.chdir(git_repo)
+
+    plan = [(src, src.replace(" /", "/").lstrip()) for src in files]
+    calls = []
+    real_run_locked = mod.run_locked
+
+    def counting(cmd, *args, **kwargs):
+        calls.append(cmd)
+        return real_run_locked(cmd, *args, **kwargs)
+
+    monkeypatch.setattr(mod, "run_locked", counting)
+    changed, errors = mod.apply_moves(plan, jobs=4)
+
+    assert errors == []
+    assert sorted(changed) == sorted(plan)
+    assert len(calls) == 1
+    assert _index(run_command, git_repo) == {dst: before[src] for src, dst in plan}
+    assert all((git_repo / dst).read_text() == files[src] for src, dst in plan)
+    assert (git_repo / "d0" / "untracked.txt").exists()
+    assert not any(p.name.endswith(" ") for p in git_repo.iterdir())
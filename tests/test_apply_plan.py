@@ -0,0 +1,107 @@
+"""Tests for --apply-plan."""
+
+import io
+import platform
+
+import pytest
+
+from trim_spaces_in_paths import trim_spaces_in_paths as mod
+
+pytestmark = pytest.mark.skipif(
+    platform.system() == "Windows",
+    reason="Filesystem spacing edge-cases not portable on Windows",
+)
+
+
+def _tracked(run_command, repo):
+    out = run_command(["git", "ls-files"], cwd=repo).stdout
+    return sorted(filter(None, out.split("\n")))
+
+
+def _make_plan(capsysbinary, fmt="json"):
+    assert mod.main(["script", f"--check={fmt}", "--all"]) == 3
+    return capsysbinary.readouterr().out
+
+
+def test_parse_apply_plan_forms():
+    opts = mod.parse_options(["script", "--apply-plan", "p.json", "x"])
+    assert opts.apply_plan == "p.json"
+    assert opts.files == ["x"]
+    assert mod.parse_options(["script", "--apply-plan=-"]).apply_plan == "-"
+    with pytest.raises(SystemExit) as exc_info:
+        mod.parse_options(["script", "--apply-plan"])
+    assert exc_info.value.code == 2
+
+
+def test_parse_report_option():
+    assert mod.parse_options(["script"]).report == "text"
+    assert mod.parse_options(["script", "--report=json"]).report == "json"
+    for argv in (["--report=xml"], ["--check", "--report=json"]):
+        with pytest.raises(SystemExit) as exc_info:
+            mod.parse_options(["script", *argv])
+        assert exc_info.value.code == 2
+
+
+def test_read_plan_formats():
+    pairs, expected, style = mod.read_plan(
+        b'{"internal_style": "remove", "renames": ['
+        b'{"src": " a", "dst": "a", "mode": "100644", "oid": "ab"},'
+        b'{"src": "b ", "dst": "b"}]}'
+    )
+    assert pairs == [(" a", "a"), ("b ", "b")]
+    assert expected == {" a": ("100644", "ab")}
+    assert style == "remove"
+    assert mod.read_plan(b" a\0a\0b \0b\0") == ([(" a", "a"), ("b ", "b")], {}, None)
+    with pytest.raises(ValueError):
+        mod.read_plan(b" a\0")
+
+
+@pytest.mark.parametrize("fmt", ["json", "nul"])
+def test_check_then_apply_round_trip(messy_repo, run_command, capsysbinary, fmt):
+    plan = messy_repo.parent / f"plan.{fmt}"
+    plan.write_bytes(_make_plan(capsysbinary, fmt))
+
+    assert mod.main(["script", "--apply-plan", str(plan)]) == 3
+    assert _tracked(run_command, messy_repo) == ["a .txt", "dir/b.txt"]
+    assert (messy_repo / "dir" / "b.txt").exists()
+
+
+def test_apply_plan_from_stdin(messy_repo, run_command, capsysbinary, monkeypatch):
+    data = _make_plan(capsysbinary)
+    monkeypatch.setattr("sys.stdin", io.TextIOWrapper(io.BytesIO(data)))
+    assert mod.main(["script", "--apply-plan=-"]) == 3
+    assert _tracked(run_command, messy_repo) == ["a .txt", "dir/b.txt"]
+
+
+def test_apply_plan_rejects_stale_sources(messy_repo, run_command, capsysbinary):
+    plan = messy_repo.parent / "plan.json"
+    plan.write_bytes(_make_plan(capsysbinary))
+    (messy_repo / " a .txt").write_text("edited")
+    run_command(["git", "add", "--", " a .txt"], cwd=messy_repo)
+    (messy_repo / "dir " / "b.txt").unlink()
+    run_command(["git", "rm", "-q", "--cached", "--", "dir /b.txt"], cwd=messy_repo)
+
+    assert mod.main(["script", "--apply-plan", str(plan)]) == 1
+    err = capsysbinary.readouterr().err.decode()
+    assert "' a .txt' changed since the plan was made" in err
+    assert "'dir /b.txt' no longer exists" in err
+    assert _tracked(run_command, messy_repo) == [" a .txt"]
+
+
+def test_apply_plan_rejects_taken_targets(messy_repo, run_command, capsysbinary):
+    plan = messy_repo.parent / "plan.nul"
+    plan.write_bytes(_make_plan(capsysbinary, "nul"))
+    (messy_repo / "a .txt").write_text("someone else")
+
+    assert mod.main(["script", "--apply-plan", str(plan)]) == 1
+    assert b"which exists" in capsysbinary.readouterr().err
+    assert (messy_repo / "a .txt").read_text() == "someone else"
+    assert "dir/b.txt" in _tracked(run_command, messy_repo)
+
+
+def test_apply_plan_unreadable(tmp_path, capsys):
+    assert mod.main(["script", "--apply-plan", str(tmp_path / "missing")]) == 2
+    bad = tmp_path / "bad.json"
+    bad.write_text("{nope")
+    assert mod.main(["script", "--apply-plan", str(bad)]) == 2
+    assert "Could not read plan" in capsys.readouterr().err
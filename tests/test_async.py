@@ -0,0 +1,143 @@
+"""Tests for the asyncio git runner and the async pipeline."""
+
+import asyncio
+import json
+import platform
+from unittest.mock import patch
+
+import pytest
+
+from trim_spaces_in_paths import trim_spaces_in_paths as mod
+
+pytestmark = pytest.mark.skipif(
+    platform.system() == "Windows",
+    reason="Filesystem spacing edge-cases not portable on Windows",
+)
+
+
+def _staged(run_command, repo):
+    return run_command(["git", "ls-files"], cwd=repo).stdout.splitlines()
+
+
+def test_run_async_captures_output(tmp_path):
+    async def go():
+        return await asyncio.gather(
+            mod.run_async(["git", "--version"]),
+            mod.run_async(["git", "hash-object", "--stdin"], input=b"x\n"),
+            mod.run_async(["git", "rev-parse", "--show-toplevel"], cwd=str(tmp_path)),
+        )
+
+    version, blob, outside = asyncio.run(go())
+    assert version.returncode == 0 and version.stdout.startswith(b"git version")
+    assert blob.stdout.strip() == b"587be6b4c3f93f93c489c0111bba5596147a26cb"
+    assert outside.returncode != 0 and outside.stderr
+
+
+def test_plan_async_matches_build_plan(tmp_path, make_repo, monkeypatch):
+    """Paths are taken relative to `cwd`, not the process directory."""
+    names = [" a.txt", "d /b.txt", "c.txt"]
+    repo = make_repo(tmp_path / "repo", names)
+    opts = mod.parse_options(["script", *names, " c.txt"])
+
+    plan, errors, index = asyncio.run(mod.plan_async(opts, str(repo)))
+
+    assert sorted(plan) == [(" a.txt", "a.txt"), ("d /b.txt", "d/b.txt")]
+    assert errors == ["Conflict: both 'c.txt' and ' c.txt' would become 'c.txt'"]
+    assert index.get(" a.txt")[0] == "100644"
+    monkeypatch.chdir(repo)
+    assert mod.build_plan(opts)[:2] == (plan, errors)
+
+
+def test_plan_async_all_paths_from_subdirectory(tmp_path, make_repo):
+    repo = make_repo(tmp_path / "repo", ["sub/ x.txt", " top.txt"])
+    opts = mod.parse_options(["script", "--all"])
+
+    plan, errors, index = asyncio.run(mod.plan_async(opts, str(repo / "sub")))
+
+    assert plan == [(" x.txt", "x.txt")]
+    assert errors == []
+    assert index.prefix == "sub/"
+
+
+def test_plan_async_clean_paths_run_no_git(tmp_path):
+    opts = mod.parse_options(["script", "clean.txt"])
+    with patch.object(mod, "run_async", side_effect=AssertionError("spawned git")):
+        assert asyncio.run(mod.fix_async(opts, str(tmp_path))) == (0, [], [])
+
+
+def test_plan_async_outside_a_repository(tmp_path):
+    opts = mod.parse_options(["script", " a.txt"])
+    with pytest.raises(mod.GitError):
+        asyncio.run(mod.plan_async(opts, str(tmp_path)))
+
+
+def test_fix_async_check_changes_nothing(tmp_path, make_repo, run_command):
+    repo = make_repo(tmp_path / "repo", [" a.txt"])
+    opts = mod.parse_options(["script", "--check", " a.txt"])
+
+    result = asyncio.run(mod.fix_async(opts, str(repo)))
+    assert result == (3, [(" a.txt", "a.txt")], [])
+    assert _staged(run_command, repo) == [" a.txt"]
+
+
+def test_fix_async_applies_in_its_own_process(tmp_path, make_repo, run_command):
+    repo = make_repo(tmp_path / "repo", [" a.txt", "d /b.txt"])
+    opts = mod.parse_options(["script", "--jobs=2", " a.txt", "d /b.txt"])
+
+    code, plan, errors = asyncio.run(mod.fix_async(opts, str(repo)))
+
+    assert (code, errors) == (3, [])
+    assert len(plan) == 2
+    assert sorted(_staged(run_command, repo)) == ["a.txt", "d/b.txt"]
+    assert (repo / "d" / "b.txt").read_text() == "d /b.txt"
+
+
+def test_apply_async_reports_json(tmp_path, make_repo):
+    repo = make_repo(tmp_path / "repo", [" a.txt"])
+    opts = mod.parse_options(["script", " a.txt"])
+
+    async def go():
+        plan, _, index = await mod.plan_async(opts, str(repo))
+        return await mod.apply_async(plan, index, opts, str(repo))
+
+    p = asyncio.run(go())
+    assert p.returncode == 3
+    assert json.loads(p.stdout) == {
+        "internal_style": "none",
+        "renamed": [{"src": " a.txt", "dst": "a.txt"}],
+        "errors": [],
+    }
+
+
+def test_fix_async_reports_apply_errors(tmp_path, make_repo):
+    repo = make_repo(tmp_path / "repo", [" a.txt"])
+    opts = mod.parse_options(["script", " a.txt"])
+    real_apply = mod.apply_async
+
+    async def apply_async(*args):
+        (repo / "a.txt").write_text("in the way")  # appears after planning
+        return await real_apply(*args)
+
+    with patch.object(mod, "apply_async", side_effect=apply_async):
+        result = asyncio.run(mod.fix_async(opts, str(repo)))
+    assert result == (
+        1,
+        [(" a.txt", "a.txt")],
+        ["Conflict: ' a.txt' would become 'a.txt', which exists"],
+    )
+
+
+def test_fix_many_across_repositories(tmp_path, make_repo, run_command):
+    first = make_repo(tmp_path / "one", [" a.txt"])
+    second = make_repo(tmp_path / "two", [" b.txt", "clean.txt"])
+    targets = [
+        (str(first), mod.parse_options(["script", "--all"])),
+        (str(second), mod.parse_options(["script", "--all"])),
+        (str(second), mod.parse_options(["script", "clean.txt"])),
+    ]
+
+    results = asyncio.run(mod.fix_many(targets, limit=2))
+
+    assert [r[0] for r in results] == [3, 3, 0]
+    assert _staged(run_command, first) == ["a.txt"]
+    assert sorted(_staged(run_command, second)) == ["b.txt", "clean.txt"]
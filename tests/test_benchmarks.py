@@ -0,0 +1,40 @@
+"""Smoke tests for the benchmark suite."""
+
+import importlib.util
+import platform
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def bench(project_root):
+    path = project_root / "benchmarks" / "bench_trim_spaces.py"
+    spec = importlib.util.spec_from_file_location("bench_trim_spaces", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_synth_paths_are_unique_and_deterministic(bench):
+    paths = bench.synth_paths(500, depth=3, density=0.5, seed=1)
+    assert len(set(paths)) == 500
+    assert paths == bench.synth_paths(500, depth=3, density=0.5, seed=1)
+    assert all(p.count("/") == 3 for p in paths)
+    assert any(" " in p for p in paths)
+
+
+def test_synth_paths_density_zero_is_clean(bench):
+    assert not any(" " in p for p in bench.synth_paths(200, depth=2, density=0.0))
+
+
+@pytest.mark.skipif(
+    platform.system() == "Windows",
+    reason="Filesystem spacing edge-cases not portable on Windows",
+)
+@pytest.mark.parametrize("style", ["none", "collapse", "underscore", "remove"])
+def test_run_scenario_reports_metrics(bench, style):
+    result = bench.run_scenario(200, depth=2, density=0.3, style=style)
+    assert result["exit_code"] == 3
+    assert result["messy"] > 0
+    assert result["total_s"] >= result["plan_s"] + result["apply_s"] - 1e-3
+    assert 0 < result["subprocesses"] <= 5
@@ -0,0 +1,146 @@
+"""Tests for the optional result cache."""
+
+import json
+import platform
+from unittest.mock import patch
+
+import pytest
+
+from trim_spaces_in_paths import trim_spaces_in_paths as mod
+
+
+class TestFindGitDir:
+    """Test locating the git directory without spawning git."""
+
+    def test_from_root_and_subdirectory(self, git_repo, monkeypatch):
+        monkeypatch.delenv("GIT_DIR", raising=False)
+        (git_repo / "a" / "b").mkdir(parents=True)
+        assert mod.find_git_dir(str(git_repo)) == str(git_repo / ".git")
+        assert mod.find_git_dir(str(git_repo / "a" / "b")) == str(git_repo / ".git")
+
+    def test_gitdir_file(self, tmp_path, monkeypatch):
+        monkeypatch.delenv("GIT_DIR", raising=False)
+        (tmp_path / ".git").write_text("gitdir: ../real/.git\n")
+        assert mod.find_git_dir(str(tmp_path)) == str(tmp_path.parent / "real" / ".git")
+
+    def test_git_dir_env(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("GIT_DIR", str(tmp_path))
+        assert mod.find_git_dir() == str(tmp_path)
+
+
+def test_index_fingerprint_tracks_index_changes(git_repo, run_command):
+    git_dir = str(git_repo / ".git")
+    assert mod.index_fingerprint(git_dir) is None  # no index yet
+    (git_repo / "a.txt").write_text("a")
+    run_command(["git", "add", "a.txt"], cwd=git_repo)
+    first = mod.index_fingerprint(git_dir)
+    assert first == mod.index_fingerprint(git_dir)
+    (git_repo / "b.txt").write_text("b")
+    run_command(["git", "add", "b.txt"], cwd=git_repo)
+    assert mod.index_fingerprint(git_dir) != first
+
+
+class TestResultCache:
+    """Test the on-disk cache itself."""
+
+    def test_round_trip(self, tmp_path):
+        cache = mod.ResultCache(str(tmp_path))
+        cache.mark_clean("key", "fp")
+        cache.save()
+
+        again = mod.ResultCache(str(tmp_path))
+        assert again.is_clean("key", "fp")
+        assert not again.is_clean("key", "other")
+        assert not again.is_clean("other", "fp")
+
+    def test_bounded_lru_eviction(self, tmp_path):
+        cache = mod.ResultCache(str(tmp_path), max_runs=2)
+        cache.mark_clean("a", "fp")
+        cache.mark_clean("b", "fp")
+        cache.mark_clean("a", "fp")  # refreshes "a"
+        cache.mark_clean("c", "fp")
+        assert not cache.is_clean("b", "fp")
+        assert cache.is_clean("a", "fp")
+        assert cache.is_clean("c", "fp")
+
+    def test_corrupt_or_foreign_file_is_ignored(self, tmp_path):
+        path = tmp_path / mod.CACHE_DIR / "cache.json"
+        path.parent.mkdir()
+        path.write_text("{not json")
+        assert mod.ResultCache(str(tmp_path)).clean == {}
+        path.write_text(json.dumps({"version": 1, "clean": {"x": "y"}}))
+        assert mod.ResultCache(str(tmp_path)).clean == {}
+
+    def test_only_clean_runs_are_stored(self, tmp_path):
+        cache = mod.ResultCache(str(tmp_path))
+        cache.mark_clean("key", "fp")
+        cache.save()
+        data = json.loads((tmp_path / mod.CACHE_DIR / "cache.json").read_text())
+        assert data == {"version": mod.ResultCache.VERSION, "clean": {"key": "fp"}}
+
+
+def test_parse_cache_options():
+    opts = mod.parse_options(["script", "--cache-size=10", "a"])
+    assert opts.cache is True
+    assert opts.cache_size == 10
+    with pytest.raises(SystemExit) as exc_info:
+        mod.parse_options(["script", "--cache-size=lots"])
+    assert exc_info.value.code == 2
+
+
+@pytest.mark.skipif(
+    platform.system() == "Windows",
+    reason="Filesystem spacing edge-cases not portable on Windows",
+)
+class TestCachedRuns:
+    """Test skipping runs on an unchanged staging area."""
+
+    @pytest.fixture
+    def repo(self, git_repo, run_command, monkeypatch):
+        monkeypatch.delenv("GIT_DIR", raising=False)
+        monkeypatch.delenv("GIT_INDEX_FILE", raising=False)
+        (git_repo / "a b.txt").write_text("a")
+        run_command(["git", "add", "."], cwd=git_repo)
+        monkeypatch.chdir(git_repo)
+        return git_repo
+
+    def test_clean_run_is_remembered(self, repo):
+        assert mod.main(["script", "--cache", "--all"]) == 0
+        assert (repo / ".git" / mod.CACHE_DIR / "cache.json").exists()
+        with (
+            patch.object(mod, "iter_tracked_paths", side_effect=AssertionError),
+            patch.object(mod, "plan_renames", side_effect=AssertionError),
+        ):
+            assert mod.main(["script", "--cache", "--all"]) == 0
+
+    def test_index_change_invalidates(self, repo, run_command):
+        assert mod.main(["script", "--cache", "--all"]) == 0
+        (repo / " c.txt").write_text("c")
+        run_command(["git", "add", "--", " c.txt"], cwd=repo)
+        assert mod.main(["script", "--cache", "--all"]) == 3
+
+    @pytest.mark.usefixtures("repo")
+    def test_options_are_part_of_the_key(self):
+        assert mod.main(["script", "--cache", "a b.txt"]) == 0
+        assert (
+            mod.main(["script", "--cache", "--internal-style=remove", "a b.txt"]) == 3
+        )
+
+    @pytest.mark.usefixtures("repo")
+    def test_failing_runs_are_not_remembered(self):
+        args = ["script", "--cache", "--internal-style=remove", "x  y", "x y"]
+        assert mod.main(args) == 1
+        assert mod.main(args) == 1
+
+    def test_runs_from_a_subdirectory_are_separate(
+        self, repo, run_command, monkeypatch
+    ):
+        (repo / "sub").mkdir()
+        (repo / "sub" / "x.txt").write_text("x")
+        (repo / " top.txt").write_text("t")
+        run_command(["git", "add", "."], cwd=repo)
+        monkeypatch.chdir(repo / "sub")
+        assert mod.main(["script", "--cache", "--all"]) == 0
+        monkeypatch.chdir(repo)
+        assert mod.main(["script", "--cache", "--all"]) == 3
+        assert (repo / "top.txt").exists()
@@ -0,0 +1,91 @@
+"""Tests for the side-effect-free --check mode."""
+
+import json
+import platform
+from unittest.mock import patch
+
+import pytest
+
+from trim_spaces_in_paths import trim_spaces_in_paths as mod
+
+needs_posix = pytest.mark.skipif(
+    platform.system() == "Windows",
+    reason="Filesystem spacing edge-cases not portable on Windows",
+)
+
+
+@pytest.fixture
+def repo_files():
+    return (" a .txt", "dir /b.txt", "clean.txt")
+
+
+def test_parse_check_options():
+    assert mod.parse_options(["script"]).check is None
+    assert mod.parse_options(["script", "--check"]).check == "json"
+    assert mod.parse_options(["script", "--check=nul"]).check == "nul"
+    with pytest.raises(SystemExit) as exc_info:
+        mod.parse_options(["script", "--check=xml"])
+    assert exc_info.value.code == 2
+
+
+def test_check_clean_inputs_spawn_nothing(capsys):
+    with patch.object(mod, "run", side_effect=AssertionError("spawned git")):
+        assert mod.main(["script", "--check", "clean.txt"]) == 0
+    doc = json.loads(capsys.readouterr().out)
+    assert doc["renames"] == []
+    assert doc["errors"] == []
+
+
+@needs_posix
+def test_check_emits_json_plan_without_changes(messy_repo, run_command, capsys):
+    before = run_command(["git", "ls-files", "-s"], cwd=messy_repo).stdout
+    oid = run_command(["git", "rev-parse", ": a .txt"], cwd=messy_repo).stdout.strip()
+
+    calls = []
+    real_run = mod.run
+
+    def counting_run(cmd, *args, **kwargs):
+        calls.append(cmd)
+        return real_run(cmd, *args, **kwargs)
+
+    with patch.object(mod, "run", side_effect=counting_run):
+        rc = mod.main(["script", "--check", " a .txt", "dir /b.txt", "clean.txt"])
+
+    assert rc == 3
+    doc = json.loads(capsys.readouterr().out)
+    assert doc["internal_style"] == "none"
+    assert doc["errors"] == []
+    renames = {r["src"]: r for r in doc["renames"]}
+    assert renames[" a .txt"] == {
+        "src": " a .txt",
+        "dst": "a .txt",
+        "mode": "100644",
+        "oid": oid,
+    }
+    assert renames["dir /b.txt"]["dst"] == "dir/b.txt"
+    # Only rev-parse and ls-files; nothing was moved
+    assert [c[1] for c in calls] == ["rev-parse", "ls-files"]
+    assert run_command(["git", "ls-files", "-s"], cwd=messy_repo).stdout == before
+    assert (messy_repo / " a .txt").exists()
+
+
+@needs_posix
+@pytest.mark.usefixtures("messy_repo")
+def test_check_nul_records(capsysbinary):
+    assert mod.main(["script", "--check=nul", "--all"]) == 3
+    out = capsysbinary.readouterr().out
+    fields = out.split(b"\0")
+    assert fields[-1] == b""
+    pairs = set(zip(fields[:-1:2], fields[1::2], strict=True))
+    assert pairs == {(b" a .txt", b"a .txt"), (b"dir /b.txt", b"dir/b.txt")}
+
+
+@needs_posix
+@pytest.mark.usefixtures("messy_repo")
+def test_check_reports_conflicts(capsys):
+    rc = mod.main(["script", "--check", "--internal-style=remove", "x  y", "x y"])
+    assert rc == 1
+    captured = capsys.readouterr()
+    doc = json.loads(captured.out)
+    assert doc["errors"] and doc["errors"][0].startswith("Conflict:")
+    assert "Conflict:" in captured.err
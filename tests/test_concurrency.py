@@ -0,0 +1,193 @@
+"""Tests for coordination between parallel hook processes."""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from trim_spaces_in_paths import trim_spaces_in_paths as mod
+
+needs_posix = pytest.mark.skipif(
+    platform.system() == "Windows",
+    reason="Filesystem spacing edge-cases not portable on Windows",
+)
+
+
+@pytest.fixture
+def git_dir(git_repo, monkeypatch):
+    monkeypatch.chdir(git_repo)
+    monkeypatch.setenv(mod.SESSION_ENV, "test-session")
+    return str(git_repo / ".git")
+
+
+def _claims(git_dir):
+    with open(os.path.join(git_dir, mod.CACHE_DIR, "claims.json")) as f:
+        return json.load(f)
+
+
+def _as_other_process(git_dir, pid=1):
+    # Rewrite our own claims as if another hook process had made them
+    path = os.path.join(git_dir, mod.CACHE_DIR, "claims.json")
+    data = _claims(git_dir)
+    for table in (data["files"], data["dirs"]):
+        for claim in table.values():
+            claim[1] = pid
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def test_run_locked_retries_on_index_lock():
+    busy = SimpleNamespace(
+        returncode=128,
+        stderr=b"fatal: Unable to create '.git/index.lock': File exists.",
+    )
+    ok = SimpleNamespace(returncode=0, stderr=b"")
+    with (
+        patch.object(mod, "run", side_effect=[busy, busy, ok]) as run,
+        patch.object(mod, "_backoff"),
+    ):
+        assert mod.run_locked(["git", "update-index"]) is ok
+    assert run.call_count == 3
+
+
+def test_run_locked_does_not_retry_other_errors():
+    failed = SimpleNamespace(returncode=128, stderr=b"fatal: bad object")
+    with patch.object(mod, "run", return_value=failed) as run:
+        assert mod.run_locked(["git", "update-index"]) is failed
+    assert run.call_count == 1
+
+
+def test_run_locked_gives_up_after_timeout():
+    busy = SimpleNamespace(returncode=128, stderr=b"index.lock: File exists")
+    with patch.object(mod, "run", return_value=busy), patch.object(mod, "_backoff"):
+        assert mod.run_locked(["git", "update-index"], timeout=0) is busy
+
+
+def test_untracked_files_are_staged_through_the_lock_retry(git_dir, run_command):
+    open(" a", "w").close()
+    busy = SimpleNamespace(returncode=128, stderr=b"index.lock: File exists")
+    real_run = mod.run
+    calls = []
+
+    def run(cmd, *args, **kwargs):
+        calls.append(cmd)
+        if len(calls) == 1:
+            return busy
+        return real_run(cmd, *args, **kwargs)
+
+    errors = []
+    with patch.object(mod, "run", side_effect=run), patch.object(mod, "_backoff"):
+        assert mod.add_untracked([(" a", "a")], errors) == [(" a", "a")]
+    assert errors == []
+    assert len(calls) == 2
+    staged = run_command(["git", "ls-files"], cwd=os.path.dirname(git_dir))
+    assert staged.stdout.splitlines() == ["a"]
+
+
+def test_file_lock_is_exclusive(tmp_path):
+    path = str(tmp_path / "x.lock")
+    with mod.FileLock(path):
+        assert os.path.exists(path)
+        with pytest.raises(TimeoutError), mod.FileLock(path, timeout=0):
+            pass
+    assert not os.path.exists(path)
+
+
+def test_file_lock_breaks_stale_locks(tmp_path):
+    path = tmp_path / "x.lock"
+    path.write_text("12345")
+    os.utime(path, (0, 0))
+    with mod.FileLock(str(path), timeout=0):
+        assert path.read_text() == str(os.getpid())
+
+
+def test_claims_from_the_same_process_are_not_conflicts(git_dir):
+    plan = [(" a", "a")]
+    assert mod.claim_targets(plan, git_dir) == (plan, [])
+    assert mod.claim_targets(plan, git_dir) == (plan, [])
+    assert _claims(git_dir)["files"]["a"][0] == " a"
+
+
+def test_cross_process_same_target(git_dir):
+    mod.claim_targets([(" a", "a")], git_dir)
+    _as_other_process(git_dir)
+    kept, errors = mod.claim_targets([("a ", "a")], git_dir)
+    assert kept == []
+    assert errors == [
+        "Conflict: both ' a' and 'a ' would become 'a' (in another hook process)"
+    ]
+
+
+def test_cross_process_file_versus_directory(git_dir):
+    mod.claim_targets([(" d/x", "d/x")], git_dir)
+    _as_other_process(git_dir)
+    kept, errors = mod.claim_targets([(" d", "d"), ("e ", "d/x/y")], git_dir)
+    assert kept == []
+    assert errors == [
+        "Conflict: ' d' would become 'd', which ' d/x' needs as a directory "
+        "(in another hook process)",
+        "Conflict: ' d/x' would become 'd/x', which 'e ' needs as a directory "
+        "(in another hook process)",
+    ]
+
+
+def test_claims_from_other_sessions_are_dropped(git_dir, monkeypatch):
+    mod.claim_targets([(" a", "a")], git_dir)
+    _as_other_process(git_dir)
+    monkeypatch.setenv(mod.SESSION_ENV, "next-commit")
+    assert mod.claim_targets([("a ", "a")], git_dir) == ([("a ", "a")], [])
+
+
+@needs_posix
+def test_parallel_chunks_detect_cross_chunk_conflict(git_repo, run_command):
+    """Two hook processes given different halves of a colliding pair."""
+    for name in ("x  y.txt", "x y.txt"):
+        (git_repo / name).write_text(name)
+    run_command(["git", "add", "."], cwd=git_repo)
+
+    env = dict(os.environ, **{mod.SESSION_ENV: "parallel"})
+    cmd = [sys.executable, mod.__file__, "--internal-style=remove"]
+    procs = [
+        subprocess.Popen(
+            cmd + [name],
+            cwd=git_repo,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        for name in ("x  y.txt", "x y.txt")
+    ]
+    codes = sorted(p.wait() for p in procs)
+    assert codes == [1, 3]
+    tracked = run_command(["git", "ls-files"], cwd=git_repo).stdout.split()
+    assert "xy.txt" in tracked
+
+
+def test_claims_are_released_after_the_run(git_dir, git_repo, stage_files):
+    stage_files(git_repo, [" a.txt", "d /b.txt"])
+    assert mod.main(["script", " a.txt", "d /b.txt"]) == 3
+    assert _claims(git_dir)["files"] == {}
+    assert _claims(git_dir)["dirs"] == {}
+
+
+def test_released_target_that_now_exists_is_a_conflict(git_dir):
+    """Another process renamed into it and let its claim go."""
+    open("a", "w").close()
+    open(" a", "w").close()
+    kept, errors = mod.claim_targets([(" a", "a")], git_dir)
+    assert kept == []
+    assert errors == ["Conflict: ' a' would become 'a', which exists"]
+
+
+def test_claims_live_in_the_planned_repository(git_dir, tmp_path_factory, monkeypatch):
+    """Planning against another root must not claim in the cwd's repository."""
+    elsewhere = tmp_path_factory.mktemp("elsewhere")
+    monkeypatch.setattr(mod, "repo_root", lambda: elsewhere)
+    with patch.object(mod, "git_mv", return_value=True):
+        assert mod.main(["script", " test.txt"]) == 3
+    assert not os.path.exists(os.path.join(git_dir, mod.CACHE_DIR, "claims.json"))
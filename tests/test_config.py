@@ -0,0 +1,175 @@
+"""Tests for configuration files (.trim-spaces-in-paths.toml, pyproject.toml)."""
+
+import os
+import platform
+import sys
+
+import pytest
+
+from trim_spaces_in_paths import trim_spaces_in_paths as mod
+
+needs_posix = pytest.mark.skipif(
+    platform.system() == "Windows",
+    reason="Filesystem spacing edge-cases not portable on Windows",
+)
+
+
+@pytest.fixture
+def repo(git_repo, monkeypatch):
+    monkeypatch.chdir(git_repo)
+    return git_repo
+
+
+def _bump(path):
+    # Make sure a rewrite is seen even on coarse mtime filesystems
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+@pytest.mark.usefixtures("repo")
+def test_no_config():
+    assert mod.load_config() == []
+
+
+def test_outside_a_repository(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert mod.load_config() == []
+
+
+def test_dedicated_file(repo):
+    (repo / mod.CONFIG_FILE).write_text(
+        'internal-style = "collapse"\n'
+        'whitespace = ["space", "nbsp"]\n'
+        "cache = true\n"
+        "cache-size = 50\n"
+        "case-insensitive = false\n"
+    )
+    assert mod.load_config() == [
+        "--internal-style=collapse",
+        "--whitespace=space,nbsp",
+        "--cache",
+        "--cache-size=50",
+    ]
+
+
+def test_pyproject_section(repo):
+    (repo / "pyproject.toml").write_text(
+        '[project]\nname = "x"\n\n[tool.trim-spaces-in-paths]\ninternal-style = "remove"\n'
+    )
+    assert mod.load_config() == ["--internal-style=remove"]
+
+
+def test_pyproject_without_section(repo):
+    (repo / "pyproject.toml").write_text('[project]\nname = "x"\n')
+    assert mod.load_config() == []
+
+
+def test_dedicated_file_wins_over_pyproject(repo):
+    (repo / mod.CONFIG_FILE).write_text('internal-style = "underscore"\n')
+    (repo / "pyproject.toml").write_text(
+        '[tool.trim-spaces-in-paths]\ninternal-style = "remove"\n'
+    )
+    assert mod.load_config() == ["--internal-style=underscore"]
+
+
+def test_found_from_a_subdirectory(repo, monkeypatch):
+    (repo / mod.CONFIG_FILE).write_text('internal-style = "collapse"\n')
+    (repo / "sub").mkdir()
+    monkeypatch.chdir(repo / "sub")
+    assert mod.load_config() == ["--internal-style=collapse"]
+
+
+@pytest.mark.parametrize(
+    "text, message",
+    [
+        ("colour = true\n", "unknown setting 'colour'"),
+        ('cache = "yes"\n', "'cache' must be true or false"),
+        ('cache-size = "big"\n', "'cache-size' must be an integer"),
+        ("internal-style = [", "Invalid"),
+    ],
+)
+def test_invalid_config(repo, text, message):
+    (repo / mod.CONFIG_FILE).write_text(text)
+    with pytest.raises(mod.ConfigError, match=message):
+        mod.load_config()
+
+
+def test_parsed_config_is_cached_by_mtime(repo, monkeypatch):
+    config = repo / mod.CONFIG_FILE
+    config.write_text('internal-style = "collapse"\n')
+    assert mod.load_config() == ["--internal-style=collapse"]
+
+    monkeypatch.setitem(sys.modules, "tomllib", None)
+    monkeypatch.setitem(sys.modules, "tomli", None)
+    assert mod.load_config() == ["--internal-style=collapse"]
+
+    monkeypatch.undo()
+    monkeypatch.chdir(repo)
+    config.write_text('internal-style = "remove"\n')
+    _bump(config)
+    assert mod.load_config() == ["--internal-style=remove"]
+
+
+def test_unreadable_config_is_not_cached(repo, monkeypatch, capsys):
+    (repo / mod.CONFIG_FILE).write_text('internal-style = "collapse"\n')
+    monkeypatch.setitem(sys.modules, "tomllib", None)
+    monkeypatch.setitem(sys.modules, "tomli", None)
+    assert mod.load_config() == []
+    assert "needs Python 3.11+ or tomli" in capsys.readouterr().err
+
+    monkeypatch.undo()
+    monkeypatch.chdir(repo)
+    assert mod.load_config() == ["--internal-style=collapse"]
+
+
+def test_pyproject_without_table_needs_no_parser(repo, monkeypatch, capsys):
+    (repo / "pyproject.toml").write_text("[tool.ruff]\nline-length = 88\n")
+    monkeypatch.setitem(sys.modules, "tomllib", None)
+    monkeypatch.setitem(sys.modules, "tomli", None)
+    assert mod.load_config() == []
+    assert capsys.readouterr().err == ""
+
+
+def test_main_invalid_config(repo, capsys):
+    (repo / mod.CONFIG_FILE).write_text("colour = true\n")
+    assert mod.main(["script", "a.txt"]) == 2
+    assert "Invalid configuration" in capsys.readouterr().err
+    assert mod.main(["script", "--no-config", "a.txt"]) == 0
+
+
+@needs_posix
+def test_command_line_overrides_config(repo, run_command):
+    (repo / mod.CONFIG_FILE).write_text('internal-style = "remove"\n')
+    for name in (" a b.txt", " c d.txt"):
+        (repo / name).write_text(name)
+    run_command(["git", "add", "."], cwd=repo)
+
+    assert mod.main(["script", " a b.txt"]) == 3
+    assert mod.main(["script", "--internal-style=underscore", " c d.txt"]) == 3
+    tracked = run_command(["git", "ls-files"], cwd=repo).stdout.splitlines()
+    assert sorted(tracked) == [mod.CONFIG_FILE, "ab.txt", "c_d.txt"]
+
+
+def _hook_args(project_root):
+    """The args the published hook passes, from .pre-commit-hooks.yaml."""
+    for line in (project_root / ".pre-commit-hooks.yaml").read_text().splitlines():
+        key, _, value = line.strip().partition(":")
+        if key == "args":
+            return [a.strip() for a in value.strip(" []").split(",") if a.strip()]
+    return []
+
+
+@needs_posix
+def test_config_applies_under_the_published_hook(repo, run_command, project_root):
+    """The hook's own default args must not override the repository's config."""
+    (repo / "pyproject.toml").write_text(
+        '[tool.trim-spaces-in-paths]\ninternal-style = "underscore"\n'
+    )
+    (repo / "my dir").mkdir()
+    (repo / "my dir" / "a b.txt").write_text("x")
+    run_command(["git", "add", "."], cwd=repo)
+
+    argv = ["trim-spaces-in-paths", *_hook_args(project_root), "my dir/a b.txt"]
+    assert mod.main(argv) == 3
+    tracked = run_command(["git", "ls-files"], cwd=repo).stdout.splitlines()
+    assert sorted(tracked) == ["my_dir/a_b.txt", "pyproject.toml"]
@@ -0,0 +1,106 @@
+"""Tests for --include/--exclude path filtering."""
+
+import platform
+from unittest.mock import patch
+
+import pytest
+
+from trim_spaces_in_paths import trim_spaces_in_paths as mod
+
+needs_posix = pytest.mark.skipif(
+    platform.system() == "Windows",
+    reason="Filesystem spacing edge-cases not portable on Windows",
+)
+
+
+@pytest.mark.parametrize(
+    "pattern, path, expected",
+    [
+        # Anchored literal prefixes
+        ("third_party", "third_party", True),
+        ("/vendor", "vendor/x", True),
+        ("/vendor", "src/vendor/x", False),
+        ("docs/gen", "docs/gen/a", True),
+        ("docs/gen", "docs/generated/a", False),
+        ("docs/gen", "src/docs/gen/a", False),
+        # Component names at any depth
+        ("node_modules", "node_modules/x", True),
+        ("node_modules/", "web/node_modules/pkg/a b.js", True),
+        ("node_modules", "web/node_modules2/a", False),
+        # A trailing slash alone does not anchor, as in .gitignore
+        ("third_party/", "third_party/lib/a b.c", True),
+        ("third_party/", "src/third_party/a b.c", True),
+        # Globs on component names and on anchored paths
+        ("*.min.js", "static/app .min.js", True),
+        ("*.min.js", "static/app.js", False),
+        ("build-*", "out/build-1/a", True),
+        ("docs/*/gen", "docs/v1/gen/a", True),
+        ("docs/*/gen", "docs/v1/x/a", False),
+        # In paths, `*` and `?` stay within one component; `**` spans several
+        ("docs/*.md", "docs/a b.md", True),
+        ("docs/*.md", "docs/a/b .md", False),
+        ("docs/?", "docs/a/b", True),
+        ("docs/a?b", "docs/a/b", False),
+        ("docs/[!x]b", "docs//b", False),
+        ("docs/**/*.md", "docs/a/b .md", True),
+        ("docs/**/*.md", "docs/b .md", True),
+        ("**/gen/*.py", "src/pkg/gen/a .py", True),
+    ],
+)
+def test_pattern_matching(pattern, path, expected):
+    assert mod.PatternSet([pattern]).matches(path) is expected
+
+
+def test_filter_excludes_win_over_includes():
+    keep = mod.PathFilter(["src/"], ["src/gen/"])
+    assert keep("src/a b.py")
+    assert not keep("src/gen/a b.py")
+    assert not keep("tests/a b.py")
+
+
+def test_filter_uses_prefix():
+    keep = mod.PathFilter([], ["/vendor"], prefix="sub/")
+    assert keep("vendor/a")
+    assert not mod.PathFilter([], ["/sub/vendor"], prefix="sub/")("vendor/a")
+
+
+def test_parse_patterns():
+    opts = mod.parse_options(
+        [
+            "script",
+            "--exclude=third_party/,node_modules",
+            "--exclude=*.gen",
+            "--include=src",
+        ]
+    )
+    assert opts.exclude == ["third_party/", "node_modules", "*.gen"]
+    assert opts.include == ["src"]
+    assert opts.files == []
+
+
+def test_excluded_inputs_are_not_normalized(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with patch.object(mod, "run", side_effect=AssertionError("spawned git")):
+        assert (
+            mod.main(["script", "--exclude=node_modules", "node_modules/a b/c .js"])
+            == 0
+        )
+
+
+@needs_posix
+def test_all_mode_skips_excluded_trees(git_repo, run_command, stage_files, monkeypatch):
+    stage_files(git_repo, ["third_party/ x.c", "web/node_modules/ y.js", "src/ z.py"])
+    monkeypatch.chdir(git_repo)
+
+    args = ["script", "--all", "--exclude=third_party/,node_modules"]
+    assert mod.main(args) == 3
+    tracked = run_command(["git", "ls-files"], cwd=git_repo).stdout.splitlines()
+    assert sorted(tracked) == ["src/z.py", "third_party/ x.c", "web/node_modules/ y.js"]
+    assert mod.main(args) == 0
+    assert mod.main([*args, "--native-index"]) == 0
+
+
+def test_patterns_from_config(git_repo, monkeypatch):
+    (git_repo / mod.CONFIG_FILE).write_text('exclude = ["third_party/", "*.gen"]\n')
+    monkeypatch.chdir(git_repo)
+    assert mod.load_config() == ["--exclude=third_party/,*.gen"]
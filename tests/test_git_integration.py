@@ -22,14 +22,14 @@ def test_script_is_executable(script_path):
         )
 
 
-def test_script_can_be_executed_directly(script_path, project_root, run_command):
+def test_script_can_be_executed_directly(script_path, tmp_path, run_command):
     """Test that the script can be executed directly without python prefix."""
     # This test only works on Unix-like systems
     if platform.system() == "Windows":
         pytest.skip("Direct execution test not applicable on Windows")
 
     # Try to execute the script directly
-    result = run_command([str(script_path), "--help"], cwd=project_root)
+    result = run_command([str(script_path), "--help"], cwd=tmp_path)
     # The script doesn't have --help, so it should exit with code 0 (no args)
     assert result.returncode == 0, f"Script execution failed: {result.stderr}"
 
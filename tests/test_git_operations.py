@@ -154,7 +154,7 @@ class TestGitMvErrorHandling:
 
         with patch.object(mod, "run") as mock_run:
             # Mock git mv failure
-            mock_run.return_value = Mock(returncode=1)
+            mock_run.return_value = Mock(returncode=1, stderr=b"")
 
             with patch("os.replace", side_effect=FileNotFoundError):
                 result = mod.git_mv("nonexistent.txt", "new.txt")
@@ -166,7 +166,7 @@ class TestGitMvErrorHandling:
 
         with patch.object(mod, "run") as mock_run:
             # Mock git mv failure
-            mock_run.return_value = Mock(returncode=1)
+            mock_run.return_value = Mock(returncode=1, stderr=b"")
 
             with (
                 patch("os.replace", side_effect=OSError("Permission denied")),
@@ -183,7 +183,7 @@ class TestGitMvErrorHandling:
 
         with patch.object(mod, "run") as mock_run:
             # Mock git mv failure
-            mock_run.return_value = Mock(returncode=1)
+            mock_run.return_value = Mock(returncode=1, stderr=b"")
 
             with (
                 patch("os.replace") as mock_replace,
@@ -201,7 +201,7 @@ class TestGitMvErrorHandling:
 
         with patch.object(mod, "run") as mock_run:
             # Mock git mv failure
-            mock_run.return_value = Mock(returncode=1)
+            mock_run.return_value = Mock(returncode=1, stderr=b"")
 
             with (
                 patch("os.replace") as mock_replace,
@@ -217,3 +217,64 @@ class TestGitMvErrorHandling:
         """Test git_mv when source equals destination (mocked version)."""
         result = mod.git_mv("same.txt", "same.txt")
         assert result is False
+
+
+class TestIndexSnapshot:
+    """Test the in-memory index snapshot."""
+
+    def test_snapshot_is_lazy(self):
+        """Creating a snapshot does not spawn git."""
+        from unittest.mock import patch
+
+        with patch.object(mod, "run") as mock_run:
+            mod.IndexSnapshot()
+            mock_run.assert_not_called()
+
+    def test_snapshot_reads_index_once(self, git_repo, run_command, monkeypatch):
+        """All lookups are answered from a single ls-files read."""
+        (git_repo / "a.txt").write_text("a")
+        (git_repo / "b.sh").write_text("b")
+        (git_repo / "b.sh").chmod(0o755)
+        run_command(["git", "add", "a.txt", "b.sh"], cwd=git_repo)
+        oid = run_command(["git", "rev-parse", ":a.txt"], cwd=git_repo).stdout.strip()
+        monkeypatch.chdir(git_repo)
+
+        calls = []
+        real_run = mod.run
+        monkeypatch.setattr(
+            mod, "run", lambda cmd, *a, **k: calls.append(cmd) or real_run(cmd, *a, **k)
+        )
+        index = mod.IndexSnapshot()
+        assert mod.is_tracked("a.txt", index) is True
+        assert mod.is_tracked("missing.txt", index) is False
+        assert index.oid("a.txt") == oid
+        assert index.mode("a.txt") == "100644"
+        assert index.get("b.sh")[0] == (
+            "100644" if sys.platform == "win32" else "100755"
+        )
+        assert index.get("missing.txt") is None
+        assert len(calls) == 1
+
+    def test_snapshot_with_prefix(self, git_repo, run_command, monkeypatch):
+        """Snapshot keys are relative to the current subdirectory."""
+        (git_repo / "sub").mkdir()
+        (git_repo / "sub" / "c.txt").write_text("c")
+        (git_repo / "top.txt").write_text("t")
+        run_command(["git", "add", "."], cwd=git_repo)
+        monkeypatch.chdir(git_repo / "sub")
+
+        index = mod.IndexSnapshot("sub/")
+        assert "c.txt" in index
+        assert "top.txt" not in index
+        assert len(index) == 1
+
+    def test_snapshot_move_updates_entries(self, git_repo, run_command, monkeypatch):
+        """git_mv() keeps the snapshot in sync with the renames it performs."""
+        (git_repo / " d.txt").write_text("d")
+        run_command(["git", "add", "--", " d.txt"], cwd=git_repo)
+        monkeypatch.chdir(git_repo)
+
+        index = mod.IndexSnapshot()
+        assert mod.git_mv(" d.txt", "d.txt", index) is True
+        assert "d.txt" in index
+        assert " d.txt" not in index
@@ -0,0 +1,258 @@
+"""Tests for the apply journal and --resume/--rollback."""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from trim_spaces_in_paths import trim_spaces_in_paths as mod
+
+pytestmark = pytest.mark.skipif(
+    platform.system() == "Windows",
+    reason="Filesystem spacing edge-cases not portable on Windows",
+)
+
+NAMES = (" a.txt", " b.txt", "dir /c.txt", "dir /d.txt", "keep.txt")
+
+
+@pytest.fixture
+def repo_files():
+    return NAMES
+
+
+def _state(run_command, repo):
+    staged = run_command(["git", "ls-files", "-s"], cwd=repo).stdout
+    files = sorted(
+        str(p.relative_to(repo)) for p in repo.rglob("*") if ".git" not in p.parts
+    )
+    return staged, files
+
+
+def _journals(repo):
+    base = repo / ".git" / mod.CACHE_DIR
+    return sorted(base.glob(mod.JOURNAL_PREFIX + "*")) if base.exists() else []
+
+
+def _interrupt_after(n):
+    """A _replace that is cut short by Ctrl-C after `n` moves."""
+    real = mod._replace
+    calls = []
+
+    def replace(src, dst, vacated):
+        if len(calls) == n:
+            raise KeyboardInterrupt
+        calls.append((src, dst))
+        real(src, dst, vacated)
+
+    return patch.object(mod, "_replace", side_effect=replace)
+
+
+def _interrupted_run(repo, capsys):
+    with _interrupt_after(1):
+        assert mod.main(["script", *NAMES]) == 130
+    assert "--resume" in capsys.readouterr().err
+    assert len(_journals(repo)) == 1
+
+
+def test_parse_recovery_options():
+    assert mod.parse_options(["script", "--resume"]).resume
+    assert mod.parse_options(["script", "--rollback"]).rollback
+    with pytest.raises(SystemExit) as exc_info:
+        mod.parse_options(["script", "--resume", "--rollback"])
+    assert exc_info.value.code == 2
+
+
+def test_journal_round_trip(tmp_path):
+    """Step lines are read back; a torn last line is ignored."""
+    entry = (" a", "a", "100644", "0" * 40, False)
+    batch = mod.MoveBatch("sub/", [(" a", "a")], entries=[entry])
+    journal = mod.Journal.create(str(tmp_path), batch)
+    journal.mark("op:0")
+    journal.close()
+    with open(journal.path, "ab") as f:
+        f.write(b"ind")
+
+    loaded = mod.Journal.load(journal.path)
+    assert loaded.done == {"op:0"}
+    assert loaded.resumed
+    assert loaded.batch.prefix == "sub/"
+    assert loaded.batch.ops == [(" a", "a")]
+    assert loaded.batch.entries == [entry]
+    loaded.mark("index")
+    loaded.close()
+    assert mod.Journal.load(journal.path).done == {"op:0", "index"}
+
+
+def test_successful_run_leaves_no_journal(messy_repo):
+    assert mod.main(["script", *NAMES]) == 3
+    assert _journals(messy_repo) == []
+
+
+def test_interrupted_run_blocks_new_runs(messy_repo, capsys):
+    _interrupted_run(messy_repo, capsys)
+    assert mod.main(["script", " b.txt"]) == 1
+    assert "--rollback" in capsys.readouterr().err
+
+
+def test_resume_finishes_interrupted_run(messy_repo, run_command, capsys):
+    _interrupted_run(messy_repo, capsys)
+    assert mod.main(["script", "--resume"]) == 3
+    assert _journals(messy_repo) == []
+
+    staged, files = _state(run_command, messy_repo)
+    assert files == ["a.txt", "b.txt", "dir", "dir/c.txt", "dir/d.txt", "keep.txt"]
+    assert "\ta.txt\n" in staged and "\tdir/d.txt\n" in staged
+    assert "\t " not in staged and "dir /" not in staged
+    assert mod.main(["script", "--resume"]) == 0
+
+
+def test_resume_tolerates_move_missing_from_journal(messy_repo, run_command, capsys):
+    """A move done just before the interruption but never logged."""
+    _interrupted_run(messy_repo, capsys)
+    journal = mod.Journal.load(str(_journals(messy_repo)[0]))
+    first = next(
+        op for n, op in enumerate(journal.batch.ops) if f"op:{n}" not in journal.done
+    )
+    journal.close()
+    (messy_repo / first[0]).rename(messy_repo / first[1])
+
+    assert mod.main(["script", "--resume"]) == 3
+    staged, _ = _state(run_command, messy_repo)
+    assert "\t " not in staged and "dir /" not in staged
+
+
+def test_rollback_restores_original_state(messy_repo, run_command, capsys):
+    before = _state(run_command, messy_repo)
+    _interrupted_run(messy_repo, capsys)
+    assert mod.main(["script", "--rollback"]) == 3
+    assert "Rolled back" in capsys.readouterr().out
+    assert _state(run_command, messy_repo) == before
+    assert _journals(messy_repo) == []
+
+
+def test_rollback_finds_every_move_missing_from_journal(
+    messy_repo, run_command, capsys
+):
+    """With --jobs, each thread may have moved a file it never logged."""
+    before = _state(run_command, messy_repo)
+    _interrupted_run(messy_repo, capsys)
+    journal = mod.Journal.load(str(_journals(messy_repo)[0]))
+    pending = [
+        op for n, op in enumerate(journal.batch.ops) if f"op:{n}" not in journal.done
+    ]
+    journal.close()
+    assert len(pending) > 1
+    for src, dst in pending:
+        (messy_repo / src).rename(messy_repo / dst)
+
+    assert mod.main(["script", "--rollback"]) == 3
+    assert _state(run_command, messy_repo) == before
+
+
+def test_rollback_after_failed_index_update(messy_repo, run_command, capsys):
+    """Files moved but the index kept the old names: undo the moves."""
+    before = _state(run_command, messy_repo)
+    real_run_locked = mod.run_locked
+
+    def failing(cmd, *args, **kwargs):
+        if "--index-info" in cmd:
+            cmd = ["git", "update-index", "--no-such-option"]
+        return real_run_locked(cmd, *args, **kwargs)
+
+    with patch.object(mod, "run_locked", side_effect=failing):
+        assert mod.main(["script", *NAMES]) == 1
+    assert "--resume" in capsys.readouterr().err
+    assert len(_journals(messy_repo)) == 1
+
+    assert mod.main(["script", "--rollback"]) == 3
+    assert _state(run_command, messy_repo) == before
+
+
+def test_rollback_untracked_files(git_repo, run_command, monkeypatch):
+    for name in (" x.txt", " y.txt"):
+        (git_repo / name).write_text(name)
+    monkeypatch.chdir(git_repo)
+    before = _state(run_command, git_repo)
+
+    calls = []
+    real_replace = mod.os.replace
+
+    def replace(src, dst):
+        if mod.CACHE_DIR in src:
+            return real_replace(src, dst)  # the claims file
+        if calls:
+            raise KeyboardInterrupt
+        calls.append(src)
+        real_replace(src, dst)
+
+    with patch.object(mod.os, "replace", side_effect=replace):
+        assert mod.main(["script", " x.txt", " y.txt"]) == 130
+    assert mod.main(["script", "--rollback"]) == 3
+    assert _state(run_command, git_repo) == before
+
+
+def test_rollback_fallback_moves(git_repo, run_command, monkeypatch):
+    """Untracked directories moved before the interruption go back unstaged."""
+    for name in (" d", " e"):
+        (git_repo / name).mkdir()
+        (git_repo / name / "x.txt").write_text(name)
+    monkeypatch.chdir(git_repo)
+    before = _state(run_command, git_repo)
+
+    calls = []
+    real_replace = mod.os.replace
+
+    def replace(src, dst):
+        if mod.CACHE_DIR in src:
+            return real_replace(src, dst)  # the claims file
+        if calls:
+            raise KeyboardInterrupt
+        calls.append(src)
+        real_replace(src, dst)
+
+    with patch.object(mod.os, "replace", side_effect=replace):
+        assert mod.main(["script", " d", " e"]) == 130
+    assert mod.main(["script", "--rollback"]) == 3
+    assert _state(run_command, git_repo) == before
+
+
+def test_rollback_from_other_directory(git_repo, run_command, stage_files, monkeypatch):
+    """Recovery runs from the directory the interrupted run started in."""
+    stage_files(git_repo, ["sub/ e.txt", "sub/ f.txt"])
+    before = _state(run_command, git_repo)
+
+    monkeypatch.chdir(git_repo / "sub")
+    with _interrupt_after(1):
+        assert mod.main(["script", " e.txt", " f.txt"]) == 130
+    monkeypatch.chdir(git_repo)
+    assert mod.main(["script", "--rollback"]) == 3
+    assert _state(run_command, git_repo) == before
+
+
+def _journal_of(repo, pid, session):
+    base = repo / ".git" / mod.CACHE_DIR
+    base.mkdir(parents=True, exist_ok=True)
+    path = base / f"{mod.JOURNAL_PREFIX}{pid}"
+    path.write_text(json.dumps({"pid": pid, "session": session}) + "\n")
+    return str(path)
+
+
+def test_find_journals_skips_only_live_processes_of_this_session(git_repo, monkeypatch):
+    """A CLI run's session is its shell, which outlives an interrupted run."""
+    monkeypatch.setenv(mod.SESSION_ENV, "shell")
+    done = subprocess.Popen([sys.executable, "-c", ""])
+    done.wait()
+    running = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        stale = _journal_of(git_repo, done.pid, "shell")
+        _journal_of(git_repo, running.pid, "shell")
+        reused = _journal_of(git_repo, os.getppid(), "earlier")
+        git_dir = str(git_repo / ".git")
+        assert mod.find_journals(git_dir) == sorted([stale, reused])
+    finally:
+        running.kill()
+        running.wait()
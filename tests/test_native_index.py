@@ -0,0 +1,162 @@
+"""Tests for the in-process index reader (--native-index)."""
+
+import platform
+import time
+
+import pytest
+
+from trim_spaces_in_paths import trim_spaces_in_paths as mod
+
+pytestmark = pytest.mark.skipif(
+    platform.system() == "Windows",
+    reason="Filesystem spacing edge-cases not portable on Windows",
+)
+
+FILES = ("a b/c/one.txt", "a b/c/two two.txt", "a b/x", "sub/y", "z", " top.txt")
+
+
+@pytest.fixture
+def repo_files():
+    return FILES
+
+
+@pytest.fixture
+def repo(messy_repo, run_command):
+    (messy_repo / "z").chmod(0o755)
+    (messy_repo / "link").symlink_to("z")
+    run_command(["git", "add", "--", "z", "link"], cwd=messy_repo)
+    return messy_repo
+
+
+def _git_view(prefix=""):
+    return mod.IndexSnapshot(prefix).entries
+
+
+@pytest.mark.parametrize("version", [2, 3, 4])
+def test_read_index_matches_ls_files(repo, run_command, version):
+    run_command(["git", "update-index", f"--index-version={version}"], cwd=repo)
+    if version >= 3:
+        # Extended flags only exist from version 3 on
+        run_command(["git", "update-index", "--skip-worktree", "sub/y"], cwd=repo)
+    entries = mod.read_index(str(repo / ".git"))
+    assert entries == _git_view()
+    assert entries["z"][0] == "100755"
+    assert entries["link"][0] == "120000"
+    assert mod.read_index(str(repo / ".git"), "a b/") == _git_view("a b/")
+
+
+def test_read_index_keeps_lowest_unmerged_stage(repo, run_command):
+    oid = run_command(["git", "rev-parse", ":z"], cwd=repo).stdout.strip()
+    info = "".join(f"100644 {oid} {stage}\tconflicted\n" for stage in (1, 2, 3))
+    run_command(
+        ["sh", "-c", f"printf '{info}' | git update-index --index-info"], cwd=repo
+    )
+    entries = mod.read_index(str(repo / ".git"))
+    assert entries["conflicted"] == ("100644", oid, 1)
+    assert entries == _git_view()
+
+
+def test_read_index_without_index_file(git_repo):
+    assert mod.read_index(str(git_repo / ".git")) == {}
+
+
+def test_split_index_falls_back_to_git(repo, run_command, monkeypatch):
+    run_command(["git", "update-index", "--split-index"], cwd=repo)
+    with pytest.raises(mod.UnsupportedIndex):
+        mod.read_index(str(repo / ".git"))
+
+    calls = []
+    real_run = mod.run
+    monkeypatch.setattr(
+        mod, "run", lambda cmd, **kw: calls.append(cmd) or real_run(cmd, **kw)
+    )
+    snapshot = mod.IndexSnapshot(native=True)
+    assert set(snapshot.entries) == set(FILES) | {"link"}
+    assert [c[1] for c in calls] == ["ls-files"]
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b"", b"DIRC\0\0\0\x05" + b"\0" * 30, b"DIRC\0\0\0\x02\0\0\0\x01" + b"\0" * 40],
+    ids=["empty", "version-5", "truncated"],
+)
+def test_parse_index_rejects_unsupported_data(data):
+    with pytest.raises(mod.UnsupportedIndex):
+        list(mod.parse_index(data))
+
+
+@pytest.mark.usefixtures("repo")
+def test_native_snapshot_runs_no_git(monkeypatch):
+    monkeypatch.setattr(mod, "run", lambda *_, **__: pytest.fail("ran git"))
+    snapshot = mod.IndexSnapshot("a b/", native=True)
+    assert set(snapshot.entries) == {"c/one.txt", "c/two two.txt", "x"}
+
+
+def test_all_with_native_index(repo, run_command, monkeypatch):
+    calls = []
+    real_run = mod.run
+    monkeypatch.setattr(
+        mod, "run", lambda cmd, **kw: calls.append(cmd) or real_run(cmd, **kw)
+    )
+    monkeypatch.setattr(
+        mod, "iter_tracked_paths", lambda *_: pytest.fail("listed with git")
+    )
+    assert mod.main(["script", "--all", "--native-index"]) == 3
+
+    assert [c[1] for c in calls] == ["rev-parse", "update-index"]
+    tracked = run_command(["git", "ls-files"], cwd=repo).stdout.splitlines()
+    assert "top.txt" in tracked
+    assert "a b/c/two two.txt" in tracked
+
+
+@pytest.mark.parametrize("version", [2, 3, 4])
+def test_parse_index_screens_raw_paths(repo, run_command, version):
+    run_command(["git", "update-index", f"--index-version={version}"], cwd=repo)
+    data = (repo / ".git" / "index").read_bytes()
+    screened = list(mod.parse_index(data, 20, (b" ",)))
+    assert screened == [e for e in mod.parse_index(data) if b" " in e[0]]
+    assert [e[0] for e in screened] == [
+        b" top.txt",
+        b"a b/c/one.txt",
+        b"a b/c/two two.txt",
+        b"a b/x",
+    ]
+
+
+def test_clean_all_with_native_index_parses_no_entries(
+    git_repo, stage_files, monkeypatch
+):
+    stage_files(git_repo, ["clean.txt", "sub/clean.txt"])
+    monkeypatch.chdir(git_repo)
+    monkeypatch.setattr(mod, "read_index", lambda *_: pytest.fail("parsed it all"))
+    monkeypatch.setattr(
+        mod, "iter_tracked_paths", lambda *_: pytest.fail("listed with git")
+    )
+    assert mod.main(["script", "--all", "--native-index"]) == 0
+
+
+def test_all_with_split_index_lists_with_git(repo, run_command):
+    run_command(["git", "update-index", "--split-index"], cwd=repo)
+    assert mod.main(["script", "--all", "--native-index"]) == 3
+    tracked = run_command(["git", "ls-files"], cwd=repo).stdout.splitlines()
+    assert "top.txt" in tracked
+
+
+def test_native_all_is_not_slower_than_ls_files(git_repo, run_command, monkeypatch):
+    oid = run_command(["git", "hash-object", "-w", "--", "/dev/null"]).stdout.strip()
+    info = "".join(f"100644 {oid}\td{i // 100}/f{i}.txt\n" for i in range(50000))
+    (git_repo.parent / "info").write_text(info)
+    run_command(["sh", "-c", "git update-index --index-info < ../info"], cwd=git_repo)
+    monkeypatch.chdir(git_repo)
+
+    def best(argv):
+        opts = mod.parse_options(argv)
+        runs = []
+        for _ in range(5):
+            start = time.perf_counter()
+            assert mod.build_plan(opts) == ([], [], None)
+            runs.append(time.perf_counter() - start)
+        return min(runs)
+
+    native = best(["script", "--all", "--native-index"])
+    assert native <= best(["script", "--all"])
@@ -1,3 +1,5 @@
+import pytest
+
 from trim_spaces_in_paths import trim_spaces_in_paths as mod
 
 
@@ -63,3 +65,158 @@ class TestNormalizeComponentEdgeCases:
         """Test normalize_component remove style edge case."""
         result = mod.normalize_component("  a b c  ", "remove")
         assert result == "abc"
+
+
+def _reference_component(comp, internal_style):
+    """The original char-by-char implementation, kept as an oracle."""
+    s = comp.strip(" ")
+    if internal_style == "collapse":
+        out = []
+        prev_space = False
+        for ch in s:
+            if ch == " ":
+                if not prev_space:
+                    out.append(" ")
+                prev_space = True
+            else:
+                out.append(ch)
+                prev_space = False
+        return "".join(out)
+    if internal_style == "underscore":
+        return s.replace(" ", "_")
+    if internal_style == "remove":
+        return s.replace(" ", "")
+    return s
+
+
+def _reference_path(path, internal_style):
+    norm_parts = []
+    for c in path.split("/"):
+        nc = _reference_component(c, internal_style)
+        if nc == "":
+            return None, f"component '{c}' would become empty after normalization"
+        norm_parts.append(nc)
+    return "/".join(norm_parts), None
+
+
+STYLES = ["none", "collapse", "underscore", "remove", "unknown"]
+
+
+def _random_strings(alphabet, count, max_len, seed=0):
+    import random
+
+    rng = random.Random(seed)
+    return [
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(0, max_len)))
+        for _ in range(count)
+    ]
+
+
+class TestNormalizerEquivalence:
+    """The table-driven, memoized normalizer matches the original behaviour."""
+
+    @pytest.mark.parametrize("style", STYLES)
+    def test_components(self, style):
+        for comp in _random_strings(" ab_.\t ", 2000, 12):
+            assert mod.normalize_component(comp, style) == _reference_component(
+                comp, style
+            )
+
+    @pytest.mark.parametrize("style", STYLES)
+    def test_paths(self, style):
+        normalizer = mod.Normalizer(style)
+        for path in _random_strings(" ab/.", 2000, 16, seed=1):
+            expected = _reference_path(path, style)
+            assert normalizer.path(path) == expected
+            assert mod.normalize_path(path, style) == expected
+
+    def test_repeated_components_are_memoized(self):
+        normalizer = mod.Normalizer("collapse")
+        for i in range(100):
+            normalizer.path(f" src /  project  /file {i}.txt")
+        info = normalizer.component.cache_info()
+        assert info.misses == 102
+        assert info.hits == 198
+
+    def test_memo_is_bounded(self):
+        normalizer = mod.Normalizer("remove", maxsize=16)
+        for i in range(100):
+            normalizer.component(f" c {i}")
+        assert normalizer.component.cache_info().currsize == 16
+
+    def test_memo_is_per_run(self):
+        mod.normalize_path(" a ", "none")
+        assert "none" in mod._normalizers
+        mod.main(["script", "clean.txt"])
+        assert mod._normalizers == {}
+
+
+class TestWhitespaceRules:
+    """Configurable whitespace sets compiled into the normalizer."""
+
+    def test_default_rules_match_builtin_behaviour(self):
+        rules = mod.WhitespaceRules()
+        for style in STYLES:
+            for comp in _random_strings(" ab\t .", 500, 10, seed=2):
+                assert mod.normalize_component(
+                    comp, style, rules
+                ) == mod.normalize_component(comp, style)
+
+    def test_extra_characters_behave_like_spaces(self):
+        rules = mod.WhitespaceRules("space,nbsp,tab")
+        for style in STYLES:
+            for comp in _random_strings(" ab\t ", 500, 10, seed=3):
+                folded = comp.replace("\t", " ").replace(" ", " ")
+                assert mod.normalize_component(
+                    comp, style, rules
+                ) == _reference_component(folded, style)
+
+    @pytest.mark.parametrize(
+        "spec, path, expected",
+        [
+            ("unicode", "　a b\t/c", "a b/c"),
+            ("zero-width", "a​b /﻿c", "ab/c"),
+            ("trailing-dots", "dir. /file.txt.", "dir/file.txt"),
+            ("trailing-dots", "../x/./y", "../x/./y"),
+            ("U+3164", "ㅤx", "x"),
+        ],
+    )
+    def test_rule_sets(self, spec, path, expected):
+        rules = mod.WhitespaceRules(spec)
+        assert rules.screen(path)
+        assert mod.normalize_path(path, "none", rules) == (expected, None)
+
+    def test_screen_ignores_unaffected_paths(self):
+        rules = mod.WhitespaceRules("unicode,zero-width,trailing-dots")
+        assert not rules.screen("dir/file.txt")
+        assert not rules.screen(".hidden/a")
+        assert rules.screen("a b")
+
+    def test_component_that_is_only_dots(self):
+        rules = mod.WhitespaceRules("trailing-dots")
+        path, err = mod.normalize_path("a/.../b", "none", rules)
+        assert path is None
+        assert err == "component '...' would become empty after normalization"
+
+    @pytest.mark.parametrize("spec", ["emoji", "U+ZZ", "U+110000"])
+    def test_invalid_specs(self, spec):
+        with pytest.raises(ValueError):
+            mod.WhitespaceRules(spec)
+
+    def test_parse_whitespace_option(self):
+        opts = mod.parse_options(["script", "--whitespace=nbsp,zero-width"])
+        assert opts.rules.spec == "nbsp,zero-width"
+        assert mod.parse_options(["script", "--whitespace=space"]).rules is None
+        with pytest.raises(SystemExit) as exc_info:
+            mod.parse_options(["script", "--whitespace=bogus"])
+        assert exc_info.value.code == 2
+
+    def test_plan_uses_rules(self):
+        rules = mod.WhitespaceRules("nbsp")
+        pairs, errors = mod.plan_renames(
+            ["ok.txt", "a .txt", "b .txt"], "remove", rules=rules
+        )
+        assert errors == []
+        assert sorted(pairs) == [("a .txt", "a.txt"), ("b .txt", "b.txt")]
+        assert mod.needs_normalizing(["a .txt"], rules)
+        assert not mod.needs_normalizing(["a .txt"])
@@ -0,0 +1,80 @@
+"""Tests for the trie-based rename plan."""
+
+from pathlib import Path
+
+import pytest
+
+from trim_spaces_in_paths import trim_spaces_in_paths as mod
+
+
+class CountingNormalizer(mod.Normalizer):
+    def __init__(self, internal_style):
+        super().__init__(internal_style)
+        self.calls = []
+        self.component = self._counting
+
+    def _counting(self, comp):
+        self.calls.append(comp)
+        return self._component(comp)
+
+
+def test_directories_are_normalized_once():
+    normalizer = CountingNormalizer("collapse")
+    plan = mod.RenamePlan(normalizer)
+    for i in range(10):
+        plan.add(f" src /  pkg  /f {i}.py")
+    assert normalizer.calls.count(" src ") == 1
+    assert normalizer.calls.count("  pkg  ") == 1
+    assert len(plan.pairs) == 10
+    assert plan.errors == []
+
+
+@pytest.mark.parametrize(
+    "paths",
+    [["a/b", "a /b/c"], ["a /b/c", "a/b"]],
+    ids=["file-first", "directory-first"],
+)
+def test_file_versus_directory_conflict(paths):
+    _, errors = mod.plan_renames(paths, "none")
+    assert errors == ["Conflict: 'a/b' is a file, but 'a /b/c' needs it as a directory"]
+
+
+def test_renamed_file_versus_renamed_directory_conflict():
+    pairs, errors = mod.plan_renames([" a /b ", "a/ b/c"], "none")
+    assert errors == [
+        "Conflict: ' a /b ' would become 'a/b', which 'a/ b/c' needs as a directory"
+    ]
+    assert pairs == [(" a /b ", "a/b")]
+
+
+def test_same_target_conflict_message():
+    _, errors = mod.plan_renames(["  test  .txt", " test .txt"], "remove")
+    assert errors == [
+        "Conflict: both '  test  .txt' and ' test .txt' would become 'test.txt'"
+    ]
+
+
+def test_unchanged_input_occupies_its_name():
+    pairs, errors = mod.plan_renames(["a b", " a b"], "none")
+    assert pairs == []
+    assert errors == ["Conflict: both 'a b' and ' a b' would become 'a b'"]
+
+
+def test_unchanged_inputs_not_tracked_when_streaming():
+    pairs, errors = mod.plan_renames(["a/b", "a /b/c"], "none", track_unchanged=False)
+    assert errors == []
+    assert pairs == [("a /b/c", "a/b/c")]
+
+
+def test_siblings_under_renamed_directory_do_not_conflict():
+    pairs, errors = mod.plan_renames([" d /a", " d /b", "d/c"], "none")
+    assert errors == []
+    assert sorted(pairs) == [(" d /a", "d/a"), (" d /b", "d/b")]
+
+
+@pytest.mark.parametrize(
+    "path",
+    ["a/b", "a//b", "./a", "a/./b", "a/", ".hidden/x", "a/.b", "x", " a /b "],
+)
+def test_as_posix_matches_pathlib(path):
+    assert mod.as_posix(path) == Path(path).as_posix()
@@ -0,0 +1,73 @@
+"""Tests for index-only renames of skip-worktree (sparse checkout) entries."""
+
+import platform
+
+import pytest
+
+from trim_spaces_in_paths import trim_spaces_in_paths as mod
+
+pytestmark = pytest.mark.skipif(
+    platform.system() == "Windows",
+    reason="Filesystem spacing edge-cases not portable on Windows",
+)
+
+
+@pytest.fixture
+def repo_files():
+    return (" outside/a.txt", " outside/b .txt", "keep/ c.txt")
+
+
+@pytest.fixture
+def sparse_repo(messy_repo, run_command):
+    run_command(["git", "commit", "-q", "-m", "init"], cwd=messy_repo)
+    run_command(["git", "sparse-checkout", "set", "--cone", "keep"], cwd=messy_repo)
+    assert not (messy_repo / " outside").exists()
+    return messy_repo
+
+
+def _tags(run_command, repo):
+    out = run_command(["git", "ls-files", "-t"], cwd=repo).stdout
+    return dict(line.split(" ", 1)[::-1] for line in out.splitlines())
+
+
+@pytest.mark.usefixtures("sparse_repo")
+@pytest.mark.parametrize("native", [False, True], ids=["ls-files", "native"])
+def test_snapshot_knows_skip_worktree_entries(native):
+    index = mod.IndexSnapshot(native=native)
+    assert index.skip_worktree == {" outside/a.txt", " outside/b .txt"}
+
+
+@pytest.mark.parametrize("native", [False, True], ids=["ls-files", "native"])
+def test_all_renames_entries_outside_the_checkout(sparse_repo, run_command, native):
+    args = ["script", "--all"] + (["--native-index"] if native else [])
+    assert mod.main(args) == 3
+
+    assert _tags(run_command, sparse_repo) == {
+        "outside/a.txt": "S",
+        "outside/b .txt": "S",
+        "keep/c.txt": "H",
+    }
+    # Nothing was materialized, and git sees no deletions
+    assert not (sparse_repo / "outside").exists()
+    assert not (sparse_repo / " outside").exists()
+    status = run_command(
+        ["git", "status", "--porcelain", "-z", "--no-renames"], cwd=sparse_repo
+    ).stdout
+    entries = sorted(filter(None, status.split("\0")))
+    assert entries == [
+        "A  keep/c.txt",
+        "A  outside/a.txt",
+        "A  outside/b .txt",
+        "D   outside/a.txt",
+        "D   outside/b .txt",
+        "D  keep/ c.txt",
+    ]
+
+
+def test_index_only_keeps_blob_and_mode(sparse_repo, run_command):
+    before = run_command(["git", "rev-parse", ": outside/a.txt"], cwd=sparse_repo)
+    changed, errors = mod.apply_moves([(" outside/a.txt", "outside/a.txt")])
+    assert errors == []
+    assert changed == [(" outside/a.txt", "outside/a.txt")]
+    after = run_command(["git", "rev-parse", ":outside/a.txt"], cwd=sparse_repo)
+    assert after.stdout == before.stdout
@@ -0,0 +1,64 @@
+"""Tests for the no-op fast path and its startup cost."""
+
+import os
+import subprocess
+import sys
+import time
+from unittest.mock import patch
+
+from trim_spaces_in_paths import trim_spaces_in_paths as mod
+
+# Wall-clock budget for a full interpreter run of the hook on clean paths.
+# Interpreter startup alone is ~20-50 ms; the budget leaves room for slow CI.
+NOOP_STARTUP_BUDGET = 1.0
+# In-process budget for screening a large chunk of clean paths.
+NOOP_SCREEN_BUDGET = 0.1
+
+
+def test_noop_spawns_no_git():
+    """Clean inputs return 0 without spawning any process."""
+    with (
+        patch.object(mod, "run", side_effect=AssertionError("spawned git")),
+        patch.object(mod, "repo_root", side_effect=AssertionError("spawned git")),
+    ):
+        assert (
+            mod.main(["script", "a.txt", "dir/b.txt", "--internal-style=remove"]) == 0
+        )
+
+
+def test_noop_does_not_import_subprocess_or_pathlib(project_root, tmp_path):
+    """The no-op path avoids importing subprocess and pathlib."""
+    code = (
+        "import sys\n"
+        "from trim_spaces_in_paths.trim_spaces_in_paths import main\n"
+        "rc = main(['hook', 'a.txt', 'dir/b.txt'])\n"
+        "print(rc, 'subprocess' in sys.modules, 'pathlib' in sys.modules)\n"
+    )
+    p = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        # Outside this checkout, so its .git is left alone
+        cwd=tmp_path,
+        env={**os.environ, "PYTHONPATH": str(project_root)},
+    )
+    assert p.stdout.split() == ["0", "False", "False"]
+
+
+def test_noop_startup_latency(script_path, tmp_path):
+    """A full hook run on clean paths stays within a fixed time budget."""
+    cmd = [sys.executable, str(script_path), "a.txt", "dir/b.txt"]
+    start = time.perf_counter()
+    p = subprocess.run(cmd, capture_output=True, check=False, cwd=tmp_path)
+    elapsed = time.perf_counter() - start
+    assert p.returncode == 0
+    assert elapsed < NOOP_STARTUP_BUDGET
+
+
+def test_noop_screening_latency():
+    """Screening a large chunk of clean paths is effectively free."""
+    paths = [f"src/pkg{i % 100}/module_{i}.py" for i in range(20_000)]
+    start = time.perf_counter()
+    assert mod.main(["script", *paths]) == 0
+    assert time.perf_counter() - start < NOOP_SCREEN_BUDGET
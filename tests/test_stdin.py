@@ -0,0 +1,117 @@
+"""Tests for reading paths from stdin (--stdin, -z)."""
+
+import io
+import platform
+import subprocess
+import sys
+import types
+from unittest.mock import patch
+
+import pytest
+
+from trim_spaces_in_paths import trim_spaces_in_paths as mod
+
+needs_posix = pytest.mark.skipif(
+    platform.system() == "Windows",
+    reason="Filesystem spacing edge-cases not portable on Windows",
+)
+
+
+class TinyReads(io.BytesIO):
+    """A stream that returns at most a few bytes per read."""
+
+    def read(self, size=-1):
+        return super().read(3 if size < 0 else min(size, 3))
+
+
+def _stdin(monkeypatch, data):
+    monkeypatch.setattr(sys, "stdin", types.SimpleNamespace(buffer=io.BytesIO(data)))
+
+
+def test_parse_stdin_options():
+    opts = mod.parse_options(["script", "--stdin", "-z", "a"])
+    assert (opts.stdin, opts.nul, opts.files) == (True, True, ["a"])
+    assert mod.parse_options(["script", "--stdin"]).nul is False
+
+
+@pytest.mark.parametrize("argv", [["--all"], ["--apply-plan", "-"]])
+def test_stdin_conflicting_options(argv):
+    with pytest.raises(SystemExit) as exc_info:
+        mod.parse_options(["script", "--stdin", *argv])
+    assert exc_info.value.code == 2
+
+
+@pytest.mark.parametrize(
+    "data, sep, expected",
+    [
+        (b" a\0b /c\0\0d ", b"\0", [" a", "b /c", "d "]),
+        (b" a\nb /c\n", b"\n", [" a", "b /c"]),
+        (b"new\nline\0x", b"\0", ["new\nline", "x"]),
+    ],
+)
+def test_iter_records_splits_across_chunks(data, sep, expected):
+    records = mod.iter_records(TinyReads(data), sep)
+    assert isinstance(records, types.GeneratorType)
+    assert list(records) == expected
+
+
+def test_clean_stdin_spawns_nothing(monkeypatch):
+    _stdin(monkeypatch, b"a.txt\0b/c.txt\0")
+    with patch.object(mod, "run", side_effect=AssertionError("spawned git")):
+        assert mod.main(["script", "--stdin", "-z"]) == 0
+
+
+@needs_posix
+def test_stdin_renames_tracked_paths(git_repo, run_command, stage_files, monkeypatch):
+    stage_files(git_repo, [" a.txt", "dir /b.txt", "ok.txt"])
+    monkeypatch.chdir(git_repo)
+    listing = subprocess.run(
+        ["git", "ls-files", "-z"], cwd=git_repo, capture_output=True, check=True
+    ).stdout
+    _stdin(monkeypatch, listing)
+
+    assert mod.main(["script", "--stdin", "-z"]) == 3
+    tracked = run_command(["git", "ls-files"], cwd=git_repo).stdout.split()
+    assert sorted(tracked) == ["a.txt", "dir/b.txt", "ok.txt"]
+
+
+@needs_posix
+def test_stdin_is_combined_with_arguments(git_repo, run_command, monkeypatch):
+    for name in (" a.txt", " b.txt"):
+        (git_repo / name).write_text(name)
+    run_command(["git", "add", "."], cwd=git_repo)
+    monkeypatch.chdir(git_repo)
+    _stdin(monkeypatch, b" b.txt\n")
+
+    assert mod.main(["script", "--stdin", " a.txt"]) == 3
+    tracked = run_command(["git", "ls-files"], cwd=git_repo).stdout.split()
+    assert sorted(tracked) == ["a.txt", "b.txt"]
+
+
+@needs_posix
+def test_clean_stdin_paths_are_not_kept(git_repo, stage_files, monkeypatch):
+    stage_files(git_repo, [" a.txt"])
+    monkeypatch.chdir(git_repo)
+    _stdin(monkeypatch, b"".join(b"f%d.txt\0" % i for i in range(1000)) + b" a.txt\0")
+    claims = []
+    real_claim = mod.RenamePlan.claim
+
+    def claim(self, src, dst):
+        claims.append(src)
+        return real_claim(self, src, dst)
+
+    monkeypatch.setattr(mod.RenamePlan, "claim", claim)
+    opts = mod.parse_options(["script", "--stdin", "-z"])
+    assert mod.build_plan(opts)[:2] == ([(" a.txt", "a.txt")], [])
+    assert claims == [" a.txt"]
+
+
+@needs_posix
+def test_stdin_collision_with_tracked_path(git_repo, stage_files, monkeypatch, capsys):
+    stage_files(git_repo, [" a.txt", "a.txt"])
+    monkeypatch.chdir(git_repo)
+    _stdin(monkeypatch, b" a.txt\0a.txt\0")
+
+    assert mod.main(["script", "--stdin", "-z"]) == 1
+    assert "which is already tracked" in capsys.readouterr().err
+    assert (git_repo / " a.txt").exists()
@@ -0,0 +1,100 @@
+"""Tests for the opt-in --timings instrumentation."""
+
+import json
+import platform
+
+import pytest
+
+from trim_spaces_in_paths import trim_spaces_in_paths as mod
+
+
+def test_parse_options_timings_flags(monkeypatch):
+    """--timings is an option, not a file argument."""
+    monkeypatch.delenv(mod.TIMINGS_ENV, raising=False)
+    assert mod.parse_options(["script", "a.txt"]).timings is None
+    opts = mod.parse_options(["script", "--timings", "a.txt"])
+    assert opts.timings == "stderr"
+    assert opts.files == ["a.txt"]
+    assert mod.parse_options(["script", "--timings=out.jsonl"]).timings == "out.jsonl"
+
+
+def test_timings_env_var(monkeypatch):
+    """The environment variable turns instrumentation on without arguments."""
+    monkeypatch.setenv(mod.TIMINGS_ENV, "/tmp/timings.jsonl")
+    assert mod.parse_options(["script"]).timings == "/tmp/timings.jsonl"
+
+
+def test_timings_noop_path(monkeypatch, capsys):
+    """The fast path reports zero git subprocesses."""
+    monkeypatch.delenv(mod.TIMINGS_ENV, raising=False)
+    assert mod.main(["script", "--timings", "clean.txt"]) == 0
+
+    record = json.loads(capsys.readouterr().err)
+    assert record["exit_code"] == 0
+    assert record["git_subprocesses"] == 0
+    assert record["paths_examined"] == 1
+    assert set(record["phases"]) == {"parse", "screen"}
+
+
+@pytest.mark.skipif(
+    platform.system() == "Windows",
+    reason="Filesystem spacing edge-cases not portable on Windows",
+)
+def test_timings_written_to_file(git_repo, run_command, monkeypatch, capsys):
+    """A full run appends one JSON record with every phase to the target file."""
+    monkeypatch.delenv(mod.TIMINGS_ENV, raising=False)
+    (git_repo / " a.txt").write_text("a")
+    run_command(["git", "add", "--", " a.txt"], cwd=git_repo)
+    monkeypatch.chdir(git_repo)
+    out = git_repo.parent / "timings.jsonl"
+
+    assert mod.main(["script", f"--timings={out}", " a.txt", "b.txt"]) == 3
+    assert mod.main(["script", f"--timings={out}", "b.txt"]) == 0
+
+    first, second = (json.loads(line) for line in out.read_text().splitlines())
+    assert first["exit_code"] == 3
+    assert first["paths_examined"] == 2
+    assert first["paths_renamed"] == 1
+    # rev-parse, ls-files, update-index
+    assert first["git_subprocesses"] == 3
+    assert first["git_seconds"] > 0
+    # the old entry removed, the new one added
+    assert first["git_records"] == 2
+    assert set(first["phases"]) == {
+        "parse",
+        "screen",
+        "plan",
+        "repo_root",
+        "conflicts",
+        "coordinate",
+        "apply",
+        "report",
+    }
+    assert second["git_subprocesses"] == 0
+    assert "timings" not in capsys.readouterr().err
+
+
+def test_timings_disabled_after_run(monkeypatch):
+    """Instrumentation state does not leak between runs."""
+    monkeypatch.delenv(mod.TIMINGS_ENV, raising=False)
+    mod.main(["script", "--timings=-", "x.txt"])
+    assert mod._timings is None
+
+
+@pytest.mark.skipif(
+    platform.system() == "Windows",
+    reason="Filesystem spacing edge-cases not portable on Windows",
+)
+def test_timings_count_one_call_for_untracked_files(git_repo, monkeypatch, capsys):
+    """Untracked files are staged together, not one git process each."""
+    monkeypatch.delenv(mod.TIMINGS_ENV, raising=False)
+    for name in (" a.txt", " b.txt"):
+        (git_repo / name).write_text(name)
+    monkeypatch.chdir(git_repo)
+
+    assert mod.main(["script", "--timings", " a.txt", " b.txt"]) == 3
+
+    record = json.loads(capsys.readouterr().err.splitlines()[-1])
+    # rev-parse, ls-files, one update-index
+    assert record["git_subprocesses"] == 3
+    assert record["git_records"] == 2
@@ -0,0 +1,100 @@
+"""Tests for conflicts against already-tracked paths."""
+
+import platform
+import unicodedata
+
+import pytest
+
+from trim_spaces_in_paths import trim_spaces_in_paths as mod
+
+
+def _snapshot(paths):
+    index = mod.IndexSnapshot()
+    index._entries = {p: ("100644", "0" * 40, 0) for p in paths}
+    return index
+
+
+class TestCheckTrackedConflicts:
+    def test_destination_already_tracked(self):
+        index = _snapshot([" a.txt", "a.txt"])
+        kept, errors = mod.check_tracked_conflicts([(" a.txt", "a.txt")], index)
+        assert kept == []
+        assert errors == [
+            "Conflict: ' a.txt' would become 'a.txt', which is already tracked"
+        ]
+
+    def test_destination_moving_away_is_free(self):
+        index = _snapshot([" a", "a"])
+        plan = [(" a", "a"), ("a", "b")]
+        assert mod.check_tracked_conflicts(plan, index) == (plan, [])
+
+    def test_destination_is_tracked_directory(self):
+        index = _snapshot([" d", "d/x.txt"])
+        kept, errors = mod.check_tracked_conflicts([(" d", "d")], index)
+        assert kept == []
+        assert errors == [
+            "Conflict: ' d' would become 'd', which is a tracked directory"
+        ]
+
+    def test_destination_below_tracked_file(self):
+        index = _snapshot(["a/b", "a /b/c"])
+        kept, errors = mod.check_tracked_conflicts([("a /b/c", "a/b/c")], index)
+        assert kept == []
+        assert errors == [
+            "Conflict: 'a/b' is a tracked file, but 'a /b/c' needs it as a directory"
+        ]
+
+    def test_existing_directory_is_fine_for_files(self):
+        index = _snapshot(["d/x.txt", "d/ y.txt"])
+        plan = [("d/ y.txt", "d/y.txt")]
+        assert mod.check_tracked_conflicts(plan, index) == (plan, [])
+
+    def test_case_collisions_only_when_enabled(self):
+        index = _snapshot(["README.md", " readme.md"])
+        plan = [(" readme.md", "readme.md")]
+        assert mod.check_tracked_conflicts(plan, index) == (plan, [])
+        kept, errors = mod.check_tracked_conflicts(plan, index, case_insensitive=True)
+        assert kept == []
+        assert "collides with 'README.md'" in errors[0]
+
+    def test_unicode_normalization_collisions(self):
+        nfc = unicodedata.normalize("NFC", "caf\u00e9.txt")
+        nfd = unicodedata.normalize("NFD", nfc)
+        assert nfc != nfd
+        index = _snapshot([nfd, " " + nfc])
+        plan = [(" " + nfc, nfc)]
+        assert mod.check_tracked_conflicts(plan, index) == (plan, [])
+        _, errors = mod.check_tracked_conflicts(plan, index, case_insensitive=True)
+        assert len(errors) == 1
+        assert "case-insensitive" in errors[0]
+
+    def test_case_collisions_between_planned_destinations(self):
+        index = _snapshot([" A", " a "])
+        plan = [(" A", "A"), (" a ", "a")]
+        kept, errors = mod.check_tracked_conflicts(plan, index, case_insensitive=True)
+        assert kept == [(" A", "A")]
+        assert len(errors) == 1
+
+    def test_fold_path(self):
+        assert mod.fold_path("Straße") == mod.fold_path("STRASSE")
+        assert mod.fold_path("é") == mod.fold_path("é")
+
+
+def test_parse_case_insensitive():
+    assert mod.parse_options(["script"]).case_insensitive is False
+    assert mod.parse_options(["script", "--case-insensitive"]).case_insensitive
+
+
+@pytest.mark.skipif(
+    platform.system() == "Windows",
+    reason="Filesystem spacing edge-cases not portable on Windows",
+)
+def test_main_refuses_to_overwrite_tracked_file(git_repo, run_command, monkeypatch):
+    (git_repo / "a.txt").write_text("keep me")
+    (git_repo / " a.txt").write_text("messy")
+    run_command(["git", "add", "--", "a.txt", " a.txt"], cwd=git_repo)
+    monkeypatch.chdir(git_repo)
+
+    assert mod.main(["script", " a.txt"]) == 1
+    assert (git_repo / "a.txt").read_text() == "keep me"
+    assert (git_repo / " a.txt").exists()
@@ -1,5 +1,5 @@
 """Pre-commit hook for trimming spaces in file and directory names."""
 
-from .trim_spaces_in_paths import main
+from .trim_spaces_in_paths import fix_async, fix_many, main, parse_options, plan_async
 
-__all__ = ["main"]
+__all__ = ["fix_async", "fix_many", "main", "parse_options", "plan_async"]
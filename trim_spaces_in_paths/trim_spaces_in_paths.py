@@ -1,15 +1,163 @@
 #!/usr/bin/env python3
+from __future__ import annotations
+
 import os
-import subprocess
 import sys
-from pathlib import Path
+import time
+
+# subprocess and pathlib are imported where they are used so that the common
+# "nothing to rename" invocation stays as cheap as interpreter startup.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import mmap
+    import subprocess
+    from collections.abc import Callable, Iterable, Iterator
+    from pathlib import Path
+    from typing import BinaryIO
+
+
+TIMINGS_ENV = "TRIM_SPACES_IN_PATHS_TIMINGS"
+
+
+class Timings:
+    # Opt-in instrumentation (--timings): wall time per phase, git subprocess
+    # count and latency, path records fed to git over stdin, paths
+    # examined/renamed. Emitted as one JSON line.
+
+    def __init__(self, start: float) -> None:
+        self.start = start
+        self.last = start
+        self.phases: dict[str, float] = {}
+        self.git_calls = 0
+        self.git_seconds = 0.0
+        self.git_records = 0
+        self.paths_examined = 0
+        self.paths_renamed = 0
+
+    def lap(self, phase: str) -> None:
+        # Charge the time since the previous lap to `phase`
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self.last
+        self.last = now
+
+    def record_git(self, seconds: float) -> None:
+        self.git_calls += 1
+        self.git_seconds += seconds
+
+    def as_dict(self, exit_code: int) -> dict:
+        return {
+            "exit_code": exit_code,
+            "total_s": round(time.perf_counter() - self.start, 6),
+            "phases": {k: round(v, 6) for k, v in self.phases.items()},
+            "git_subprocesses": self.git_calls,
+            "git_seconds": round(self.git_seconds, 6),
+            "git_records": self.git_records,
+            "paths_examined": self.paths_examined,
+            "paths_renamed": self.paths_renamed,
+        }
+
+    def emit(self, exit_code: int, target: str) -> None:
+        import json
+
+        line = json.dumps(self.as_dict(exit_code), sort_keys=True)
+        if target in ("1", "-", "stderr"):
+            print(line, file=sys.stderr)
+            return
+        try:
+            with open(target, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"⚠️  Could not write timings to '{target}': {e}", file=sys.stderr)
+
+
+_timings: Timings | None = None
+
+
+def _lap(phase: str) -> None:
+    if _timings is not None:
+        _timings.lap(phase)
 
 
-def run(cmd: list[str]) -> subprocess.CompletedProcess:
-    return subprocess.run(cmd, capture_output=True, check=False)
+def run(cmd: list[str], input: bytes | None = None) -> subprocess.CompletedProcess:
+    import subprocess
+
+    if _timings is None:
+        return subprocess.run(cmd, input=input, capture_output=True, check=False)
+    start = time.perf_counter()
+    try:
+        return subprocess.run(cmd, input=input, capture_output=True, check=False)
+    finally:
+        _timings.record_git(time.perf_counter() - start)
+
+
+async def run_async(
+    cmd: list[str], input: bytes | None = None, cwd: str | None = None
+) -> subprocess.CompletedProcess:
+    # run() for asyncio callers: independent git queries are awaited
+    # together instead of one after the other
+    import asyncio
+    import subprocess
+
+    start = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=cwd,
+        stdin=subprocess.DEVNULL if input is None else subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await proc.communicate(input)
+    except BaseException:
+        if proc.returncode is None:
+            proc.kill()  # cancelled: do not leave git running
+        raise
+    finally:
+        if _timings is not None:
+            _timings.record_git(time.perf_counter() - start)
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+LOCK_TIMEOUT = 10.0
+
+
+def _backoff(attempt: int) -> None:
+    import random
+
+    time.sleep(min(0.01 * 2**attempt, 0.5) * (0.5 + random.random()))
+
+
+def run_locked(
+    cmd: list[str], input: bytes | None = None, timeout: float = LOCK_TIMEOUT
+) -> subprocess.CompletedProcess:
+    # Parallel hook processes (pre-commit chunks) contend for .git/index.lock;
+    # retry with jittered exponential backoff instead of failing outright.
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    while True:
+        p = run(cmd, input=input)
+        if (
+            p.returncode == 0
+            or b"index.lock" not in p.stderr
+            or time.monotonic() >= deadline
+        ):
+            return p
+        _backoff(attempt)
+        attempt += 1
+
+
+def run_records(cmd: list[str], records: list[bytes]) -> subprocess.CompletedProcess:
+    # Feed NUL-terminated path records to one git process (update-index
+    # --stdin/--index-info, add --pathspec-from-file), so per-path index
+    # work costs a record rather than a fork
+    if _timings is not None:
+        _timings.git_records += len(records)
+    return run_locked(cmd, input=b"".join(r + b"\0" for r in records))
 
 
 def repo_root() -> Path:
+    from pathlib import Path
+
     p = run(["git", "rev-parse", "--show-toplevel"])
     if p.returncode != 0:
         print(p.stderr.decode() or "Not a git repository?", file=sys.stderr)
@@ -17,58 +165,867 @@ def repo_root() -> Path:
     return Path(p.stdout.decode().strip())
 
 
-def is_tracked(path: str) -> bool:
+def repo_prefix(root: Path | str, cwd: str | None = None) -> str:
+    # Index paths are relative to the top-level; inputs are relative to cwd
+    rel = os.path.relpath(cwd or os.getcwd(), root)
+    if rel == "." or rel.startswith(".."):
+        return ""
+    return rel.replace(os.sep, "/") + "/"
+
+
+class UnsupportedIndex(ValueError):
+    pass
+
+
+def _object_format_size(git_dir: str) -> int:
+    # Hash length in bytes: 20 for SHA-1, 32 for repositories created with
+    # extensions.objectFormat = sha256 (config lives in the common dir)
+    common = git_dir
+    try:
+        with open(os.path.join(git_dir, "commondir"), encoding="utf-8") as f:
+            common = os.path.join(git_dir, f.read().strip())
+    except OSError:
+        pass
+    try:
+        with open(os.path.join(common, "config"), encoding="utf-8") as f:
+            for line in f:
+                key, _, value = line.partition("=")
+                if key.strip().lower() == "objectformat":
+                    return 32 if value.strip().lower() == "sha256" else 20
+    except OSError:
+        pass
+    return 20
+
+
+def parse_index(
+    buf: bytes | mmap.mmap,
+    hash_size: int = 20,
+    needles: tuple[bytes, ...] | None = None,
+) -> Iterator[tuple[bytes, int, bytes, int, bool]]:
+    # Yield (path, mode, oid, stage, skip_worktree) straight from the bytes
+    # of a version 2, 3 or 4 index file. With `needles`, only entries whose
+    # path contains one of them are unpacked and yielded; in version 2 and 3
+    # files the rest cost a length lookup, the buffer being searched from
+    # one needle to the next rather than path by path. Raises
+    # UnsupportedIndex for anything the hook cannot read faithfully (split
+    # or sparse indexes, unknown versions); since that is only known once
+    # the extensions after the last entry are seen, callers must not act on
+    # entries before exhausting the iterator.
+    import struct
+
+    if len(buf) < 12 + hash_size or buf[:4] != b"DIRC":
+        raise UnsupportedIndex("not an index file")
+    version, count = struct.unpack_from(">II", buf, 4)
+    if version not in (2, 3, 4):
+        raise UnsupportedIndex(f"index version {version}")
+    # mode (after 24 bytes of stat data) and oid; flags follow the oid
+    unpack = struct.Struct(f">24xI12x{hash_size}s").unpack_from
+    at_flags = 40 + hash_size
+    find = buf.find
+    end = len(buf) - hash_size
+    pos = 12
+    prev = b""
+    hit = -1  # next needle at or after some point before the current path
+
+    def next_hit(at: int) -> int:
+        hits = [h for h in (find(n, at, end) for n in needles) if h >= 0]
+        return min(hits) if hits else end
+
+    for _ in range(count):
+        start = pos
+        pos = start + at_flags + 2
+        if pos > end:
+            raise UnsupportedIndex("corrupt index: truncated entry")
+        flags = buf[start + at_flags] << 8 | buf[start + at_flags + 1]
+        skip = False
+        if flags & 0x4000:
+            if version < 3:
+                raise UnsupportedIndex("extended flags in a version 2 index")
+            skip = bool(buf[pos] & 0x40)  # 0x4000 of the extended flags
+            pos += 2
+        if version == 4:
+            # Path = previous path minus `strip` trailing bytes, plus suffix
+            c = buf[pos]
+            pos += 1
+            strip = c & 0x7F
+            while c & 0x80:
+                c = buf[pos]
+                pos += 1
+                strip = ((strip + 1) << 7) | (c & 0x7F)
+            nul = find(b"\0", pos, end)
+            if nul < 0 or strip > len(prev):
+                raise UnsupportedIndex("corrupt index: bad path")
+            path = prev[: len(prev) - strip] + buf[pos:nul]
+            pos = nul + 1
+            prev = path
+            if needles is not None and not any(n in path for n in needles):
+                continue
+        else:
+            # The flags hold the name length, up to 0xFFF
+            size = flags & 0xFFF
+            nul = pos + size if size < 0xFFF else find(b"\0", pos, end)
+            if nul < 0 or nul >= end or buf[nul]:
+                raise UnsupportedIndex("corrupt index: bad path")
+            # Entries are NUL-padded to a multiple of eight bytes
+            path_at, pos = pos, start + ((nul - start + 8) & ~7)
+            if needles is not None:
+                if hit < path_at:
+                    hit = next_hit(path_at)
+                if hit >= nul:
+                    continue
+                hit = next_hit(nul)
+            path = buf[path_at:nul]
+        mode, oid = unpack(buf, start)
+        if mode & 0o170000 == 0o040000:
+            raise UnsupportedIndex("sparse directory entries")
+        yield path, mode, oid, (flags >> 12) & 3, skip
+
+    while pos + 8 <= end:
+        sig = buf[pos : pos + 4]
+        (size,) = struct.unpack_from(">I", buf, pos + 4)
+        if sig in (b"link", b"sdir"):
+            raise UnsupportedIndex(f"'{sig.decode()}' extension")
+        pos += 8 + size
+
+
+def read_index(
+    git_dir: str, prefix: str = "", skip_worktree: set[str] | None = None
+) -> dict[str, tuple[str, str, int]]:
+    # Memory-map the index and build the same mapping as `ls-files --stage`
+    # for entries under `prefix`, without copying the file or running git.
+    # Skip-worktree paths are added to `skip_worktree` when given.
+    import mmap
+
+    entries: dict[str, tuple[str, str, int]] = {}
+    try:
+        with open(index_path(git_dir), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise UnsupportedIndex("empty index file")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                raw_prefix = os.fsencode(prefix)
+                cut = len(raw_prefix)
+                encoding = sys.getfilesystemencoding()
+                errors = sys.getfilesystemencodeerrors()
+                modes: dict[int, str] = {}
+                for path, mode, oid, stage, skip in parse_index(
+                    buf, _object_format_size(git_dir)
+                ):
+                    if cut:
+                        if not path.startswith(raw_prefix):
+                            continue
+                        path = path[cut:]
+                    # Same as os.fsdecode(), minus its per-call overhead
+                    key = path.decode(encoding, errors)
+                    # Unmerged paths keep their lowest stage, as with ls-files
+                    if key not in entries:
+                        m = modes.get(mode)
+                        if m is None:
+                            m = modes[mode] = f"{mode:06o}"
+                        entries[key] = (m, oid.hex(), stage)
+                        if skip and skip_worktree is not None:
+                            skip_worktree.add(key)
+    except FileNotFoundError:
+        pass  # no index yet: nothing is tracked
+    return entries
+
+
+def _raw_triggers(rules: WhitespaceRules | None) -> tuple[bytes, ...] | None:
+    # Byte strings, one of which is in every encoded path that normalization
+    # may change; None when paths are not UTF-8 and must be decoded first
+    if sys.getfilesystemencoding().lower().replace("-", "") != "utf8":
+        return None
+    if rules is None:
+        return (b" ",)
+    # " " first: it is what almost every messy path has
+    needles = sorted((c.encode() for c in rules.triggers), key=lambda n: n != b" ")
+    if rules.trailing_dots:
+        needles.append(b".")
+    return tuple(needles)
+
+
+def iter_index_paths(
+    git_dir: str, prefix: str = "", rules: WhitespaceRules | None = None
+) -> Iterator[str]:
+    # The --all listing straight from the memory-mapped index: paths under
+    # `prefix` that normalization may change, screened on their raw bytes so
+    # that clean entries are never decoded or kept. Raises OSError or
+    # UnsupportedIndex like read_index(), possibly after the last path.
+    import mmap
+
+    try:
+        with open(index_path(git_dir), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise UnsupportedIndex("empty index file")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                raw_prefix = os.fsencode(prefix)
+                cut = len(raw_prefix)
+                prev = None
+                for path, *_ in parse_index(
+                    buf, _object_format_size(git_dir), _raw_triggers(rules)
+                ):
+                    # Unmerged paths have an entry per stage
+                    if path != prev and path.startswith(raw_prefix):
+                        prev = path
+                        yield os.fsdecode(path[cut:])
+                if _timings is not None:
+                    _timings.paths_examined += int.from_bytes(buf[8:12], "big")
+    except FileNotFoundError:
+        return  # no index yet: nothing is tracked
+
+
+# -t tags each entry; "S" marks skip-worktree
+LS_FILES_STAGE = ["git", "ls-files", "-z", "--stage", "-t", "--full-name", "--", ":/"]
+
+
+class IndexSnapshot:
+    # In-memory view of the index, read with a single `ls-files` on first use
+    # (or parsed in-process with native=True, falling back to git when the
+    # index format is not supported). Keys are cwd-relative paths; values are
+    # (mode, oid, stage).
+
+    def __init__(
+        self, prefix: str = "", native: bool = False, root: str | None = None
+    ) -> None:
+        self.prefix = prefix
+        self.native = native
+        self.root = root  # top of the worktree; the cwd's repository if None
+        self._entries: dict[str, tuple[str, str, int]] | None = None
+        self._skip: set[str] = set()
+
+    @property
+    def entries(self) -> dict[str, tuple[str, str, int]]:
+        if self._entries is None:
+            self._entries = self._load()
+        return self._entries
+
+    @property
+    def git_dir(self) -> str | None:
+        return find_git_dir(self.root)
+
+    @property
+    def skip_worktree(self) -> set[str]:
+        # Entries git does not check out (sparse checkout, skip-worktree);
+        # filled in while the entries are loaded
+        if self._entries is None:
+            self._entries = self._load()
+        return self._skip
+
+    def _load(self) -> dict[str, tuple[str, str, int]]:
+        git_dir = self.git_dir if self.native else None
+        if git_dir is not None:
+            try:
+                return read_index(git_dir, self.prefix, self._skip)
+            except (OSError, UnsupportedIndex):
+                self._skip.clear()
+        p = run(LS_FILES_STAGE)
+        return self._parse_listing(p.stdout if p.returncode == 0 else b"")
+
+    @classmethod
+    def from_listing(
+        cls, prefix: str, data: bytes, root: str | None = None
+    ) -> IndexSnapshot:
+        # A snapshot of `LS_FILES_STAGE` output obtained elsewhere
+        index = cls(prefix, root=root)
+        index._entries = index._parse_listing(data)
+        return index
+
+    def _parse_listing(self, data: bytes) -> dict[str, tuple[str, str, int]]:
+        entries: dict[str, tuple[str, str, int]] = {}
+        cut = len(self.prefix)
+        for rec in data.split(b"\0"):
+            if not rec:
+                continue
+            meta, _, raw = rec.partition(b"\t")
+            path = os.fsdecode(raw)
+            if not path.startswith(self.prefix):
+                continue
+            tag, mode, oid, stage = meta.decode().split(" ")
+            # Unmerged paths keep their lowest stage; they are tracked all the same
+            key = path[cut:]
+            if key not in entries:
+                entries[key] = (mode, oid, int(stage))
+                if tag == "S":
+                    self._skip.add(key)
+        return entries
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, path: str) -> tuple[str, str, int] | None:
+        return self.entries.get(path)
+
+    def mode(self, path: str) -> str | None:
+        entry = self.entries.get(path)
+        return entry[0] if entry else None
+
+    def oid(self, path: str) -> str | None:
+        entry = self.entries.get(path)
+        return entry[1] if entry else None
+
+    def move(self, src: str, dst: str) -> None:
+        self.move_all([(src, dst)])
+
+    def move_all(self, pairs: list[tuple[str, str]]) -> None:
+        # All sources are taken out before any destination is written, so
+        # chains and swaps (a -> b, b -> a) come out right
+        if self._entries is None:
+            return
+        taken = [
+            (dst, self._entries.pop(src, None), src in self._skip) for src, dst in pairs
+        ]
+        self._skip.difference_update(src for src, _ in pairs)
+        for dst, entry, skip in taken:
+            if entry is not None:
+                self._entries[dst] = entry
+            if skip:
+                self._skip.add(dst)
+
+
+def iter_records(stream: BinaryIO, sep: bytes = b"\n") -> Iterator[str]:
+    # Split a byte stream into paths chunk by chunk, never holding more than
+    # one chunk plus a partial record. Lines are taken verbatim: leading and
+    # trailing spaces are exactly what the hook is looking for.
+    tail = b""
+    while True:
+        chunk = stream.read(1 << 16)
+        if not chunk:
+            break
+        records = (tail + chunk).split(sep)
+        tail = records.pop()
+        for rec in records:
+            if rec:
+                if _timings is not None:
+                    _timings.paths_examined += 1
+                yield os.fsdecode(rec)
+    if tail:
+        if _timings is not None:
+            _timings.paths_examined += 1
+        yield os.fsdecode(tail)
+
+
+def input_paths(opts: Options) -> Iterable[str]:
+    # Paths from argv, followed by the --stdin stream when requested
+    if not opts.stdin:
+        return opts.files
+    import itertools
+
+    stream = iter_records(sys.stdin.buffer, b"\0" if opts.nul else b"\n")
+    if opts.path_filter is not None:
+        stream = filter(opts.path_filter, stream)
+    return itertools.chain(opts.files, stream)
+
+
+def iter_tracked_paths(pathspecs: list[str] | None = None) -> Iterator[str]:
+    # Stream `git ls-files -z` without holding the whole listing in memory
+    import subprocess
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        ["git", "ls-files", "-z", "--", *(pathspecs or [])],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    prev = None
+    tail = b""
+    try:
+        while True:
+            chunk = proc.stdout.read(1 << 16)
+            if not chunk:
+                break
+            records = (tail + chunk).split(b"\0")
+            tail = records.pop()
+            for rec in records:
+                # Unmerged paths are listed once per stage
+                if rec != prev:
+                    prev = rec
+                    if _timings is not None:
+                        _timings.paths_examined += 1
+                    yield os.fsdecode(rec)
+    finally:
+        proc.stdout.close()
+        err = proc.stderr.read()
+        proc.stderr.close()
+        returncode = proc.wait()
+        if _timings is not None:
+            _timings.record_git(time.perf_counter() - start)
+    if returncode != 0:
+        print(err.decode() or "git ls-files failed", file=sys.stderr)
+        sys.exit(2)
+
+
+CACHE_DIR = "trim-spaces-in-paths"
+CACHE_SIZE = 256
+
+
+def find_git_dir(start: str | None = None) -> str | None:
+    # Locate the git directory without spawning git
+    env = os.environ.get("GIT_DIR")
+    if env:
+        return os.path.abspath(env)
+    d = os.path.abspath(start or os.getcwd())
+    while True:
+        dotgit = os.path.join(d, ".git")
+        if os.path.isdir(dotgit):
+            return dotgit
+        if os.path.isfile(dotgit):
+            # Worktrees and submodules: "gitdir: <path>"
+            try:
+                with open(dotgit, encoding="utf-8") as f:
+                    line = f.readline().strip()
+            except OSError:
+                return None
+            if line.startswith("gitdir:"):
+                return os.path.normpath(os.path.join(d, line[7:].strip()))
+            return None
+        parent = os.path.dirname(d)
+        if parent == d:
+            return None
+        d = parent
+
+
+def state_dir(git_dir: str) -> str:
+    # Where the hook keeps its files (cache, claims, journals, parsed config)
+    return os.path.join(git_dir, CACHE_DIR)
+
+
+def index_path(git_dir: str) -> str:
+    return os.environ.get("GIT_INDEX_FILE") or os.path.join(git_dir, "index")
+
+
+def index_fingerprint(git_dir: str) -> str | None:
+    # The trailing checksum changes whenever the index does; size and mtime
+    # cover index.skipHash, where the checksum is all zeros.
+    try:
+        with open(index_path(git_dir), "rb") as f:
+            st = os.fstat(f.fileno())
+            f.seek(max(st.st_size - 32, 0))
+            tail = f.read()
+    except OSError:
+        return None
+    return f"{tail.hex()}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def cache_key(opts: Options) -> str:
+    # Everything that can change the outcome of a run, except the index.
+    # Paths and --all are relative to the working directory, so it is too.
+    import hashlib
+
+    h = hashlib.sha1()
+    h.update(
+        f"{os.getcwd()}\0{opts.internal_style}\0{int(opts.all_paths)}\0"
+        f"{int(opts.case_insensitive)}\0{opts.check}\0"
+        f"{opts.rules.spec if opts.rules else ''}\0"
+        f"{','.join(opts.include)}\0{','.join(opts.exclude)}\0".encode()
+    )
+    for f in opts.files:
+        h.update(os.fsencode(f) + b"\0")
+    return h.hexdigest()
+
+
+class ResultCache:
+    # Clean runs (run key -> index fingerprint), stored as JSON under .git/,
+    # bounded and evicting least recently used entries first. Per-path
+    # verdicts are not kept: only paths that need renaming are normalized,
+    # and those are renamed, so the same verdict would never be asked again.
+
+    VERSION = 2
+
+    def __init__(self, git_dir: str, max_runs: int = CACHE_SIZE) -> None:
+        self.path = os.path.join(state_dir(git_dir), "cache.json")
+        self.max_runs = max_runs
+        self.clean: dict[str, str] = {}
+        self.dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        import json
+
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict) or data.get("version") != self.VERSION:
+            return
+        self.clean = dict(data.get("clean", {}))
+
+    def is_clean(self, key: str, fingerprint: str) -> bool:
+        return self.clean.get(key) == fingerprint
+
+    def mark_clean(self, key: str, fingerprint: str) -> None:
+        clean = self.clean
+        clean.pop(key, None)
+        clean[key] = fingerprint
+        while len(clean) > self.max_runs:
+            del clean[next(iter(clean))]
+        self.dirty = True
+
+    def save(self) -> None:
+        import json
+
+        if not self.dirty:
+            return
+        data = {"version": self.VERSION, "clean": self.clean}
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            import contextlib
+
+            print(f"⚠️  Could not write cache '{self.path}': {e}", file=sys.stderr)
+            with contextlib.suppress(OSError):
+                os.remove(tmp)
+        self.dirty = False
+
+
+SESSION_ENV = "TRIM_SPACES_IN_PATHS_SESSION"
+CLAIM_TTL = 600.0
+
+
+class FileLock:
+    # Exclusive lock file (O_CREAT | O_EXCL), polled with backoff. Locks
+    # older than `stale` seconds are assumed abandoned and broken.
+
+    def __init__(
+        self, path: str, timeout: float = LOCK_TIMEOUT, stale: float = 60.0
+    ) -> None:
+        self.path = path
+        self.timeout = timeout
+        self.stale = stale
+        self.fd: int | None = None
+
+    def __enter__(self) -> FileLock:
+        deadline = time.monotonic() + self.timeout
+        attempt = 0
+        while True:
+            try:
+                self.fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(self.fd, str(os.getpid()).encode())
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.stat(self.path).st_mtime > self.stale:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    continue
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"timed out waiting for '{self.path}'")
+            _backoff(attempt)
+            attempt += 1
+
+    def __exit__(self, *exc: object) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            os.remove(self.path)
+
+
+def hook_session() -> str:
+    # Processes started by the same pre-commit run share a parent
+    return os.environ.get(SESSION_ENV) or f"ppid:{os.getppid()}"
+
+
+def _taken(src: str, dst: str) -> bool:
+    # `dst` exists and is not just `src` seen through a case-insensitive name
+    try:
+        st = os.lstat(dst)
+    except OSError:
+        return False
+    try:
+        return not os.path.samestat(st, os.lstat(src))
+    except OSError:
+        return True
+
+
+def claim_targets(
+    plan: list[tuple[str, str]], git_dir: str
+) -> tuple[list[tuple[str, str]], list[str]]:
+    # pre-commit may split the file list across parallel processes, each
+    # seeing only its own chunk. Destinations are registered in a shared,
+    # lock-protected claims file so cross-chunk conflicts are still caught.
+    import json
+
+    base = state_dir(git_dir)
+    path = os.path.join(base, "claims.json")
+    session = hook_session()
+    pid = os.getpid()
+    now = time.time()
+    kept: list[tuple[str, str]] = []
+    errors: list[str] = []
+    try:
+        os.makedirs(base, exist_ok=True)
+        with FileLock(path + ".lock"):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            if data.get("session") != session or now - data.get("time", 0) > CLAIM_TTL:
+                data = {"files": {}, "dirs": {}}
+            files: dict[str, list] = data["files"]
+            dirs: dict[str, list] = data["dirs"]
+
+            def other(claim: list | None, src: str) -> bool:
+                return claim is not None and claim[1] != pid and claim[0] != src
+
+            moving = {src for src, _ in plan}
+            for src, dst in plan:
+                if dst not in moving and _taken(src, dst):
+                    # Released by a process that has already renamed into it
+                    errors.append(
+                        f"Conflict: '{src}' would become '{dst}', which exists"
+                    )
+                    continue
+                if other(files.get(dst), src):
+                    errors.append(
+                        f"Conflict: both '{files[dst][0]}' and '{src}' would become "
+                        f"'{dst}' (in another hook process)"
+                    )
+                    continue
+                if other(dirs.get(dst), src):
+                    errors.append(
+                        f"Conflict: '{src}' would become '{dst}', which "
+                        f"'{dirs[dst][0]}' needs as a directory (in another hook process)"
+                    )
+                    continue
+                blocker = next(
+                    (d for d in _ancestors(dst) if other(files.get(d), src)), None
+                )
+                if blocker is not None:
+                    errors.append(
+                        f"Conflict: '{files[blocker][0]}' would become '{blocker}', "
+                        f"which '{src}' needs as a directory (in another hook process)"
+                    )
+                    continue
+                files[dst] = [src, pid]
+                for d in _ancestors(dst):
+                    dirs.setdefault(d, [src, pid])
+                kept.append((src, dst))
+
+            data.update(session=session, time=now)
+            tmp = f"{path}.{pid}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, path)
+    except (OSError, TimeoutError) as e:
+        return [], [f"Could not coordinate with other hook processes: {e}"]
+    return kept, errors
+
+
+def release_claims(plan: list[tuple[str, str]], git_dir: str | None) -> None:
+    # Once applied, the renamed files speak for themselves: drop our claims
+    # so a later run in the same session is judged against the worktree
+    import json
+
+    if not plan or git_dir is None:
+        return
+    path = os.path.join(state_dir(git_dir), "claims.json")
+    pid = os.getpid()
+    try:
+        with FileLock(path + ".lock"):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                return
+            for key in ("files", "dirs"):
+                table = data.get(key, {})
+                data[key] = {k: v for k, v in table.items() if v[1] != pid}
+            tmp = f"{path}.{pid}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, path)
+    except (OSError, TimeoutError):
+        pass  # they expire after CLAIM_TTL all the same
+
+
+def coordinate(
+    plan: list[tuple[str, str]], git_dir: str | None
+) -> tuple[list[tuple[str, str]], list[str]]:
+    if not plan or git_dir is None:
+        return plan, []
+    return claim_targets(plan, git_dir)
+
+
+def is_tracked(path: str, index: IndexSnapshot | None = None) -> bool:
+    if index is not None:
+        return path in index
     p = run(["git", "ls-files", "--error-unmatch", "--", path])
     return p.returncode == 0
 
 
-def normalize_component(comp: str, internal_style: str) -> str:
+def _collapse(s: str) -> str:
+    return " ".join(filter(None, s.split(" "))) if "  " in s else s
+
+
+_UNDERSCORE = str.maketrans(" ", "_")
+_REMOVE = str.maketrans("", "", " ")
+
+# Internal-space handling per style, applied after trimming
+_STYLE_IMPLS = {
+    "none": lambda s: s,
+    "collapse": _collapse,
+    "underscore": lambda s: s.translate(_UNDERSCORE),
+    "remove": lambda s: s.translate(_REMOVE),
+}
+
+
+# Named code point sets for --whitespace. Everything listed is treated as
+# a space; "zero-width" characters are deleted instead, being invisible.
+WHITESPACE_SETS = {
+    "space": " ",
+    "tab": "\t",
+    "nbsp": "\u00a0\u202f",
+    # Every character for which str.isspace() is true
+    "unicode": (
+        "\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680"
+        "\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a"
+        "\u2028\u2029\u202f\u205f\u3000"
+    ),
+}
+ZERO_WIDTH = "\u200b\u200c\u200d\u2060\ufeff"
+DEFAULT_WHITESPACE = "space"
+
+
+class WhitespaceRules:
+    # Which characters count as whitespace, parsed from a comma-separated
+    # spec ("space,nbsp,zero-width,trailing-dots,U+3164"). Every style is
+    # compiled against it once: a translation table folds the extra
+    # characters onto " " (or deletes them) in one pass, after which the
+    # style's own trimming and replacement run unchanged.
+
+    def __init__(self, spec: str = DEFAULT_WHITESPACE) -> None:
+        spaces = ""
+        invisible = ""
+        self.trailing_dots = False
+        for name in filter(None, (n.strip() for n in spec.split(","))):
+            if name in WHITESPACE_SETS:
+                spaces += WHITESPACE_SETS[name]
+            elif name == "zero-width":
+                invisible += ZERO_WIDTH
+            elif name == "trailing-dots":
+                self.trailing_dots = True
+            elif name[:2].upper() == "U+":
+                try:
+                    spaces += chr(int(name[2:], 16))
+                except (ValueError, OverflowError):
+                    raise ValueError(f"bad code point '{name}'") from None
+            else:
+                raise ValueError(f"unknown whitespace rule '{name}'")
+        self.spec = spec
+        # " " always counts: trimming and every style are defined on it
+        self.table = {ord(c): " " for c in spaces if c != " "}
+        self.table.update((ord(c), None) for c in invisible)
+        self.triggers = frozenset(" " + spaces + invisible)
+
+    def screen(self, path: str) -> bool:
+        # Cheap test for "might normalization change this path?"
+        if not self.triggers.isdisjoint(path):
+            return True
+        return self.trailing_dots and (path.endswith(".") or "./" in path)
+
+    def compile(self, internal_style: str) -> Callable[[str], str]:
+        impl = _STYLE_IMPLS.get(internal_style, _STYLE_IMPLS["none"])
+        table = self.table
+        if not self.trailing_dots:
+            return lambda comp: impl(comp.translate(table).strip(" "))
+
+        def component(comp: str) -> str:
+            if comp in (".", ".."):
+                return comp
+            # Windows drops trailing dots (and the spaces around them)
+            return impl(comp.translate(table).lstrip(" ").rstrip(". "))
+
+        return component
+
+
+def normalize_component(
+    comp: str, internal_style: str, rules: WhitespaceRules | None = None
+) -> str:
+    if rules is not None:
+        return rules.compile(internal_style)(comp)
     # Always trim leading/trailing ASCII spaces
     s = comp.strip(" ")
+    # Unknown styles only trim (shouldn’t happen due to validation)
+    impl = _STYLE_IMPLS.get(internal_style)
+    return impl(s) if impl is not None else s
 
-    if internal_style == "none":
-        return s
-    if internal_style == "collapse":
-        out = []
-        prev_space = False
-        for ch in s:
-            if ch == " ":
-                if not prev_space:
-                    out.append(" ")
-                prev_space = True
-            else:
-                out.append(ch)
-                prev_space = False
-        return "".join(out)
-    if internal_style == "underscore":
-        return s.replace(" ", "_")
-    if internal_style == "remove":
-        return s.replace(" ", "")
-    # Fallback to no-op if unknown (shouldn’t happen due to validation)
-    return s
-
-
-def normalize_path(path: str, internal_style: str) -> tuple[str | None, str | None]:
-    parts = path.split("/")
-    norm_parts = []
-    for c in parts:
-        nc = normalize_component(c, internal_style)
-        if nc == "":
-            return None, f"component '{c}' would become empty after normalization"
-        norm_parts.append(nc)
-    return "/".join(norm_parts), None
+
+NORMALIZER_CACHE_SIZE = 8192
+
+
+class Normalizer:
+    # Memoized per-run normalizer: directory names repeat across many paths,
+    # so each distinct component is normalized once (bounded LRU).
+
+    def __init__(
+        self,
+        internal_style: str,
+        maxsize: int = NORMALIZER_CACHE_SIZE,
+        rules: WhitespaceRules | None = None,
+    ) -> None:
+        from functools import lru_cache
+
+        self.internal_style = internal_style
+        self.rules = rules
+        if rules is not None:
+            self._component = rules.compile(internal_style)
+        self.component = lru_cache(maxsize=maxsize)(self._component)
+
+    def _component(self, comp: str) -> str:
+        return normalize_component(comp, self.internal_style)
+
+    def path(self, path: str) -> tuple[str | None, str | None]:
+        norm_parts = []
+        component = self.component
+        for c in path.split("/"):
+            nc = component(c)
+            if nc == "":
+                return None, f"component '{c}' would become empty after normalization"
+            norm_parts.append(nc)
+        return "/".join(norm_parts), None
+
+
+_normalizers: dict[str, Normalizer] = {}
+
+
+def get_normalizer(
+    internal_style: str, rules: WhitespaceRules | None = None
+) -> Normalizer:
+    key = internal_style if rules is None else f"{internal_style}:{rules.spec}"
+    n = _normalizers.get(key)
+    if n is None:
+        n = _normalizers[key] = Normalizer(internal_style, rules=rules)
+    return n
+
+
+def normalize_path(
+    path: str, internal_style: str, rules: WhitespaceRules | None = None
+) -> tuple[str | None, str | None]:
+    return get_normalizer(internal_style, rules).path(path)
 
 
 def ensure_parent(dst: str) -> None:
+    from pathlib import Path
+
     Path(dst).parent.mkdir(parents=True, exist_ok=True)
 
 
-def git_mv(src: str, dst: str) -> bool:
+def git_mv(src: str, dst: str, index: IndexSnapshot | None = None) -> bool:
     if src == dst:
         return False
     ensure_parent(dst)
-    mv = run(["git", "mv", "-f", "-k", "--", src, dst])
+    mv = run_locked(["git", "mv", "-f", "-k", "--", src, dst])
     if mv.returncode == 0:
+        if index is not None:
+            index.move(src, dst)
         return True
     try:
         os.replace(src, dst)
@@ -77,66 +1034,1517 @@ def git_mv(src: str, dst: str) -> bool:
     except Exception as e:
         print(f"⚠️  Failed to move '{src}' -> '{dst}': {e}", file=sys.stderr)
         return False
-    run(["git", "add", "--", dst])
-    if is_tracked(src):
-        run(["git", "rm", "--cached", "--quiet", "--force", "--", src])
+    run_locked(["git", "add", "--", dst])
+    if is_tracked(src, index):
+        run_locked(["git", "rm", "--cached", "--quiet", "--force", "--", src])
+    if index is not None:
+        index.move(src, dst)
     return True
 
 
-def parse_args(argv: list[str]) -> tuple[str, list[str]]:
-    internal_style = "none"
-    files: list[str] = []
-    for a in argv[1:]:
+def prune_empty_dirs(dirs: set[str], stop: str | None = None) -> None:
+    # Remove source directories left empty by moves, deepest first, along
+    # with emptied parents up to (not including) `stop`
+    for d in sorted(dirs, key=lambda x: x.count("/"), reverse=True):
+        while d and d != "." and d != stop:
+            try:
+                os.rmdir(d)
+            except OSError:
+                break
+            d = os.path.dirname(d)
+
+
+def _ancestors(path: str):
+    # "a/b/c" -> "a", "a/b"
+    i = path.find("/")
+    while i != -1:
+        yield path[:i]
+        i = path.find("/", i + 1)
+
+
+def _remap(path: str, moved: dict[str, str]) -> str:
+    # Where `path` lives once the directory moves in `moved` have been done
+    parts = path.split("/")
+    for k in range(len(parts) - 1, 0, -1):
+        head = "/".join(parts[:k])
+        if head in moved:
+            return moved[head] + "/" + "/".join(parts[k:])
+    return path
+
+
+def coalesce_moves(
+    pairs: list[tuple[str, str]],
+    index: IndexSnapshot,
+    pinned: set[str] | None = None,
+) -> tuple[list[tuple[str, str]], dict[str, str]]:
+    # Turn per-file renames into filesystem operations: one move per messy
+    # directory whose tracked entries are all being renamed, plus per-file
+    # moves (relative to the moved directories) for everything else. Paths in
+    # `pinned` are handled elsewhere, so their directories are never moved.
+    candidates: dict[str, str] = {}
+    planned: dict[str, int] = {}
+    for src, dst in pairs:
+        for sd, dd in zip(_ancestors(src), _ancestors(dst), strict=True):
+            if sd != dd:
+                candidates.setdefault(sd, dd)
+                planned[sd] = planned.get(sd, 0) + 1
+    if not candidates:
+        return list(pairs), {}
+
+    blocked = {d for p in pinned or () for d in _ancestors(p)}
+    tracked: dict[str, int] = {}
+    roots = {c.split("/", 1)[0] for c in candidates}
+    for path in index.entries:
+        if path.split("/", 1)[0] not in roots:
+            continue
+        for d in _ancestors(path):
+            if d in candidates:
+                tracked[d] = tracked.get(d, 0) + 1
+
+    ops: list[tuple[str, str]] = []
+    moved: dict[str, str] = {}
+    claimed: set[str] = set()
+    for d in sorted(candidates, key=lambda c: c.count("/")):
+        if d in blocked or planned[d] != tracked.get(d, 0):
+            continue  # partial: something under it stays put
+        current, final = _remap(d, moved), candidates[d]
+        if current == final or final in claimed:
+            continue
+        if os.path.lexists(final) or not os.path.isdir(current):
+            continue
+        if os.path.islink(current):
+            continue
+        moved[d] = final
+        claimed.add(final)
+        ops.append((current, final))
+
+    for src, dst in pairs:
+        current = _remap(src, moved)
+        if current != dst:
+            ops.append((current, dst))
+    return ops, moved
+
+
+def _landed(src: str, dst: str) -> bool:
+    # A move that happened although it was not journaled (interrupted
+    # between the rename and its log line)
+    return not os.path.lexists(src) and os.path.lexists(dst)
+
+
+def add_untracked(
+    pairs: list[tuple[str, str]], errors: list[str], journal: Journal | None = None
+) -> list[tuple[str, str]]:
+    # Untracked files are moved in-process and staged under their new name
+    # by one `git update-index --add --stdin` call, rather than a failing
+    # `git mv` plus a `git add` per file.
+    changed: list[tuple[str, str]] = []
+    for n, (src, dst) in enumerate(pairs):
+        step = f"untracked:{n}"
+        if journal is None or step not in journal.done:
+            try:
+                ensure_parent(dst)
+                os.replace(src, dst)
+            except OSError as e:
+                if not (journal is not None and journal.resumed and _landed(src, dst)):
+                    errors.append(f"Failed to move '{src}' -> '{dst}': {e}")
+                    continue
+            if journal is not None:
+                journal.mark(step)
+        # Staging is idempotent, so a resumed run stages every moved file
+        changed.append((src, dst))
+    if changed:
+        p = run_records(
+            ["git", "update-index", "--add", "-z", "--stdin"],
+            [os.fsencode(dst) for _, dst in changed],
+        )
+        if p.returncode != 0:
+            errors.append(
+                "Failed to update the index: "
+                + (p.stderr.decode().strip() or "git update-index failed")
+            )
+    return changed
+
+
+def move_fallback(
+    pairs: list[tuple[str, str]],
+    index: IndexSnapshot,
+    errors: list[str],
+    journal: Journal | None = None,
+    stage_untracked: bool = True,
+) -> list[tuple[str, str]]:
+    # Moves the batched pass does not take: untracked directories and links,
+    # unmerged entries, submodules. Those `git mv` is not needed for are
+    # moved in-process; old entries are dropped (and tracked files re-added
+    # with their blob) by one `update-index --index-info`, new names staged
+    # by one `git add`. Submodules (git mv also rewrites .gitmodules),
+    # directories holding tracked files and vanished sources still go
+    # through git_mv(). Steps are journaled once the index is written.
+    changed: list[tuple[str, str]] = []
+    moved: list[tuple[int, str, str]] = []
+    removals: list[bytes] = []
+    additions: list[bytes] = []
+    added: list[bytes] = []
+    tracked_dirs: set[str] | None = None
+    for n, (src, dst) in enumerate(pairs):
+        step = f"fallback:{n}"
+        if journal is not None and step in journal.done:
+            changed.append((src, dst))
+            continue
+        landed = journal is not None and journal.resumed and _landed(src, dst)
+        entry = index.get(src)
+        if entry is not None and entry[0] == "160000":
+            use_git = True
+        elif landed:
+            use_git = False
+        elif not os.path.lexists(src):
+            use_git = True
+        elif os.path.isdir(src) and not os.path.islink(src):
+            if tracked_dirs is None:
+                tracked_dirs = {d for t in index.entries for d in _ancestors(t)}
+            use_git = src in tracked_dirs
+        else:
+            use_git = False
+        if use_git:
+            if git_mv(src, dst, index):
+                if journal is not None:
+                    journal.mark(step)
+                changed.append((src, dst))
+            elif src != dst:
+                errors.append(f"Failed to move '{src}' -> '{dst}'")
+            continue
+        if not landed:
+            try:
+                ensure_parent(dst)
+                os.replace(src, dst)
+            except OSError as e:
+                errors.append(f"Failed to move '{src}' -> '{dst}': {e}")
+                continue
+        if entry is None:
+            if stage_untracked:
+                added.append(os.fsencode(dst))
+        else:
+            mode, oid, stage = entry
+            # Mode 0 drops every stage of the old name
+            removals.append(os.fsencode(f"0 {'0' * len(oid)}\t{index.prefix + src}"))
+            if stage == 0:
+                additions.append(os.fsencode(f"{mode} {oid} 0\t{index.prefix + dst}"))
+            else:
+                added.append(os.fsencode(dst))  # resolved, as `git add` would
+        moved.append((n, src, dst))
+    if not moved:
+        return changed
+
+    p = None
+    if removals:
+        p = run_records(
+            ["git", "update-index", "-z", "--index-info"], removals + additions
+        )
+    if added and (p is None or p.returncode == 0):
+        p = run_records(
+            [
+                "git",
+                "--literal-pathspecs",
+                "add",
+                "--pathspec-from-file=-",
+                "--pathspec-file-nul",
+            ],
+            added,
+        )
+    ok = p is None or p.returncode == 0
+    if not ok:
+        errors.append(
+            "Failed to update the index: "
+            + (p.stderr.decode().strip() or "git update-index failed")
+        )
+    for n, src, dst in moved:
+        if journal is not None and ok:
+            journal.mark(f"fallback:{n}")
+        index.move(src, dst)
+        changed.append((src, dst))
+    return changed
+
+
+def _temp_name(path: str, taken: set[str]) -> str:
+    # A free name next to `path`, so parking it is a same-directory rename
+    head = os.path.dirname(path)
+    n = 0
+    while True:
+        name = f".trim-spaces-in-paths.{os.getpid()}.{n}"
+        tmp = f"{head}/{name}" if head else name
+        if tmp not in taken and not os.path.lexists(tmp):
+            taken.add(tmp)
+            return tmp
+        n += 1
+
+
+def schedule_moves(
+    ops: list[tuple[str, str]], dirs: set[str] | None = None
+) -> tuple[list[tuple[str, str]], dict[str, str]]:
+    # Order filesystem moves so that none lands on a path another move has
+    # yet to vacate: chains (a -> b, b -> c) run back to front, and cycles
+    # (swaps) are broken by parking one source under a temporary name.
+    # `dirs` holds the destinations of whole-directory moves; moves of paths
+    # inside them wait for them. Returns the ordered moves (with the extra
+    # hops through temporary names) and a map from each temporary name to
+    # the source it stands for.
+    from collections import deque
+
+    ops = list(ops)
+    n = len(ops)
+    by_src = {src: i for i, (src, _) in enumerate(ops)}
+    dir_ops = {dst: i for i, (_, dst) in enumerate(ops) if dst in (dirs or ())}
+    below: dict[str, list[int]] = {}  # directory -> moves out of it
+    for i, (src, _) in enumerate(ops):
+        for d in _ancestors(src):
+            below.setdefault(d, []).append(i)
+
+    # vacates[j]: moves waiting for j's source to move away
+    # contains[j]: moves of paths that only exist once directory move j ran
+    vacates: list[list[int]] = [[] for _ in range(n)]
+    contains: list[list[int]] = [[] for _ in range(n)]
+    need_vacate = [0] * n
+    need_dir = [0] * n
+    for i, (src, dst) in enumerate(ops):
+        for d in _ancestors(src):
+            j = dir_ops.get(d)
+            if j is not None and j != i:
+                contains[j].append(i)
+                need_dir[i] += 1
+        blockers = [by_src.get(d) for d in _ancestors(dst)]
+        blockers.append(by_src.get(dst))
+        if dst not in dir_ops:
+            # Moving onto a directory other moves are emptying
+            blockers.extend(below.get(dst, ()))
+        for j in set(blockers):
+            if j is not None and j != i:
+                vacates[j].append(i)
+                need_vacate[i] += 1
+
+    order: list[tuple[str, str]] = []
+    temps: dict[str, str] = {}
+    taken: set[str] = set()
+    parked = [False] * n
+    done = [False] * n
+    ready = deque(i for i in range(n) if not need_vacate[i] and not need_dir[i])
+
+    def release(waiting: list[int], counter: list[int]) -> None:
+        for k in waiting:
+            counter[k] -= 1
+            if not counter[k] and not need_vacate[k] + need_dir[k]:
+                ready.append(k)
+
+    remaining = n
+    while remaining:
+        while ready:
+            i = ready.popleft()
+            done[i] = True
+            remaining -= 1
+            order.append(ops[i])
+            if not parked[i]:
+                release(vacates[i], need_vacate)
+            release(contains[i], need_dir)
+        if not remaining:
+            break
+        # Everything left waits on a cycle. Park the first source that
+        # exists already and is still in the way of another move.
+        k = next(
+            (
+                i
+                for i in range(n)
+                if not done[i] and not parked[i] and not need_dir[i] and vacates[i]
+            ),
+            None,
+        )
+        if k is None:
+            # Not expected; run the rest in plan order rather than stall
+            order.extend(ops[i] for i in range(n) if not done[i])
+            break
+        src, dst = ops[k]
+        tmp = _temp_name(src, taken)
+        order.append((src, tmp))
+        temps[tmp] = src
+        ops[k] = (tmp, dst)
+        parked[k] = True
+        release(vacates[k], need_vacate)
+    return order, temps
+
+
+def _replace(src: str, dst: str, vacated: set[str]) -> None:
+    if os.path.isdir(dst) and not os.path.islink(dst):
+        # A directory earlier moves emptied; anything else stays and makes
+        # the move fail
+        inside = dst + "/"
+        prune_empty_dirs(
+            {d for d in vacated if d == dst or d.startswith(inside)},
+            os.path.dirname(dst),
+        )
+    ensure_parent(dst)
+    os.replace(src, dst)
+
+
+def partition_moves(ops: list[tuple[str, str]], parts: int) -> list[list[int]]:
+    # Split scheduled moves into at most `parts` lists of indexes that can
+    # run concurrently. Moves whose paths are equal or nested (a move into
+    # a directory another move empties, a swap through a temporary name,
+    # files inside a directory being moved) stay together, in their
+    # scheduled order; siblings only share parent directories, which are
+    # created idempotently. Groups are dealt out largest first to the
+    # least loaded list.
+    import heapq
+
+    parent = list(range(len(ops)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owner: dict[str, int] = {}
+    for i, (src, dst) in enumerate(ops):
+        for path in (src, dst):
+            j = owner.setdefault(path, i)
+            if j != i:
+                parent[find(i)] = find(j)
+    for i, (src, dst) in enumerate(ops):
+        for path in (src, dst):
+            for d in _ancestors(path):
+                j = owner.get(d)
+                if j is not None:
+                    parent[find(i)] = find(j)
+
+    groups: dict[int, list[int]] = {}
+    for i in range(len(ops)):
+        groups.setdefault(find(i), []).append(i)
+    lists: list[list[int]] = [[] for _ in range(min(parts, len(groups)))]
+    loads = [(0, k) for k in range(len(lists))]
+    for group in sorted(groups.values(), key=len, reverse=True):
+        load, k = heapq.heappop(loads)
+        lists[k].extend(group)
+        heapq.heappush(loads, (load + len(group), k))
+    for part in lists:
+        part.sort()
+    return lists
+
+
+class MoveBatch:
+    # Everything one apply does, in order: filesystem moves (with the
+    # temporary names and whole-directory moves behind them), index entries
+    # to rewrite as (src, dst, mode, oid, skip_worktree), untracked files to
+    # move and stage, and pairs left to `git mv`. Journaled as JSON.
+
+    __slots__ = ("prefix", "ops", "temps", "moved", "entries", "untracked", "fallback")
+
+    def __init__(
+        self,
+        prefix: str = "",
+        ops: Iterable = (),
+        temps: dict[str, str] | None = None,
+        moved: dict[str, str] | None = None,
+        entries: Iterable = (),
+        untracked: Iterable = (),
+        fallback: Iterable = (),
+    ) -> None:
+        self.prefix = prefix
+        self.ops: list[tuple[str, str]] = [tuple(op) for op in ops]
+        self.temps = dict(temps or {})
+        self.moved = dict(moved or {})
+        self.entries: list[tuple[str, str, str, str, bool]] = [
+            tuple(e) for e in entries
+        ]
+        self.untracked: list[tuple[str, str]] = [tuple(p) for p in untracked]
+        self.fallback: list[tuple[str, str]] = [tuple(p) for p in fallback]
+
+    def __bool__(self) -> bool:
+        return bool(self.ops or self.entries or self.untracked or self.fallback)
+
+    def to_json(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_json(cls, doc: dict) -> MoveBatch:
+        return cls(**{name: doc[name] for name in cls.__slots__})
+
+    def relies_on(self, src: str) -> list[str]:
+        # The moves an entry needs: its own and any directory move above it,
+        # named by their original source
+        steps = [_remap(d, self.moved) for d in _ancestors(src) if d in self.moved]
+        steps.append(_remap(src, self.moved))
+        return steps
+
+
+JOURNAL_PREFIX = "journal-"
+
+
+class Journal:
+    # Write-ahead log of one apply under .git/trim-spaces-in-paths/: a JSON
+    # header with the whole MoveBatch, then one line per completed step
+    # ("op:N", "index", "untracked:N", "fallback:N"). A run cut short by a
+    # crash or Ctrl-C leaves it behind for --resume or --rollback. One file
+    # per process, since pre-commit applies chunks in parallel. Without a
+    # path, steps are only tracked in memory.
+
+    VERSION = 1
+
+    def __init__(self, path: str | None, header: dict, done: set[str] | None = None):
+        self.path = path
+        self.header = header
+        self.done = done if done is not None else set()
+        self.resumed = bool(done)
+        self.fd: int | None = None
+
+    @property
+    def batch(self) -> MoveBatch:
+        return MoveBatch.from_json(self.header["batch"])
+
+    @classmethod
+    def create(cls, git_dir: str, batch: MoveBatch) -> Journal:
+        import json
+
+        base = state_dir(git_dir)
+        os.makedirs(base, exist_ok=True)
+        header = {
+            "version": cls.VERSION,
+            "session": hook_session(),
+            "pid": os.getpid(),
+            "cwd": os.getcwd(),
+            "batch": batch.to_json(),
+        }
+        journal = cls(os.path.join(base, f"{JOURNAL_PREFIX}{os.getpid()}"), header)
+        journal.fd = os.open(
+            journal.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644
+        )
+        os.write(journal.fd, json.dumps(header).encode() + b"\n")
+        # The plan must be on disk before the first move; step lines only
+        # need to survive the process, not the machine
+        os.fsync(journal.fd)
+        return journal
+
+    @classmethod
+    def load(cls, path: str) -> Journal:
+        import json
+
+        with open(path, "rb") as f:
+            data = f.read()
+        head, _, steps = data.partition(b"\n")
+        header = json.loads(head.decode("utf-8"))
+        if not isinstance(header, dict) or header.get("version") != cls.VERSION:
+            raise ValueError("unsupported journal version")
+        lines = steps.split(b"\n")
+        # The last line is empty, or torn by the interruption
+        journal = cls(path, header, {line.decode() for line in lines[:-1]})
+        journal.resumed = True
+        journal.fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+        if lines[-1]:
+            os.ftruncate(journal.fd, len(data) - len(lines[-1]))
+        return journal
+
+    def mark(self, step: str) -> None:
+        self.done.add(step)
+        if self.fd is not None:
+            os.write(self.fd, step.encode() + b"\n")
+
+    def close(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def finish(self) -> None:
+        self.close()
+        if self.path is not None:
+            import contextlib
+
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.path)
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        # os.kill would terminate it; ask for its exit status instead
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # QUERY_LIMITED_INFORMATION
+        if not handle:
+            return kernel32.GetLastError() == 5  # access denied: it exists
+        try:
+            status = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(status)):
+                return True
+            return status.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def find_journals(git_dir: str) -> list[str]:
+    # Journals left by interrupted runs. Only a live process of the current
+    # hook session (a parallel chunk) can still be writing one; a live pid
+    # from another session has been reused since that run ended.
+    import json
+
+    base = state_dir(git_dir)
+    try:
+        names = sorted(os.listdir(base))
+    except OSError:
+        return []
+    session = hook_session()
+    found = []
+    for name in names:
+        if not name.startswith(JOURNAL_PREFIX):
+            continue
+        path = os.path.join(base, name)
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline().decode("utf-8"))
+            pid = header["pid"]
+        except (OSError, ValueError, KeyError, TypeError):
+            found.append(path)  # torn before the header was complete
+            continue
+        # Our own can only be left over from an earlier call
+        if pid != os.getpid() and header.get("session") == session and _pid_alive(pid):
+            continue
+        found.append(path)
+    return found
+
+
+def run_batch(
+    batch: MoveBatch,
+    journal: Journal,
+    index: IndexSnapshot | None = None,
+    jobs: int = 1,
+) -> tuple[list[tuple[str, str]], list[str]]:
+    # Carry out a batch, skipping steps the journal has as done. Resuming
+    # is safe because each step is a rename that either happened or not,
+    # and the index writes are idempotent. With `jobs` > 1, independent
+    # filesystem moves run on a thread pool; the index is still written in
+    # one batch afterwards.
+    changed: list[tuple[str, str]] = []
+    errors: list[str] = []
+    failed: set[str] = set()
+
+    def move(numbers: Iterable[int]) -> set[str]:
+        # Each part keeps its own vacated directories: moves that could
+        # clear a directory for one another are always in the same part
+        vacated: set[str] = set()
+        for n in numbers:
+            op_src, op_dst = batch.ops[n]
+            step = f"op:{n}"
+            if step not in journal.done:
+                try:
+                    _replace(op_src, op_dst, vacated)
+                except OSError as e:
+                    if not (journal.resumed and _landed(op_src, op_dst)):
+                        print(
+                            f"⚠️  Failed to move '{op_src}' -> '{op_dst}': {e}",
+                            file=sys.stderr,
+                        )
+                        failed.add(batch.temps.get(op_src, op_src))
+                        continue
+                journal.mark(step)
+            vacated.add(os.path.dirname(op_src))
+        return vacated
+
+    parts = partition_moves(batch.ops, jobs) if jobs > 1 else []
+    if len(parts) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(len(parts)) as pool:
+            vacated = set().union(*pool.map(move, parts))
+    else:
+        vacated = move(range(len(batch.ops)))
+
+    prefix = batch.prefix
+    removals: list[bytes] = []
+    additions: list[bytes] = []
+    skipped: list[bytes] = []
+    done: list[tuple[str, str]] = []
+    for src, dst, mode, oid, skip in batch.entries:
+        # A pair fails if its own move or any directory move it relied on did
+        if failed.intersection(batch.relies_on(src)):
+            errors.append(f"Failed to move '{src}' -> '{dst}'")
+            continue
+        if skip:
+            skipped.append(os.fsencode(dst))
+        # Mode 0 deletes the entry; removals must precede additions so that
+        # a path vacated and re-occupied in the same batch survives.
+        removals.append(os.fsencode(f"0 {'0' * len(oid)}\t{prefix + src}"))
+        additions.append(os.fsencode(f"{mode} {oid} 0\t{prefix + dst}"))
+        done.append((src, dst))
+    changed.extend(done)
+    if index is not None:
+        index.move_all(done)
+
+    if removals and "index" not in journal.done:
+        p = run_records(
+            ["git", "update-index", "-z", "--index-info"], removals + additions
+        )
+        if p.returncode == 0 and skipped:
+            # --index-info writes plain entries; keep them out of the checkout
+            p = run_records(
+                ["git", "update-index", "-z", "--skip-worktree", "--stdin"], skipped
+            )
+        if p.returncode == 0:
+            journal.mark("index")
+        else:
+            errors.append(
+                "Failed to update the index: "
+                + (p.stderr.decode().strip() or "git update-index failed")
+            )
+    if batch.untracked:
+        changed.extend(add_untracked(batch.untracked, errors, journal))
+    prune_empty_dirs(vacated)
+
+    if batch.fallback:
+        if index is None:
+            index = IndexSnapshot(prefix)
+        changed.extend(move_fallback(batch.fallback, index, errors, journal))
+
+    if removals and "index" not in journal.done and journal.path is not None:
+        # Files were moved but the index still has the old names
+        journal.close()
+        errors.append(
+            "The index was not updated; run again with --resume to retry, "
+            "or with --rollback to move the files back"
+        )
+    else:
+        journal.finish()
+    return changed, errors
+
+
+def rollback_batch(
+    batch: MoveBatch, journal: Journal
+) -> tuple[list[tuple[str, str]], list[str]]:
+    # Undo whatever part of a batch was done, newest first: fallback moves,
+    # untracked files, the index, then the filesystem moves. Returns the
+    # (current, original) paths restored.
+    done = journal.done
+    errors: list[str] = []
+    back = [
+        (dst, src)
+        for n, (src, dst) in reversed(list(enumerate(batch.fallback)))
+        if f"fallback:{n}" in done or _landed(src, dst)
+    ]
+    restored: list[tuple[str, str]] = []
+    if back:
+        # Sources the interrupted run had not staged yet go back unstaged
+        index = IndexSnapshot(batch.prefix)
+        restored = move_fallback(back, index, errors, stage_untracked=False)
+
+    unstage: list[bytes] = []
+    for n in reversed(range(len(batch.untracked))):
+        src, dst = batch.untracked[n]
+        if f"untracked:{n}" not in done and not _landed(src, dst):
+            continue
+        try:
+            ensure_parent(src)
+            os.replace(dst, src)
+        except OSError as e:
+            errors.append(f"Failed to move '{dst}' back to '{src}': {e}")
+            continue
+        unstage.append(os.fsencode(dst))
+        restored.append((dst, src))
+    if unstage:
+        p = run_records(
+            ["git", "update-index", "-z", "--force-remove", "--stdin"], unstage
+        )
+        if p.returncode != 0:
+            errors.append(
+                "Failed to update the index: "
+                + (p.stderr.decode().strip() or "git update-index failed")
+            )
+
+    # Any move not journaled may still have happened: with --jobs, each
+    # thread can be interrupted between a rename and its log line
+    landed = [f"op:{n}" in done or _landed(*op) for n, op in enumerate(batch.ops)]
+    pending = {
+        batch.temps.get(src, src)
+        for (src, _), ok in zip(batch.ops, landed, strict=True)
+        if not ok
+    }
+
+    # Writing back the original entries is harmless if the index was never
+    # updated, so it does not matter whether that step was journaled
+    removals: list[bytes] = []
+    additions: list[bytes] = []
+    skipped: list[bytes] = []
+    for src, dst, mode, oid, skip in batch.entries:
+        if pending.intersection(batch.relies_on(src)):
+            continue
+        if skip:
+            skipped.append(os.fsencode(src))
+        removals.append(os.fsencode(f"0 {'0' * len(oid)}\t{batch.prefix + dst}"))
+        additions.append(os.fsencode(f"{mode} {oid} 0\t{batch.prefix + src}"))
+        restored.append((dst, src))
+    if removals:
+        p = run_records(
+            ["git", "update-index", "-z", "--index-info"], removals + additions
+        )
+        if p.returncode == 0 and skipped:
+            p = run_records(
+                ["git", "update-index", "-z", "--skip-worktree", "--stdin"], skipped
+            )
+        if p.returncode != 0:
+            errors.append(
+                "Failed to update the index: "
+                + (p.stderr.decode().strip() or "git update-index failed")
+            )
+
+    vacated: set[str] = set()
+    for n in reversed(range(len(batch.ops))):
+        if not landed[n]:
+            continue
+        src, dst = batch.ops[n]
+        try:
+            _replace(dst, src, vacated)
+        except OSError as e:
+            errors.append(f"Failed to move '{dst}' back to '{src}': {e}")
+            continue
+        vacated.add(os.path.dirname(dst))
+    prune_empty_dirs(vacated)
+
+    if errors:
+        journal.close()
+    else:
+        journal.finish()
+    return restored, errors
+
+
+def apply_moves(
+    plan: list[tuple[str, str]], index: IndexSnapshot | None = None, jobs: int = 1
+) -> tuple[list[tuple[str, str]], list[str]]:
+    if index is None:
+        index = IndexSnapshot()
+    git_dir = index.git_dir
+    if git_dir is not None and find_journals(git_dir):
+        return [], [
+            "An interrupted run left renames half-applied; run with --resume "
+            "to finish them or --rollback to undo them first"
+        ]
+    batched: list[tuple[str, str]] = []
+    index_only: list[tuple[str, str]] = []
+    untracked: list[tuple[str, str]] = []
+    fallback: list[tuple[str, str]] = []
+
+    for src, dst in plan:
+        entry = index.get(src)
+        if entry is None and os.path.isfile(src) and not os.path.islink(src):
+            untracked.append((src, dst))
+        elif (
+            entry is not None
+            and entry[2] == 0
+            and src in index.skip_worktree
+            and not os.path.lexists(src)
+        ):
+            # Outside the sparse checkout: rename the entry only, without
+            # materializing the file
+            index_only.append((src, dst))
+        # Unmerged, missing or submodule sources (and untracked
+        # directories or links) go through git mv
+        elif (
+            entry is None
+            or entry[2] != 0
+            or entry[0] == "160000"
+            or not os.path.lexists(src)
+        ):
+            fallback.append((src, dst))
+        else:
+            batched.append((src, dst))
+
+    pinned = {s for s, _ in fallback}
+    pinned.update(s for s, _ in untracked)
+    ops, moved = coalesce_moves(batched, index, pinned)
+    ops, temps = schedule_moves(ops, set(moved.values()))
+    entries = []
+    for src, dst in batched + index_only:
+        mode, oid, _ = index.get(src)
+        entries.append((src, dst, mode, oid, src in index.skip_worktree))
+    batch = MoveBatch(index.prefix, ops, temps, moved, entries, untracked, fallback)
+
+    journal = Journal(None, {})
+    if batch and git_dir is not None:
+        try:
+            journal = Journal.create(git_dir, batch)
+        except OSError as e:
+            print(f"⚠️  Could not write journal: {e}", file=sys.stderr)
+    try:
+        return run_batch(batch, journal, index, jobs)
+    except KeyboardInterrupt:
+        if journal.path is not None:
+            print(
+                "\nInterrupted; run again with --resume to finish the renames, "
+                "or with --rollback to undo them",
+                file=sys.stderr,
+            )
+        raise
+
+
+STYLES = ("none", "collapse", "underscore", "remove")
+
+
+class Options:
+    __slots__ = (
+        "internal_style",
+        "files",
+        "timings",
+        "all_paths",
+        "cache",
+        "cache_size",
+        "case_insensitive",
+        "check",
+        "apply_plan",
+        "stdin",
+        "nul",
+        "native_index",
+        "rules",
+        "include",
+        "exclude",
+        "path_filter",
+        "resume",
+        "rollback",
+        "jobs",
+        "report",
+    )
+
+    def __init__(self) -> None:
+        self.internal_style = "none"
+        self.files: list[str] = []
+        # --all: audit every tracked path; `files` become pathspecs
+        self.all_paths = False
+        # --cache: remember clean runs under .git/
+        self.cache = False
+        self.cache_size = CACHE_SIZE
+        # --case-insensitive: also reject names that differ only by case or
+        # Unicode normalization from another tracked/planned path
+        self.case_insensitive = False
+        # --check[=json|nul]: plan only and print it; no changes are made
+        self.check: str | None = None
+        # --apply-plan FILE: apply a plan written by --check ("-" = stdin)
+        self.apply_plan: str | None = None
+        # --stdin: also read paths from stdin, one per line (NUL with -z)
+        self.stdin = False
+        self.nul = False
+        # --native-index: parse .git/index in-process instead of `ls-files`
+        self.native_index = False
+        # --whitespace=SPEC: extra characters to treat as spaces; None keeps
+        # the default (ASCII space only) and its fast paths
+        self.rules: WhitespaceRules | None = None
+        # --include/--exclude=PATTERN[,PATTERN...]: only consider matching
+        # paths; compiled into `path_filter` when the run starts
+        self.include: list[str] = []
+        self.exclude: list[str] = []
+        self.path_filter: PathFilter | None = None
+        # --resume/--rollback: finish or undo a run that was interrupted,
+        # from its journal under .git/
+        self.resume = False
+        self.rollback = False
+        # --jobs=N: filesystem moves on N threads (0: one per CPU)
+        self.jobs = 1
+        # --report=text|json: how renames and errors are printed
+        self.report = "text"
+        # None (off), "1"/"-"/"stderr" (JSON line on stderr) or a file path
+        self.timings: str | None = os.environ.get(TIMINGS_ENV) or None
+
+
+def parse_options(argv: list[str]) -> Options:
+    opts = Options()
+    args = iter(argv[1:])
+    for a in args:
         if a.startswith("--internal-style="):
-            internal_style = a.split("=", 1)[1]
-            if internal_style not in ("none", "collapse", "underscore", "remove"):
+            opts.internal_style = a.split("=", 1)[1]
+            if opts.internal_style not in STYLES:
                 print(
-                    f"Invalid --internal-style option: {internal_style}",
+                    f"Invalid --internal-style option: {opts.internal_style}",
                     file=sys.stderr,
                 )
                 sys.exit(2)
+        elif a == "--all":
+            opts.all_paths = True
+        elif a == "--cache":
+            opts.cache = True
+        elif a.startswith("--cache-size="):
+            value = a.split("=", 1)[1]
+            if not value.isdigit():
+                print(f"Invalid --cache-size option: {value}", file=sys.stderr)
+                sys.exit(2)
+            opts.cache = True
+            opts.cache_size = int(value)
+        elif a == "--case-insensitive":
+            opts.case_insensitive = True
+        elif a == "--check":
+            opts.check = "json"
+        elif a.startswith("--check="):
+            opts.check = a.split("=", 1)[1]
+            if opts.check not in ("json", "nul"):
+                print(f"Invalid --check format: {opts.check}", file=sys.stderr)
+                sys.exit(2)
+        elif a.startswith("--report="):
+            opts.report = a.split("=", 1)[1]
+            if opts.report not in ("text", "json"):
+                print(f"Invalid --report format: {opts.report}", file=sys.stderr)
+                sys.exit(2)
+        elif a == "--apply-plan" or a.startswith("--apply-plan="):
+            value = a.split("=", 1)[1] if "=" in a else next(args, "")
+            if not value:
+                print("--apply-plan needs a file (or - for stdin)", file=sys.stderr)
+                sys.exit(2)
+            opts.apply_plan = value
+        elif a.startswith("--whitespace="):
+            spec = a.split("=", 1)[1]
+            try:
+                opts.rules = WhitespaceRules(spec)
+            except ValueError as e:
+                print(f"Invalid --whitespace option: {e}", file=sys.stderr)
+                sys.exit(2)
+            if spec == DEFAULT_WHITESPACE:
+                opts.rules = None
+        elif a.startswith(("--include=", "--exclude=")):
+            name, _, value = a[2:].partition("=")
+            getattr(opts, name).extend(filter(None, value.split(",")))
+        elif a == "--native-index":
+            opts.native_index = True
+        elif a == "--jobs" or a.startswith("--jobs="):
+            value = a.split("=", 1)[1] if "=" in a else next(args, "")
+            if not value.isdigit():
+                print(f"Invalid --jobs option: {value}", file=sys.stderr)
+                sys.exit(2)
+            opts.jobs = int(value) or os.cpu_count() or 1
+        elif a == "--resume":
+            opts.resume = True
+        elif a == "--rollback":
+            opts.rollback = True
+        elif a == "--stdin":
+            opts.stdin = True
+        elif a in ("-z", "--null"):
+            opts.nul = True
+        elif a == "--timings":
+            opts.timings = "stderr"
+        elif a.startswith("--timings="):
+            opts.timings = a.split("=", 1)[1] or "stderr"
         else:
-            files.append(a)
-    return internal_style, files
+            opts.files.append(a)
+    if opts.stdin and (opts.all_paths or opts.apply_plan == "-"):
+        other = "--all" if opts.all_paths else "--apply-plan -"
+        print(f"--stdin cannot be combined with {other}", file=sys.stderr)
+        sys.exit(2)
+    if opts.resume and opts.rollback:
+        print("--resume cannot be combined with --rollback", file=sys.stderr)
+        sys.exit(2)
+    if opts.check and opts.report == "json":
+        print("--report=json cannot be combined with --check", file=sys.stderr)
+        sys.exit(2)
+    return opts
 
 
-def main(argv: list[str] = None) -> int:
-    if argv is None:
-        argv = sys.argv
-    _ = repo_root()  # validates we're in a repo
-    internal_style, inputs = parse_args(argv)
+CONFIG_FILE = ".trim-spaces-in-paths.toml"
+CONFIG_SECTION = "trim-spaces-in-paths"  # [tool.trim-spaces-in-paths]
 
-    plan: list[tuple[str, str]] = []
-    errors: list[str] = []
-    desired_targets = {}
+# Settings accepted in config files, by the type of their value. Each maps
+# onto the command-line option of the same name.
+CONFIG_KEYS = {
+    "internal-style": str,
+    "whitespace": list,
+    "cache": bool,
+    "cache-size": int,
+    "case-insensitive": bool,
+    "native-index": bool,
+    "jobs": int,
+    "include": list,
+    "exclude": list,
+}
 
-    for p in inputs:
-        posix = Path(p).as_posix()
-        dst, err = normalize_path(posix, internal_style)
+
+class ConfigError(ValueError):
+    pass
+
+
+def find_worktree(start: str | None = None) -> str | None:
+    # Top-level directory of the working tree (where .git lives), without git
+    d = os.path.abspath(start or os.getcwd())
+    while True:
+        if os.path.lexists(os.path.join(d, ".git")):
+            return d
+        parent = os.path.dirname(d)
+        if parent == d:
+            return None
+        d = parent
+
+
+def config_to_args(settings: dict, source: str) -> list[str]:
+    args = []
+    for key, value in settings.items():
+        kind = CONFIG_KEYS.get(key)
+        if kind is None:
+            raise ConfigError(f"{source}: unknown setting '{key}'")
+        if kind is list and isinstance(value, list):
+            value = ",".join(map(str, value))
+        if kind is bool:
+            if not isinstance(value, bool):
+                raise ConfigError(f"{source}: '{key}' must be true or false")
+            if value:
+                args.append(f"--{key}")
+            continue
+        if kind is int and (isinstance(value, bool) or not isinstance(value, int)):
+            raise ConfigError(f"{source}: '{key}' must be an integer")
+        if not isinstance(value, str | int):
+            raise ConfigError(f"{source}: '{key}' must be a string")
+        args.append(f"--{key}={value}")
+    return args
+
+
+def _read_config(path: str, section: bool) -> list[str] | None:
+    # None when the file has settings but no TOML parser is available
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except OSError as e:
+        raise ConfigError(f"{path}: {e}") from None
+    if section and CONFIG_SECTION.encode() not in raw:
+        return []  # a pyproject.toml without our table needs no parser
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        try:
+            import tomli as tomllib
+        except ImportError:
+            print(
+                f"⚠️  Ignoring '{path}': reading it needs Python 3.11+ or tomli",
+                file=sys.stderr,
+            )
+            return None
+    try:
+        data = tomllib.loads(raw.decode())
+    except (UnicodeDecodeError, tomllib.TOMLDecodeError) as e:
+        raise ConfigError(f"{path}: {e}") from None
+    if section:
+        data = data.get("tool", {}).get(CONFIG_SECTION, {})
+    return config_to_args(data, path)
+
+
+def load_config(start: str | None = None) -> list[str]:
+    # Options from .trim-spaces-in-paths.toml, or else from the
+    # [tool.trim-spaces-in-paths] table of pyproject.toml, at the top of the
+    # working tree. The parsed result is cached under .git/, keyed by the
+    # files' mtime and size, so later runs skip the TOML parser entirely.
+    top = find_worktree(start)
+    if top is None:
+        return []
+    stamp = []
+    candidates = ((CONFIG_FILE, False), ("pyproject.toml", True))
+    for name, _ in candidates:
+        try:
+            st = os.stat(os.path.join(top, name))
+        except OSError:
+            stamp.append("-")
+        else:
+            stamp.append(f"{st.st_mtime_ns}:{st.st_size}")
+    if stamp == ["-", "-"]:
+        return []
+    stamp = f"{top}\0{stamp[0]}\0{stamp[1]}"
+
+    git_dir = find_git_dir(top)
+    cached = os.path.join(state_dir(git_dir), "config") if git_dir else None
+    if cached is not None:
+        try:
+            with open(cached, encoding="utf-8") as f:
+                head, _, body = f.read().partition("\n")
+            if head == stamp:
+                return body.split("\0") if body else []
+        except OSError:
+            pass
+
+    args: list[str] | None = []
+    for (name, section), mark in zip(candidates, stamp.split("\0")[1:], strict=True):
+        if mark != "-":
+            args = _read_config(os.path.join(top, name), section)
+            if args or not section:
+                break
+    if args is None:
+        return []  # not cached, so the file is read once a parser is installed
+    if cached is not None:
+        from contextlib import suppress
+
+        with suppress(OSError):
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            tmp = f"{cached}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(stamp + "\n" + "\0".join(args))
+            os.replace(tmp, cached)
+    return args
+
+
+def parse_args(argv: list[str]) -> tuple[str, list[str]]:
+    opts = parse_options(argv)
+    return opts.internal_style, opts.files
+
+
+_END = ""  # trie key marking the end of a literal pattern
+
+
+def _path_glob(pat: str) -> str:
+    # fnmatch.translate() for anchored paths, where a wildcard must not
+    # cross "/" unless it is a whole `**` component
+    import re
+
+    out: list[str] = []
+    i, n = 0, len(pat)
+    while i < n:
+        c = pat[i]
+        if pat.startswith("**", i) and (i == 0 or pat[i - 1] == "/"):
+            if pat.startswith("**/", i):
+                out.append("(?:.*/)?")
+                i += 3
+                continue
+            if i + 2 == n:
+                out.append(".*")
+                break
+        if c == "*":
+            out.append("[^/]*")
+            while i + 1 < n and pat[i + 1] == "*":
+                i += 1
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[" and pat.find("]", i + 2) > 0:
+            j = pat.find("]", i + 2)
+            body = pat[i + 1 : j].replace("\\", "\\\\")
+            if body[0] == "!":
+                body = "^/" + body[1:]
+            elif body[0] == "^":
+                body = "\\" + body
+            out.append("[" + body + "]")
+            i = j
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "(?s:" + "".join(out) + r")\Z"
+
+
+class PatternSet:
+    # Include/exclude patterns, compiled once. A path matches when it or any
+    # of its parent directories matches a pattern, so whole subtrees are
+    # pruned by walking the path's components once. As in .gitignore:
+    # - literal patterns with a leading or inner slash ("/vendor",
+    #   "docs/gen") are anchored at the top level and stored in a prefix trie;
+    # - other literal patterns ("node_modules", "third_party/") match a
+    #   directory or file of that name at any depth (a set lookup per
+    #   component);
+    # - glob patterns become one combined regex each for component names
+    #   and for anchored paths, where `*` and `?` stop at "/" and only a
+    #   `**` component spans directories.
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        import fnmatch
+        import re
+
+        self.trie: dict = {}
+        self.names: set[str] = set()
+        name_globs: list[str] = []
+        path_globs: list[str] = []
+        for pat in patterns:
+            pat = pat.strip()
+            anchored = "/" in pat.rstrip("/")
+            pat = pat.strip("/")
+            if not pat:
+                continue
+            is_glob = any(c in pat for c in "*?[")
+            if is_glob:
+                if anchored:
+                    path_globs.append(_path_glob(pat))
+                else:
+                    name_globs.append(fnmatch.translate(pat))
+            elif anchored:
+                node = self.trie
+                for c in pat.split("/"):
+                    node = node.setdefault(c, {})
+                node[_END] = True
+            else:
+                self.names.add(pat)
+        self.name_match = re.compile("|".join(name_globs)).match if name_globs else None
+        self.path_match = re.compile("|".join(path_globs)).match if path_globs else None
+
+    def matches(self, path: str) -> bool:
+        names = self.names
+        name_match = self.name_match
+        path_match = self.path_match
+        node = self.trie
+        start = 0
+        while True:
+            end = path.find("/", start)
+            if end < 0:
+                end = len(path)
+            c = path[start:end]
+            if c in names or (name_match is not None and name_match(c)):
+                return True
+            if node is not None:
+                node = node.get(c)
+                if node is not None and _END in node:
+                    return True
+            if path_match is not None and path_match(path[:end]):
+                return True
+            if end == len(path):
+                return False
+            start = end + 1
+
+
+class PathFilter:
+    # --include/--exclude, applied to paths before they are normalized.
+    # Patterns are relative to the top of the working tree; `prefix` maps
+    # cwd-relative inputs onto it. Excludes win over includes.
+
+    def __init__(
+        self, include: list[str], exclude: list[str], prefix: str = ""
+    ) -> None:
+        self.prefix = prefix
+        self.include = PatternSet(include) if include else None
+        self.exclude = PatternSet(exclude) if exclude else None
+
+    def __call__(self, path: str) -> bool:
+        full = self.prefix + as_posix(path)
+        if self.exclude is not None and self.exclude.matches(full):
+            return False
+        return self.include is None or self.include.matches(full)
+
+
+def needs_normalizing(
+    paths: Iterable[str], rules: WhitespaceRules | None = None
+) -> bool:
+    # Only whitespace (or a --whitespace rule) can make normalize_path()
+    # change a path
+    if rules is not None:
+        return any(map(rules.screen, paths))
+    return any(" " in p for p in paths)
+
+
+class _SourceNode:
+    # A component of an input path; `target` is its normalized name,
+    # computed once however many paths go through it ("" = would be empty).
+    __slots__ = ("children", "target")
+
+    def __init__(self, target: str) -> None:
+        self.children: dict[str, _SourceNode] = {}
+        self.target = target
+
+
+class _TargetNode:
+    # A component of a destination path. `src` is the input that becomes this
+    # exact path; `via` is the first input that needs it as a directory.
+    __slots__ = ("children", "src", "via")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _TargetNode] = {}
+        self.src: str | None = None
+        self.via: str | None = None
+
+
+class RenamePlan:
+    # Path trie over inputs (source side) and their destinations (target
+    # side). Directories are normalized once per node, conflicts are found
+    # per component: two inputs becoming the same path, or one input
+    # becoming a file where another needs a directory.
+
+    def __init__(self, normalizer: Normalizer) -> None:
+        self.normalizer = normalizer
+        self.sources = _SourceNode("")
+        self.targets = _TargetNode()
+        self.pairs: list[tuple[str, str]] = []
+        self.errors: list[str] = []
+
+    def normalize(self, path: str) -> tuple[str | None, str | None]:
+        node = self.sources
+        out = []
+        for c in path.split("/"):
+            child = node.children.get(c)
+            if child is None:
+                child = node.children[c] = _SourceNode(self.normalizer.component(c))
+            if child.target == "":
+                return None, f"component '{c}' would become empty after normalization"
+            out.append(child.target)
+            node = child
+        return "/".join(out), None
+
+    def _conflict(self, src: str, dst: str) -> str | None:
+        parts = dst.split("/")
+        node = self.targets
+        for i, c in enumerate(parts):
+            node = node.children.get(c)
+            if node is None:
+                return None
+            if i < len(parts) - 1:
+                if node.src is not None and node.src != src:
+                    here = "/".join(parts[: i + 1])
+                    return self._dir_conflict(node.src, here, src)
+            elif node.src is not None and node.src != src:
+                return f"Conflict: both '{node.src}' and '{src}' would become '{dst}'"
+            elif node.children:
+                return self._dir_conflict(src, dst, node.via)
+        return None
+
+    @staticmethod
+    def _dir_conflict(file_src: str, path: str, dir_src: str) -> str:
+        if file_src == path:
+            return (
+                f"Conflict: '{path}' is a file, but '{dir_src}' needs it as a directory"
+            )
+        return (
+            f"Conflict: '{file_src}' would become '{path}', "
+            f"which '{dir_src}' needs as a directory"
+        )
+
+    def claim(self, src: str, dst: str) -> bool:
+        err = self._conflict(src, dst)
         if err:
-            errors.append(f"'{posix}': {err}")
+            self.errors.append(err)
+            return False
+        node = self.targets
+        for c in dst.split("/"):
+            child = node.children.get(c)
+            if child is None:
+                child = node.children[c] = _TargetNode()
+            if node is not self.targets and node.via is None:
+                node.via = src
+            node = child
+        node.src = src
+        return True
+
+    def add(self, path: str) -> None:
+        dst, err = self.normalize(path)
+        if err:
+            self.errors.append(f"'{path}': {err}")
+            return
+        if self.claim(path, dst) and path != dst:
+            self.pairs.append((path, dst))
+
+
+def as_posix(path: str) -> str:
+    # Same as Path(path).as_posix(), skipping pathlib for already-clean paths
+    if (
+        os.sep == "/"
+        and path
+        and "//" not in path
+        and "/." not in path
+        and not path.startswith(".")
+        and not path.endswith("/")
+    ):
+        return path
+    from pathlib import Path
+
+    return Path(path).as_posix()
+
+
+def plan_renames(
+    inputs: Iterable[str],
+    internal_style: str,
+    track_unchanged: bool = True,
+    rules: WhitespaceRules | None = None,
+) -> tuple[list[tuple[str, str]], list[str]]:
+    # `inputs` may be a stream. Paths without spaces only occupy their own
+    # name; with track_unchanged=False they are not kept at all, so memory
+    # is bounded by the number of paths that change.
+    plan = RenamePlan(get_normalizer(internal_style, rules))
+    screen = rules.screen if rules is not None else None
+    for p in inputs:
+        if (" " not in p) if screen is None else not screen(p):
+            if track_unchanged:
+                posix = as_posix(p)
+                plan.claim(posix, posix)
+            continue
+        plan.add(as_posix(p))
+
+    pairs = plan.pairs
+    pairs.sort(key=lambda t: t[0].count("/"), reverse=True)
+    return pairs, plan.errors
+
+
+def fold_path(path: str) -> str:
+    # Key under which case-insensitive / normalization-insensitive
+    # filesystems (macOS, Windows) consider two names the same
+    import unicodedata
+
+    return unicodedata.normalize("NFC", unicodedata.normalize("NFC", path).casefold())
+
+
+def check_tracked_conflicts(
+    plan: list[tuple[str, str]], index: IndexSnapshot, case_insensitive: bool = False
+) -> tuple[list[tuple[str, str]], list[str]]:
+    # Check destinations against everything already in the index, in one
+    # pass over it: a destination may not be a tracked file or directory,
+    # or sit below a tracked file, unless that entry is itself moving away.
+    moving = {src for src, _ in plan}
+    dst_dirs: dict[str, int] = {}
+    for _, dst in plan:
+        dst_dirs[dst] = 0
+        for d in _ancestors(dst):
+            dst_dirs.setdefault(d, 0)
+    folded: dict[str, str] = {}
+    for path in index.entries:
+        if path in moving:
+            continue
+        for d in _ancestors(path):
+            if d in dst_dirs:
+                dst_dirs[d] += 1
+        if case_insensitive:
+            folded.setdefault(fold_path(path), path)
+
+    kept: list[tuple[str, str]] = []
+    errors: list[str] = []
+    for src, dst in plan:
+        if dst in index and dst not in moving:
+            errors.append(
+                f"Conflict: '{src}' would become '{dst}', which is already tracked"
+            )
             continue
-        if posix == dst:
+        if dst_dirs[dst]:
+            errors.append(
+                f"Conflict: '{src}' would become '{dst}', which is a tracked directory"
+            )
             continue
-        if dst in desired_targets and desired_targets[dst] != posix:
+        blocker = next(
+            (d for d in _ancestors(dst) if d in index and d not in moving), None
+        )
+        if blocker is not None:
             errors.append(
-                f"Conflict: both '{desired_targets[dst]}' and '{posix}' would become '{dst}'"
+                f"Conflict: '{blocker}' is a tracked file, but '{src}' needs it as a directory"
             )
             continue
-        desired_targets[dst] = posix
-        plan.append((posix, dst))
+        if case_insensitive:
+            key = fold_path(dst)
+            other = folded.get(key)
+            if other is not None and other != dst:
+                errors.append(
+                    f"Conflict: '{src}' would become '{dst}', which collides with "
+                    f"'{other}' on case-insensitive filesystems"
+                )
+                continue
+            folded[key] = dst
+        kept.append((src, dst))
+    return kept, errors
 
-    plan.sort(key=lambda t: t[0].count("/"), reverse=True)
 
-    changed: list[tuple[str, str]] = []
-    for src, dst in plan:
-        ok = git_mv(src, dst)
-        if ok:
-            changed.append((src, dst))
-        else:
-            if src != dst:
-                errors.append(f"Failed to move '{src}' -> '{dst}'")
+def report(
+    changed: list[tuple[str, str]],
+    errors: list[str],
+    internal_style: str,
+    fmt: str = "text",
+) -> None:
+    if fmt == "json":
+        # One document on stdout for programs driving the hook
+        import json
 
+        doc = {
+            "internal_style": internal_style,
+            "renamed": [{"src": s, "dst": d} for s, d in changed],
+            "errors": errors,
+        }
+        json.dump(doc, sys.stdout)
+        sys.stdout.write("\n")
+        sys.stdout.flush()
+        return
     if changed:
         print(f"🔧 Renamed (internal-style={internal_style}):")
         for s, d in changed:
@@ -151,6 +2559,138 @@ def main(argv: list[str] = None) -> int:
             file=sys.stderr,
         )
 
+
+def build_plan(
+    opts: Options,
+) -> tuple[list[tuple[str, str]], list[str], IndexSnapshot | None]:
+    if opts.all_paths:
+        root = repo_root()
+        _lap("repo_root")
+        prefix = repo_prefix(root)
+        plan = None
+        git_dir = find_git_dir(str(root)) if opts.native_index else None
+        if git_dir is not None and not opts.files:
+            # Listed from the index itself; the entries are only parsed in
+            # full below, when something needs renaming
+            paths: Iterable[str] = iter_index_paths(git_dir, prefix, opts.rules)
+            if opts.path_filter is not None:
+                paths = filter(opts.path_filter, paths)
+            try:
+                plan, errors = plan_renames(
+                    paths,
+                    opts.internal_style,
+                    track_unchanged=False,
+                    rules=opts.rules,
+                )
+            except (OSError, UnsupportedIndex):
+                plan = None  # listed by git instead
+        if plan is None:
+            paths = iter_tracked_paths(opts.files)
+            if opts.path_filter is not None:
+                paths = filter(opts.path_filter, paths)
+            plan, errors = plan_renames(
+                paths,
+                opts.internal_style,
+                track_unchanged=False,
+                rules=opts.rules,
+            )
+        _lap("plan")
+        if not plan and not errors:
+            return plan, errors, None
+    else:
+        # A --stdin stream can be huge: like --all, keep only the renames and
+        # leave collisions with tracked paths to check_tracked_conflicts()
+        plan, errors = plan_renames(
+            input_paths(opts),
+            opts.internal_style,
+            track_unchanged=not opts.stdin,
+            rules=opts.rules,
+        )
+        _lap("plan")
+        if not plan and not errors:
+            return plan, errors, None
+        root = repo_root()  # validates we're in a repo
+        _lap("repo_root")
+
+    index = IndexSnapshot(repo_prefix(root), opts.native_index, str(root))
+    if plan:
+        plan, conflicts = check_tracked_conflicts(plan, index, opts.case_insensitive)
+        errors.extend(conflicts)
+        _lap("conflicts")
+    return plan, errors, index
+
+
+def plan_document(
+    plan: list[tuple[str, str]],
+    errors: list[str],
+    index: IndexSnapshot | None,
+    internal_style: str,
+) -> dict:
+    renames = []
+    for src, dst in plan:
+        rec = {"src": src, "dst": dst}
+        entry = index.get(src) if index is not None else None
+        if entry is not None:
+            rec["mode"], rec["oid"] = entry[0], entry[1]
+        renames.append(rec)
+    return {
+        "version": 1,
+        "internal_style": internal_style,
+        "renames": renames,
+        "errors": errors,
+    }
+
+
+def write_plan(
+    plan: list[tuple[str, str]],
+    errors: list[str],
+    index: IndexSnapshot | None,
+    opts: Options,
+) -> None:
+    # --check output: NUL-delimited src/dst pairs, or a JSON document that
+    # also carries each source's staged mode and blob id
+    if opts.check == "nul":
+        out = sys.stdout.buffer
+        for src, dst in plan:
+            out.write(os.fsencode(src) + b"\0" + os.fsencode(dst) + b"\0")
+        out.flush()
+        return
+    import json
+
+    doc = plan_document(plan, errors, index, opts.internal_style)
+    json.dump(doc, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    sys.stdout.flush()
+
+
+def _plan_and_apply(opts: Options) -> int:
+    plan, errors, index = build_plan(opts)
+    if opts.check:
+        write_plan(plan, errors, index, opts)
+        report([], errors, opts.internal_style)
+        _lap("report")
+        if errors:
+            return 1
+        return 3 if plan else 0
+    if not plan and not errors:
+        return 0
+
+    git_dir = index.git_dir if index is not None else None
+    plan, claim_errors = coordinate(plan, git_dir)
+    errors.extend(claim_errors)
+    _lap("coordinate")
+    try:
+        changed, apply_errors = apply_moves(plan, index, opts.jobs)
+    finally:
+        release_claims(plan, git_dir)
+    errors.extend(apply_errors)
+    _lap("apply")
+    if _timings is not None:
+        _timings.paths_renamed = len(changed)
+
+    report(changed, errors, opts.internal_style, opts.report)
+    _lap("report")
+
     if errors:
         return 1
     if changed:
@@ -158,5 +2698,391 @@ def main(argv: list[str] = None) -> int:
     return 0
 
 
+def read_plan(
+    data: bytes,
+) -> tuple[list[tuple[str, str]], dict[str, tuple[str, str]], str | None]:
+    # Parse --check output: JSON, or NUL-delimited src/dst pairs. Returns
+    # the pairs, the (mode, oid) recorded per source, and the style used.
+    if data.lstrip()[:1] == b"{":
+        import json
+
+        doc = json.loads(data.decode("utf-8"))
+        pairs = []
+        expected = {}
+        for rec in doc.get("renames", []):
+            pairs.append((rec["src"], rec["dst"]))
+            if "oid" in rec and "mode" in rec:
+                expected[rec["src"]] = (rec["mode"], rec["oid"])
+        return pairs, expected, doc.get("internal_style")
+    fields = data.split(b"\0")
+    if fields and fields[-1] == b"":
+        fields.pop()
+    if len(fields) % 2:
+        raise ValueError("odd number of NUL-delimited fields")
+    names = [os.fsdecode(f) for f in fields]
+    return list(zip(names[::2], names[1::2], strict=True)), {}, None
+
+
+def validate_plan(
+    pairs: list[tuple[str, str]],
+    expected: dict[str, tuple[str, str]],
+    index: IndexSnapshot,
+) -> tuple[list[tuple[str, str]], list[str]]:
+    # A precomputed plan may be stale: sources must still exist with the
+    # content they were planned with, and targets must still be free.
+    moving = {src for src, _ in pairs}
+    claimed: dict[str, str] = {}
+    kept: list[tuple[str, str]] = []
+    errors: list[str] = []
+    for src, dst in pairs:
+        entry = index.get(src)
+        if entry is None and not os.path.lexists(src):
+            errors.append(f"'{src}' no longer exists")
+            continue
+        if src in expected and (entry is None or entry[:2] != expected[src]):
+            errors.append(f"'{src}' changed since the plan was made")
+            continue
+        if dst in claimed:
+            errors.append(
+                f"Conflict: both '{claimed[dst]}' and '{src}' would become '{dst}'"
+            )
+            continue
+        if dst not in moving and (dst in index or os.path.lexists(dst)):
+            errors.append(f"Conflict: '{src}' would become '{dst}', which exists")
+            continue
+        claimed[dst] = src
+        kept.append((src, dst))
+    kept, conflicts = check_tracked_conflicts(kept, index)
+    return kept, errors + conflicts
+
+
+def apply_plan_file(opts: Options) -> int:
+    try:
+        if opts.apply_plan == "-":
+            data = sys.stdin.buffer.read()
+        else:
+            with open(opts.apply_plan, "rb") as f:
+                data = f.read()
+        pairs, expected, style = read_plan(data)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Could not read plan '{opts.apply_plan}': {e}", file=sys.stderr)
+        return 2
+    _lap("plan")
+    if not pairs:
+        return 0
+
+    if _timings is not None:
+        _timings.paths_examined = len(pairs)
+    root = repo_root()
+    _lap("repo_root")
+    index = IndexSnapshot(repo_prefix(root), opts.native_index, str(root))
+    pairs, errors = validate_plan(pairs, expected, index)
+    _lap("conflicts")
+    git_dir = index.git_dir
+    pairs, claim_errors = coordinate(pairs, git_dir)
+    errors.extend(claim_errors)
+    _lap("coordinate")
+    try:
+        changed, apply_errors = apply_moves(pairs, index, opts.jobs)
+    finally:
+        release_claims(pairs, git_dir)
+    errors.extend(apply_errors)
+    _lap("apply")
+    if _timings is not None:
+        _timings.paths_renamed = len(changed)
+
+    report(changed, errors, style or opts.internal_style, opts.report)
+    _lap("report")
+    if errors:
+        return 1
+    return 3 if changed else 0
+
+
+def recover(opts: Options) -> int:
+    # --resume / --rollback: replay or undo every journal an interrupted
+    # run left behind, from the directory that run was started in
+    git_dir = find_git_dir()
+    paths = find_journals(git_dir) if git_dir else []
+    if not paths:
+        print("No interrupted run to recover", file=sys.stderr)
+        return 0
+    changed: list[tuple[str, str]] = []
+    errors: list[str] = []
+    cwd = os.getcwd()
+    for path in paths:
+        try:
+            journal = Journal.load(path)
+            batch = journal.batch
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            errors.append(f"Could not read journal '{path}': {e}")
+            continue
+        try:
+            os.chdir(journal.header["cwd"])
+            if opts.rollback:
+                done, failed = rollback_batch(batch, journal)
+            else:
+                done, failed = run_batch(batch, journal, jobs=opts.jobs)
+        finally:
+            os.chdir(cwd)
+        changed.extend(done)
+        errors.extend(failed)
+    _lap("recover")
+    if _timings is not None:
+        _timings.paths_renamed = len(changed)
+
+    if opts.rollback and changed and opts.report == "text":
+        print("↩️  Rolled back:")
+        for s, d in changed:
+            print(f"  - '{s}' -> '{d}'")
+        report([], errors, opts.internal_style)
+    else:
+        report(changed, errors, opts.internal_style, opts.report)
+    _lap("report")
+    if errors:
+        return 1
+    return 3 if changed else 0
+
+
+def _nothing_to_do(opts: Options) -> int:
+    if opts.check:
+        write_plan([], [], None, opts)
+    return 0
+
+
+def run_hook(opts: Options) -> int:
+    if opts.resume or opts.rollback:
+        return recover(opts)
+    if opts.apply_plan is not None:
+        return apply_plan_file(opts)
+    if opts.include or opts.exclude:
+        top = find_worktree()
+        prefix = repo_prefix(top) if top is not None else ""
+        opts.path_filter = PathFilter(opts.include, opts.exclude, prefix)
+        if not opts.all_paths:
+            opts.files = list(filter(opts.path_filter, opts.files))
+        _lap("filter")
+    if opts.stdin:
+        # Screened while streaming; the input is only known once consumed
+        if _timings is not None:
+            _timings.paths_examined = len(opts.files)
+        # Not cached: a clean-run key would need the whole input up front
+        return _plan_and_apply(opts)
+    if not opts.all_paths:
+        if _timings is not None:
+            _timings.paths_examined = len(opts.files)
+        # Fast path: no git process, no heavy imports
+        if not needs_normalizing(opts.files, opts.rules):
+            _lap("screen")
+            return _nothing_to_do(opts)
+        _lap("screen")
+    if not opts.cache:
+        return _plan_and_apply(opts)
+
+    git_dir = find_git_dir()
+    fingerprint = index_fingerprint(git_dir) if git_dir else None
+    if fingerprint is None:
+        _lap("cache")
+        return _plan_and_apply(opts)
+    cache = ResultCache(git_dir, opts.cache_size)
+    key = cache_key(opts)
+    if cache.is_clean(key, fingerprint):
+        _lap("cache")
+        return _nothing_to_do(opts)
+    _lap("cache")
+
+    exit_code = _plan_and_apply(opts)
+    if exit_code == 0:
+        cache.mark_clean(key, fingerprint)
+    cache.save()
+    return exit_code
+
+
+class GitError(RuntimeError):
+    pass
+
+
+async def plan_async(
+    opts: Options, cwd: str | None = None
+) -> tuple[list[tuple[str, str]], list[str], IndexSnapshot | None]:
+    # build_plan() for asyncio callers. Nothing depends on the process-wide
+    # cwd: git runs in `cwd` and paths are relative to it, so plans for
+    # several repositories, worktrees or chunks of paths can be awaited
+    # together. The top-level and the index listing (and with --all, the
+    # tracked paths) are queried at once. The index is always read through
+    # git; --cache, --stdin and --native-index do not apply.
+    import asyncio
+
+    cwd = os.path.abspath(cwd or os.getcwd())
+    path_filter = opts.path_filter
+    if path_filter is None and (opts.include or opts.exclude):
+        top = find_worktree(cwd)
+        prefix = repo_prefix(top, cwd) if top is not None else ""
+        path_filter = PathFilter(opts.include, opts.exclude, prefix)
+
+    def queries() -> list:
+        return [
+            run_async(["git", "rev-parse", "--show-toplevel"], cwd=cwd),
+            run_async(LS_FILES_STAGE, cwd=cwd),
+        ]
+
+    if opts.all_paths:
+        root, listing, tracked = await asyncio.gather(
+            *queries(), run_async(["git", "ls-files", "-z", "--", *opts.files], cwd=cwd)
+        )
+        if tracked.returncode != 0:
+            raise GitError(tracked.stderr.decode().strip() or "git ls-files failed")
+        # Unmerged paths are listed once per stage
+        paths: Iterable[str] = dict.fromkeys(
+            os.fsdecode(rec) for rec in tracked.stdout.split(b"\0") if rec
+        )
+    else:
+        paths = opts.files
+    if path_filter is not None:
+        paths = filter(path_filter, paths)
+    plan, errors = plan_renames(
+        paths,
+        opts.internal_style,
+        track_unchanged=not opts.all_paths,
+        rules=opts.rules,
+    )
+    if not plan and not errors:
+        return plan, errors, None
+    if not opts.all_paths:
+        root, listing = await asyncio.gather(*queries())
+    if root.returncode != 0:
+        raise GitError(root.stderr.decode().strip() or f"Not a git repository: {cwd}")
+    top = root.stdout.decode().strip()
+    index = IndexSnapshot.from_listing(
+        repo_prefix(top, cwd), listing.stdout if listing.returncode == 0 else b"", top
+    )
+    if plan:
+        plan, conflicts = check_tracked_conflicts(plan, index, opts.case_insensitive)
+        errors.extend(conflicts)
+    return plan, errors, index
+
+
+async def apply_async(
+    plan: list[tuple[str, str]],
+    index: IndexSnapshot | None,
+    opts: Options,
+    cwd: str | None = None,
+    session: str | None = None,
+) -> subprocess.CompletedProcess:
+    # Applying moves files relative to the process cwd and takes locks
+    # under .git/, so it runs in a hook process of its own, fed the plan
+    # with --apply-plan - and reporting with --report=json. Processes
+    # sharing `session` coordinate their destinations like parallel
+    # pre-commit chunks.
+    import asyncio
+    import json
+    import subprocess
+
+    cmd = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--apply-plan",
+        "-",
+        "--report=json",
+    ]
+    if opts.jobs != 1:
+        cmd.append(f"--jobs={opts.jobs}")
+    env = dict(os.environ)
+    if session is not None:
+        env[SESSION_ENV] = session
+    doc = plan_document(plan, [], index, opts.internal_style)
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=cwd,
+        env=env,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    stdout, stderr = await proc.communicate(json.dumps(doc).encode())
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+async def fix_async(
+    opts: Options, cwd: str | None = None, session: str | None = None
+) -> tuple[int, list[tuple[str, str]], list[str]]:
+    # The hook as a coroutine: plan in-process, then apply (unless
+    # opts.check). Returns the hook's exit code, the renames planned and
+    # the errors, e.g. for opts built with parse_options().
+    import contextlib
+    import json
+    import uuid
+
+    plan, errors, index = await plan_async(opts, cwd)
+    if opts.check or not plan:
+        if errors:
+            return 1, plan, errors
+        return (3 if plan else 0), plan, errors
+    if session is None:
+        session = f"async:{uuid.uuid4().hex}"
+    p = await apply_async(plan, index, opts, cwd, session)
+    result = None
+    if p.returncode in (0, 1, 3) and p.stdout.strip():
+        with contextlib.suppress(ValueError):
+            result = json.loads(p.stdout)
+    if result is not None:
+        errors.extend(result["errors"])
+    elif p.returncode not in (0, 3):
+        errors.append(p.stderr.decode().strip() or f"apply exited with {p.returncode}")
+    if errors:
+        return 1, plan, errors
+    return (3 if p.returncode == 3 else 0), plan, errors
+
+
+async def fix_many(
+    targets: Iterable[tuple[str, Options]], limit: int = 8
+) -> list[tuple[int, list[tuple[str, str]], list[str]]]:
+    # fix_async() for each (cwd, options) pair, e.g. every submodule or
+    # worktree, or chunks of one path list, with at most `limit` running at
+    # once. The applies of one call coordinate their destinations.
+    import asyncio
+    import uuid
+
+    session = f"async:{uuid.uuid4().hex}"
+    gate = asyncio.Semaphore(limit)
+
+    async def one(cwd: str, opts: Options):
+        async with gate:
+            return await fix_async(opts, cwd, session)
+
+    return await asyncio.gather(*(one(cwd, opts) for cwd, opts in targets))
+
+
+def main(argv: list[str] = None) -> int:
+    global _timings
+    start = time.perf_counter()
+    if argv is None:
+        argv = sys.argv
+    if "--no-config" in argv:
+        argv = [a for a in argv if a != "--no-config"]
+    else:
+        # Command-line options come last, so they override the config
+        try:
+            argv = argv[:1] + load_config() + argv[1:]
+        except ConfigError as e:
+            print(f"Invalid configuration: {e}", file=sys.stderr)
+            return 2
+    opts = parse_options(argv)
+    _normalizers.clear()  # memoization is per run
+    try:
+        if opts.timings is None:
+            return run_hook(opts)
+
+        _timings = Timings(start)
+        _lap("parse")
+        try:
+            exit_code = run_hook(opts)
+            _timings.emit(exit_code, opts.timings)
+        finally:
+            _timings = None
+        return exit_code
+    except KeyboardInterrupt:
+        return 130
+
+
 if __name__ == "__main__":
     sys.exit(main())